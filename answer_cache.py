@@ -0,0 +1,112 @@
+import math
+import re
+import threading
+import zlib
+from collections import Counter, OrderedDict
+from llm_cache import normalize_query
+from lru import LRUCache
+
+_revision_pattern = re.compile(r'"wgRevisionId"\s*:\s*(\d+)')
+
+def page_identity(soup):
+  '''
+  input: soup - (BeautifulSoup) a rendered wiki article
+  output: (canonical_url, revision_id) - either may be None if the page doesn't expose it
+  '''
+  canonical_url = None
+  link = soup.find("link", {"rel": "canonical"})
+  if link and link.has_attr("href"):
+    canonical_url = link["href"]
+  revision = None
+  for script in soup.find_all("script"):
+    match = _revision_pattern.search(script.string or "")
+    if match:
+      revision = int(match.group(1))
+      break
+  return canonical_url, revision
+
+def text_vector(text, dimensions=4096):
+  # Hashed character-trigram vector, L2-normalized. It catches small surface changes ("diamonds" / "diamond") but not
+  # rewordings ("how to find" / "how do i find" scores 0.59), and a one-word change of meaning ("push" / "pull") scores
+  # over 0.9, so any threshold trades wrong answers for hits
+  text = f" {normalize_query(text)} "
+  counts = Counter(zlib.crc32(text[i:i + 3].encode('utf-8')) % dimensions for i in range(len(text) - 2))
+  norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+  return {index: count / norm for index, count in counts.items()}
+
+def cosine_similarity(a, b):
+  if len(a) > len(b):
+    a, b = b, a
+  return sum(value * b.get(index, 0.0) for index, value in a.items())
+
+class AnswerCache:
+  '''
+  Final answers keyed on (canonical page URL, revision id, normalized summary query).
+  Storing an answer for a newer revision of a page drops every answer for the older one.
+  With similarity_threshold set, a near-duplicate summary for the same revision also counts as a hit.
+  '''
+  def __init__(self, max_pages=1024, max_answers_per_page=64, similarity_threshold=None):
+    self.pages = LRUCache(max_pages) # url -> {'revision': int, 'answers': OrderedDict(summary -> (answer, vector))}
+    self.max_answers_per_page = max_answers_per_page
+    self.similarity_threshold = similarity_threshold
+    self._lock = threading.Lock()
+    self.exact_hits = 0
+    self.similar_hits = 0
+    self.misses = 0
+    self.invalidations = 0
+
+  def get(self, page_url, revision, summary_query):
+    if page_url is None or revision is None:
+      return None
+    key = normalize_query(summary_query)
+    with self._lock:
+      page = self.pages.get(page_url)
+      if page is None or page['revision'] != revision:
+        self.misses += 1
+        return None
+      answers = page['answers']
+      if key in answers:
+        answers.move_to_end(key)
+        self.exact_hits += 1
+        return answers[key][0]
+      if self.similarity_threshold is not None and answers:
+        vector = text_vector(summary_query)
+        best_score, best_answer = max((cosine_similarity(vector, entry[1]), entry[0]) for entry in answers.values())
+        if best_score >= self.similarity_threshold:
+          self.similar_hits += 1
+          return best_answer
+      self.misses += 1
+      return None
+
+  def put(self, page_url, revision, summary_query, answer):
+    if page_url is None or revision is None:
+      return
+    key = normalize_query(summary_query)
+    vector = text_vector(summary_query) if self.similarity_threshold is not None else None
+    with self._lock:
+      page = self.pages.get(page_url)
+      if page is not None and revision < page['revision']:
+        return
+      if page is None or page['revision'] != revision:
+        if page is not None:
+          self.invalidations += 1
+        page = {'revision': revision, 'answers': OrderedDict()}
+        self.pages.put(page_url, page)
+      page['answers'][key] = (answer, vector)
+      page['answers'].move_to_end(key)
+      while len(page['answers']) > self.max_answers_per_page:
+        page['answers'].popitem(last=False)
+
+  def invalidate(self, page_url):
+    with self._lock:
+      if self.pages.pop(page_url) is not None:
+        self.invalidations += 1
+
+  def stats(self):
+    return {
+      'pages': len(self.pages),
+      'exact_hits': self.exact_hits,
+      'similar_hits': self.similar_hits,
+      'misses': self.misses,
+      'invalidations': self.invalidations,
+    }
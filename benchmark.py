@@ -0,0 +1,252 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import re
+import sys
+import time
+import temp_async_test_script as pipeline
+from fake_llm_server import FakeChatServer
+from fake_wiki_server import DEFAULT_TITLES, FILLER_WORDS, FakeWikiServer, load_fixture_pages, synthetic_pages
+from instrumentation import start_stage_timings
+from llm_dispatch import make_client
+from subject_guess import guess_subject
+
+BENCHMARK_VERSION = 1
+STAGES = ('feature_extraction', 'search', 'fetch', 'parse', 'extract', 'prompt_build', 'llm')
+
+QUERY_TEMPLATES = ("What is {title}?", "Where can I find {title}?", "What does {title} drop?", "Tell me about {title}")
+
+def make_queries(titles, count):
+  return [QUERY_TEMPLATES[i // len(titles) % len(QUERY_TEMPLATES)].format(title=titles[i % len(titles)]) for i in range(count)]
+
+def make_stub_reply(answer_words):
+  '''
+  Replies for the stub LLM: feature-extraction prompts get a well-formed Subject/Summary pair for guess_subject(query),
+  answer prompts get an answer_words-word answer (so token_delay shapes the generation time).
+  '''
+  answer = 'Answer: ' + ' '.join(FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(answer_words)) + '.'
+  def reply(prompt_text):
+    if prompt_text.startswith("You are an AI designed to assist with extracting specific features"):
+      match = re.search(r"```(.*?)```", prompt_text, re.DOTALL)
+      user_query = match.group(1).replace('\\n', ' ').strip() if match else ''
+      subject = guess_subject(user_query) or user_query
+      return f'Subject: "{subject}"\\nSummary: "General information"'
+    return answer
+  return reply
+
+def percentile(values, q):
+  # Linear interpolation between closest ranks, like numpy's default
+  ordered = sorted(values)
+  position = (len(ordered) - 1) * q / 100
+  low = int(position)
+  high = min(low + 1, len(ordered) - 1)
+  return ordered[low] + (ordered[high] - ordered[low]) * (position - low)
+
+def summarize(values):
+  if not values:
+    return {'count': 0}
+  return {
+    'count': len(values),
+    'p50': round(percentile(values, 50), 6),
+    'p95': round(percentile(values, 95), 6),
+    'p99': round(percentile(values, 99), 6),
+    'mean': round(sum(values) / len(values), 6),
+    'max': round(max(values), 6),
+  }
+
+@contextlib.contextmanager
+def quiet(enabled):
+  # The pipeline narrates every step with print(); a sweep of hundreds of requests would bury the report
+  if not enabled:
+    yield
+    return
+  with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    yield
+
+async def start_pipeline(keep_caches):
+  await pipeline.start_resources()
+  if not keep_caches:
+    # Cold runs measure the whole pipeline every time instead of the caches
+    pipeline.page_cache = None
+    pipeline.answer_cache = None
+    pipeline.feature_cache = None
+
+async def timed_prompt(query):
+  timings = start_stage_timings()
+  started = time.perf_counter()
+  answer = await pipeline.prompt(query)
+  total = time.perf_counter() - started
+  failed = answer.startswith(('Sorry', 'Error'))
+  return total, timings.stages, failed
+
+async def run_level(queries, concurrency, keep_caches, fixture, llm_server):
+  '''
+  input: queries - (list of strings) one entry per request
+         concurrency - (int) requests in flight at once
+  output: dict with wall time, throughput, error count and total/per-stage latency summaries
+  '''
+  await start_pipeline(keep_caches)
+  fetches_before, llm_before = fixture.requests, llm_server.requests
+  semaphore = asyncio.Semaphore(concurrency)
+  async def run(query):
+    async with semaphore:
+      return await timed_prompt(query)
+  try:
+    started = time.perf_counter()
+    results = await asyncio.gather(*(run(query) for query in queries))
+    wall = time.perf_counter() - started
+  finally:
+    await pipeline.close_resources()
+  stages = {name: [timings[name] for _, timings, _ in results if name in timings] for name in STAGES}
+  return {
+    'concurrency': concurrency,
+    'requests': len(queries),
+    'wall_seconds': round(wall, 6),
+    'throughput': round(len(queries) / wall, 3) if wall else None,
+    'errors': sum(1 for _, _, failed in results if failed),
+    'wiki_requests': fixture.requests - fetches_before,
+    'llm_requests': llm_server.requests - llm_before,
+    'total': summarize([total for total, _, _ in results]),
+    'stages': {name: summarize(values) for name, values in stages.items()},
+  }
+
+async def run_benchmark(args, pages):
+  fixture = FakeWikiServer(pages, latency=args.fetch_latency).start()
+  llm_server = FakeChatServer(reply=make_stub_reply(args.answer_words), first_token_delay=args.llm_latency, token_delay=args.token_delay)
+  await llm_server.start()
+  pipeline.client = make_client('benchmark', llm_server.base_url)
+  pipeline.mock_llm = False
+  pipeline.wiki_api_url = fixture.api_url
+  pipeline.use_http_backend = True
+  pipeline.page_cache_dir = None
+  pipeline.feature_cache_path = None
+  pipeline.local_wiki_dir = args.local_wiki_dir
+  pipeline.speculative_fetch = args.speculate
+  pipeline.extraction_workers = args.extraction_workers
+  if args.parser:
+    pipeline.html_parser_backend = args.parser
+  # The stub has no account limits; pacing would only measure the token buckets
+  pipeline.llm_requests_per_minute = 10 ** 9
+  pipeline.llm_tokens_per_minute = 10 ** 12
+  titles = sorted(pages)
+  queries = read_queries(args.queries) if args.queries else make_queries(titles, max(len(titles), args.requests))
+  levels = []
+  try:
+    with quiet(not args.verbose):
+      if args.warmup:
+        # Imports, thread pools and connection setup shouldn't land on the first level
+        await run_level(queries[:args.warmup], 1, args.keep_caches, fixture, llm_server)
+    for concurrency in args.concurrency:
+      level_queries = [queries[i % len(queries)] for i in range(args.requests)]
+      with quiet(not args.verbose):
+        level = await run_level(level_queries, concurrency, args.keep_caches, fixture, llm_server)
+      print_level(level)
+      levels.append(level)
+  finally:
+    await pipeline.client.close()
+    pipeline.client = None
+    await llm_server.close()
+    fixture.close()
+  return {
+    'version': BENCHMARK_VERSION,
+    'config': {
+      'pages': len(pages),
+      'requests': args.requests,
+      'fetch_latency': args.fetch_latency,
+      'llm_latency': args.llm_latency,
+      'token_delay': args.token_delay,
+      'answer_words': args.answer_words,
+      'keep_caches': args.keep_caches,
+      'speculate': args.speculate,
+      'extraction_workers': args.extraction_workers,
+      'parser': pipeline.html_parser_backend,
+    },
+    'levels': levels,
+  }
+
+def read_queries(path):
+  with open(path, 'r', encoding='utf-8') as f:
+    return [line.strip() for line in f if line.strip()]
+
+def format_seconds(summary, field):
+  return f"{summary[field]:.4f}s" if summary.get('count') else '-'
+
+def print_level(level):
+  print(f"concurrency {level['concurrency']}: {level['requests']} requests in {level['wall_seconds']:.3f}s "
+        f"({level['throughput']} req/s), {level['errors']} errors, {level['wiki_requests']} wiki requests, {level['llm_requests']} LLM requests")
+  print(f"  {'stage':<20}{'count':>7}{'p50':>11}{'p95':>11}{'p99':>11}{'mean':>11}")
+  for name, summary in [('total', level['total'])] + list(level['stages'].items()):
+    fields = ''.join(f"{format_seconds(summary, field):>11}" for field in ('p50', 'p95', 'p99', 'mean'))
+    print(f"  {name:<20}{summary['count']:>7}{fields}")
+
+def change(before, after):
+  if not before:
+    return ''
+  return f" ({(after - before) / before * 100:+.1f}%)"
+
+def compare_results(baseline, current):
+  '''
+  Prints how each concurrency level moved against a baseline saved with --output.
+  '''
+  previous = {level['concurrency']: level for level in baseline.get('levels', [])}
+  for level in current['levels']:
+    before = previous.get(level['concurrency'])
+    if before is None:
+      print(f"concurrency {level['concurrency']}: not in the baseline")
+      continue
+    print(f"concurrency {level['concurrency']} vs baseline:")
+    print(f"  throughput {before['throughput']} -> {level['throughput']} req/s{change(before['throughput'], level['throughput'])}")
+    for field in ('p50', 'p95', 'p99'):
+      print(f"  total {field} {before['total'][field]:.4f}s -> {level['total'][field]:.4f}s{change(before['total'][field], level['total'][field])}")
+    for name, summary in level['stages'].items():
+      old = before['stages'].get(name, {})
+      if summary.get('count') and old.get('count'):
+        print(f"  {name} p50 {old['p50']:.4f}s -> {summary['p50']:.4f}s{change(old['p50'], summary['p50'])}")
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark the question pipeline against a local wiki fixture and a stub LLM.")
+  parser.add_argument('--pages-dir', help="serve saved article pages (<Title>.html) instead of synthetic ones")
+  parser.add_argument('--pages', type=int, default=len(DEFAULT_TITLES), help="number of synthetic pages")
+  parser.add_argument('--page-paragraphs', type=int, default=40, help="paragraphs per synthetic page")
+  parser.add_argument('--queries', metavar='FILE', help="one query per line (default: generated from the page titles)")
+  parser.add_argument('--requests', type=int, default=50, help="requests per concurrency level")
+  parser.add_argument('--concurrency', default='1,4,16', help="comma-separated concurrency levels to sweep")
+  parser.add_argument('--warmup', type=int, default=2, help="requests run before the sweep and left out of it")
+  parser.add_argument('--fetch-latency', type=float, default=0.05, help="seconds the fixture wiki waits before each response")
+  parser.add_argument('--llm-latency', type=float, default=0.3, help="seconds the stub LLM waits before the first token")
+  parser.add_argument('--token-delay', type=float, default=0.0, help="seconds between stub LLM tokens")
+  parser.add_argument('--answer-words', type=int, default=40, help="length of the stub LLM's answers")
+  parser.add_argument('--keep-caches', action='store_true', help="keep the page, feature and answer caches (default: cold runs)")
+  parser.add_argument('--speculate', action='store_true', help="turn on speculative subject fetching")
+  parser.add_argument('--extraction-workers', type=int, default=0, help="extract in a process pool of this size")
+  parser.add_argument('--parser', help="HTML parser backend (html.parser, lxml, selectolax)")
+  parser.add_argument('--local-wiki-dir', help="answer from an offline index instead of the fixture server where it has the page")
+  parser.add_argument('--seed', type=int, default=0, help="seed for the synthetic pages")
+  parser.add_argument('--output', metavar='FILE', help="write the results as JSON")
+  parser.add_argument('--compare', metavar='FILE', help="compare against results written earlier with --output")
+  parser.add_argument('--verbose', action='store_true', help="keep the pipeline's own output")
+  args = parser.parse_args(argv)
+  args.concurrency = [int(level) for level in args.concurrency.split(',') if level.strip()]
+
+  if args.pages_dir:
+    pages = load_fixture_pages(args.pages_dir)
+  else:
+    pages = synthetic_pages(args.pages, args.page_paragraphs, args.seed)
+  if not pages:
+    print("No fixture pages to serve.", file=sys.stderr)
+    return 1
+
+  results = asyncio.run(run_benchmark(args, pages))
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as f:
+      json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+  if args.compare:
+    with open(args.compare, 'r', encoding='utf-8') as f:
+      compare_results(json.load(f), results)
+  return 0
+
+if __name__ == '__main__':
+  sys.exit(main())
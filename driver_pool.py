@@ -0,0 +1,246 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_CHROME_ARGUMENTS = ['--headless', '--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu']
+# Where the last successful chromedriver check is remembered between processes
+CHROMEDRIVER_CACHE_PATH = os.path.join(os.path.expanduser('~'), '.cache', 'search-minecraft-wiki', 'chromedriver.json')
+CHROMEDRIVER_CHECK_TTL = 24 * 3600
+
+_chromedriver_lock = threading.Lock()
+_chromedriver_checked = False
+_chromedriver_path = None
+
+def _read_chromedriver_cache(cache_path):
+  try:
+    with open(cache_path, 'r', encoding='utf-8') as f:
+      return json.load(f)
+  except (OSError, ValueError):
+    return None
+
+def _write_chromedriver_cache(cache_path, entry):
+  try:
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    temp_path = f'{cache_path}.{os.getpid()}.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as f:
+      json.dump(entry, f)
+    os.replace(temp_path, cache_path)
+  except OSError as e:
+    print(f"Could not record the chromedriver check in {cache_path}: {e}")
+
+def ensure_chromedriver(cache_path=CHROMEDRIVER_CACHE_PATH, ttl=CHROMEDRIVER_CHECK_TTL):
+  '''
+  output: path - (string) the chromedriver binary, or None if it couldn't be installed (Selenium Manager may still find one)
+
+  Runs chromedriver_autoinstaller at most once per process. While the last successful check recorded in cache_path
+  is younger than ttl and its binary is still there, the Chrome version probe and download check are skipped entirely.
+  '''
+  global _chromedriver_checked, _chromedriver_path
+  with _chromedriver_lock:
+    if _chromedriver_checked:
+      return _chromedriver_path
+    _chromedriver_checked = True
+    cached = _read_chromedriver_cache(cache_path) if cache_path else None
+    if cached and os.path.exists(cached.get('path', '')) and time.time() - cached.get('checked_at', 0) < ttl:
+      _chromedriver_path = cached['path']
+      # install() puts the driver's directory on PATH; do the same for the cached one
+      directory = os.path.dirname(_chromedriver_path)
+      if directory not in os.environ.get('PATH', '').split(os.pathsep):
+        os.environ['PATH'] = directory + os.pathsep + os.environ.get('PATH', '')
+      return _chromedriver_path
+    try:
+      import chromedriver_autoinstaller
+      _chromedriver_path = chromedriver_autoinstaller.install() or None
+    except Exception as e:
+      print(f"Error installing/checking chromedriver: {e}")
+      return None
+    if _chromedriver_path and cache_path:
+      _write_chromedriver_cache(cache_path, {'path': _chromedriver_path, 'checked_at': time.time()})
+    return _chromedriver_path
+
+def make_chrome_driver(chrome_options_dict):
+  # Selenium is only imported once a browser is actually needed; HTTP-only runs never pay for it
+  from selenium import webdriver
+  ensure_chromedriver()
+  options = webdriver.ChromeOptions()
+  for arg in chrome_options_dict.get('arguments', DEFAULT_CHROME_ARGUMENTS):
+    options.add_argument(arg)
+  driver = webdriver.Chrome(options=options)
+  driver.implicitly_wait(1)
+  return driver
+
+class DriverPool:
+  '''
+  A bounded pool of long-lived WebDriver sessions.
+  Drivers are leased out to one caller at a time and recycled after max_pages page loads or when a caller reports a crash.
+  '''
+  def __init__(self, size=2, chrome_options_dict=None, max_pages=50, acquire_timeout=30, driver_factory=None):
+    if size < 1:
+      raise ValueError("DriverPool size must be at least 1")
+    self.size = size
+    self.chrome_options_dict = chrome_options_dict or {'arguments': DEFAULT_CHROME_ARGUMENTS}
+    self.max_pages = max_pages
+    self.acquire_timeout = acquire_timeout
+    self.driver_factory = driver_factory or make_chrome_driver
+    self._idle = []
+    self._pages = {} # id(driver) -> pages loaded by that driver
+    self._leased = set()
+    self._starting = 0
+    self._waiting = 0
+    self._closed = False
+    self._condition = threading.Condition()
+    self.launches = 0
+    self.recycles = 0
+    self.crashes = 0
+    self.saturated_acquires = 0
+
+  def _launch(self):
+    driver = self.driver_factory(self.chrome_options_dict)
+    with self._condition:
+      self.launches += 1
+      self._pages[id(driver)] = 0
+    return driver
+
+  def _discard(self, driver):
+    self._pages.pop(id(driver), None)
+    try:
+      driver.quit()
+    except Exception as e:
+      print(f"DriverPool: error while quitting driver: {e}")
+
+  def start(self, count=None):
+    # Warm every session (or the first count) up front so the first queries don't pay Chrome's cold start
+    drivers = []
+    with self._condition:
+      target = self.size if count is None else min(count, self.size)
+      missing = max(0, target - len(self._idle) - len(self._leased) - self._starting)
+      self._starting += missing
+    try:
+      for _ in range(missing):
+        drivers.append(self._launch())
+    finally:
+      with self._condition:
+        self._starting -= missing
+        self._idle.extend(drivers)
+        self._condition.notify_all()
+    return self
+
+  async def start_async(self, count=None):
+    await asyncio.to_thread(self.start, count)
+    return self
+
+  def acquire(self, timeout=None):
+    timeout = self.acquire_timeout if timeout is None else timeout
+    deadline = time.monotonic() + timeout
+    with self._condition:
+      if self._closed:
+        raise RuntimeError("DriverPool is closed")
+      if not self._idle and len(self._leased) + self._starting >= self.size:
+        self.saturated_acquires += 1
+        print(f"DriverPool: saturated ({len(self._leased)}/{self.size} in use, {self._waiting + 1} waiting)")
+      self._waiting += 1
+      try:
+        while not self._idle and len(self._leased) + self._starting >= self.size:
+          remaining = deadline - time.monotonic()
+          if remaining <= 0:
+            raise TimeoutError(f"No WebDriver became available within {timeout}s")
+          self._condition.wait(remaining)
+          if self._closed:
+            raise RuntimeError("DriverPool is closed")
+      finally:
+        self._waiting -= 1
+      if self._idle:
+        driver = self._idle.pop()
+        self._leased.add(id(driver))
+        return driver
+      # A slot is free but its driver was recycled or crashed, so launch a replacement outside the lock
+      self._starting += 1
+    try:
+      driver = self._launch()
+    finally:
+      with self._condition:
+        self._starting -= 1
+    with self._condition:
+      self._leased.add(id(driver))
+    return driver
+
+  def release(self, driver, pages_loaded=0, crashed=False):
+    with self._condition:
+      self._leased.discard(id(driver))
+      pages = self._pages.get(id(driver), 0) + pages_loaded
+      # A pool shrunk by resize() retires the drivers it no longer has room for as they come back
+      surplus = len(self._idle) + len(self._leased) + self._starting >= self.size
+      retire = crashed or self._closed or pages >= self.max_pages or surplus
+      if retire:
+        if crashed:
+          self.crashes += 1
+        elif not self._closed and pages >= self.max_pages:
+          self.recycles += 1
+        self._pages.pop(id(driver), None)
+      else:
+        self._pages[id(driver)] = pages
+        self._idle.append(driver)
+      self._condition.notify()
+    if retire:
+      self._discard(driver)
+
+  def resize(self, size):
+    # Growing lets waiters launch drivers straight away; shrinking quits surplus idle drivers now and leased ones on release
+    if size < 1:
+      raise ValueError("DriverPool size must be at least 1")
+    with self._condition:
+      self.size = size
+      surplus = max(0, len(self._idle) + len(self._leased) + self._starting - size)
+      drivers = self._idle[:surplus]
+      del self._idle[:surplus]
+      for driver in drivers:
+        self._pages.pop(id(driver), None)
+      self._condition.notify_all()
+    for driver in drivers:
+      self._discard(driver)
+
+  @contextmanager
+  def lease(self, timeout=None):
+    driver = self.acquire(timeout)
+    usage = {'pages_loaded': 0}
+    try:
+      yield driver, usage
+    except Exception:
+      self.release(driver, usage['pages_loaded'], crashed=True)
+      raise
+    self.release(driver, usage['pages_loaded'])
+
+  async def acquire_async(self, timeout=None):
+    return await asyncio.to_thread(self.acquire, timeout)
+
+  async def release_async(self, driver, pages_loaded=0, crashed=False):
+    await asyncio.to_thread(self.release, driver, pages_loaded, crashed)
+
+  def stats(self):
+    with self._condition:
+      in_use = len(self._leased)
+      return {
+        'size': self.size,
+        'idle': len(self._idle),
+        'in_use': in_use,
+        'waiting': self._waiting,
+        'saturation': in_use / self.size,
+        'saturated_acquires': self.saturated_acquires,
+        'launches': self.launches,
+        'recycles': self.recycles,
+        'crashes': self.crashes,
+      }
+
+  def close(self):
+    with self._condition:
+      self._closed = True
+      drivers, self._idle = self._idle, []
+      self._condition.notify_all()
+    for driver in drivers:
+      self._discard(driver)
+
+  async def close_async(self):
+    await asyncio.to_thread(self.close)
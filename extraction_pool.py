@@ -0,0 +1,53 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from html_parsers import parse_page_html, warm_parser
+from wiki_page import WikiPage
+
+def _extract_in_worker(html_bytes, backend, content_only):
+  return parse_page_html(html_bytes.decode('utf-8'), backend, content_only).to_bytes()
+
+def _warm(backend, content_only):
+  warm_parser(backend, content_only)
+  return True
+
+class ExtractionPool:
+  '''
+  Runs page parsing and extraction in worker processes so concurrent requests use every core instead of queueing on the GIL.
+  Workers receive the raw UTF-8 HTML bytes and send back the WikiPage from parse_page_html in its binary form.
+  Each worker is replaced after max_tasks_per_child pages to cap memory creep from parser caches.
+  '''
+  def __init__(self, max_workers=None, max_tasks_per_child=200, backend='html.parser', content_only=False):
+    self.max_workers = max_workers or multiprocessing.cpu_count()
+    self.max_tasks_per_child = max_tasks_per_child
+    self.backend = backend
+    self.content_only = content_only
+    # max_tasks_per_child isn't supported with fork, and spawn keeps workers free of the parent's sockets and drivers
+    self._executor = ProcessPoolExecutor(
+      max_workers=self.max_workers,
+      mp_context=multiprocessing.get_context('spawn'),
+      max_tasks_per_child=max_tasks_per_child,
+    )
+    self.submitted = 0
+    self.in_flight = 0
+
+  async def warm(self):
+    # Spawning and importing bs4/lxml takes a moment per worker; pay it before traffic arrives
+    loop = asyncio.get_running_loop()
+    await asyncio.gather(*(loop.run_in_executor(self._executor, _warm, self.backend, self.content_only) for _ in range(self.max_workers)))
+
+  async def extract(self, html):
+    loop = asyncio.get_running_loop()
+    self.submitted += 1
+    self.in_flight += 1
+    try:
+      data = await loop.run_in_executor(self._executor, _extract_in_worker, html.encode('utf-8'), self.backend, self.content_only)
+      return WikiPage.from_bytes(data)
+    finally:
+      self.in_flight -= 1
+
+  def stats(self):
+    return {'workers': self.max_workers, 'max_tasks_per_child': self.max_tasks_per_child, 'submitted': self.submitted, 'in_flight': self.in_flight}
+
+  def close(self):
+    self._executor.shutdown(wait=True, cancel_futures=True)
@@ -0,0 +1,186 @@
+import argparse
+import asyncio
+import json
+import re
+import time
+
+def default_reply(prompt_text):
+  return f"Answer: This is a fake reply to a {len(prompt_text)}-character prompt."
+
+def split_tokens(text):
+  # Word-sized pieces with their trailing whitespace, close enough to how real completions arrive
+  return re.findall(r'\s*\S+\s*', text) or [text]
+
+class FakeChatServer:
+  '''
+  Local stand-in for the OpenAI chat completions endpoint, so the client, streaming and latency paths can be exercised offline.
+  Point AsyncOpenAI(base_url=server.base_url) at it. Replies come from reply(prompt_text); first_token_delay and token_delay
+  (seconds) shape the timing for both plain and streamed (stream=True, server-sent events) requests.
+  The first rate_limit_first requests are answered with 429 and a Retry-After, to exercise client retries; the first
+  reject_first are answered with 400, which clients must not retry.
+  '''
+  def __init__(self, host='127.0.0.1', port=0, reply=default_reply, first_token_delay=0.0, token_delay=0.0, rate_limit_first=0, reject_first=0):
+    self.host = host
+    self.port = port
+    self.reply = reply
+    self.first_token_delay = first_token_delay
+    self.token_delay = token_delay
+    self.rate_limit_first = rate_limit_first
+    self.reject_first = reject_first
+    self.requests = 0
+    self.rate_limited = 0
+    self.rejected = 0
+    self.streamed_requests = 0
+    self._server = None
+    self._connections = {} # writer -> handler task
+
+  @property
+  def base_url(self):
+    return f"http://{self.host}:{self.port}/v1"
+
+  async def start(self):
+    self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+    self.port = self._server.sockets[0].getsockname()[1]
+    return self
+
+  async def close(self):
+    if self._server is not None:
+      self._server.close()
+      # Idle keep-alive connections would otherwise hold their handlers open past shutdown
+      for writer in list(self._connections):
+        writer.close()
+      await asyncio.gather(*self._connections.values(), return_exceptions=True)
+      await self._server.wait_closed()
+      self._server = None
+
+  async def __aenter__(self):
+    return await self.start()
+
+  async def __aexit__(self, *exc_info):
+    await self.close()
+
+  async def _handle_connection(self, reader, writer):
+    self._connections[writer] = asyncio.current_task()
+    try:
+      while True:
+        request_line = await reader.readline()
+        if not request_line:
+          break
+        method, path, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+          line = await reader.readline()
+          if line in (b'\r\n', b'\n', b''):
+            break
+          name, _, value = line.decode('latin-1').partition(':')
+          headers[name.strip().lower()] = value.strip()
+        body = await reader.readexactly(int(headers.get('content-length', 0)))
+        keep_alive = await self._handle_request(method, path, body, writer)
+        if not keep_alive:
+          break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+      pass
+    finally:
+      self._connections.pop(writer, None)
+      writer.close()
+
+  def _write_response(self, writer, status, payload, extra_headers=''):
+    data = json.dumps(payload).encode('utf-8')
+    writer.write(
+      f"HTTP/1.1 {status}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n{extra_headers}Connection: keep-alive\r\n\r\n".encode('latin-1') + data
+    )
+
+  async def _handle_request(self, method, path, body, writer):
+    if method != 'POST' or not path.rstrip('/').endswith('/chat/completions'):
+      self._write_response(writer, '404 Not Found', {'error': {'message': f"No route for {method} {path}", 'type': 'invalid_request_error'}})
+      await writer.drain()
+      return True
+    request = json.loads(body or b'{}')
+    self.requests += 1
+    if self.rate_limited < self.rate_limit_first:
+      self.rate_limited += 1
+      self._write_response(writer, '429 Too Many Requests', {'error': {'message': "Rate limit reached", 'type': 'requests', 'code': 'rate_limit_exceeded'}}, "Retry-After-Ms: 50\r\n")
+      await writer.drain()
+      return True
+    if self.rejected < self.reject_first:
+      self.rejected += 1
+      self._write_response(writer, '400 Bad Request', {'error': {'message': "Invalid request", 'type': 'invalid_request_error', 'code': None}})
+      await writer.drain()
+      return True
+    model = request.get('model', 'fake')
+    prompt_text = ''.join(message.get('content') or '' for message in request.get('messages', []) if message.get('role') == 'user')
+    reply = self.reply(prompt_text)
+    tokens = split_tokens(reply)
+    usage = {'prompt_tokens': len(split_tokens(prompt_text)), 'completion_tokens': len(tokens), 'total_tokens': len(split_tokens(prompt_text)) + len(tokens)}
+    if request.get('stream'):
+      self.streamed_requests += 1
+      include_usage = (request.get('stream_options') or {}).get('include_usage', False)
+      await self._stream_reply(writer, model, tokens, usage if include_usage else None)
+      # The event stream ends with the connection, so it can't be reused
+      return False
+    await asyncio.sleep(self.first_token_delay + self.token_delay * len(tokens))
+    self._write_response(writer, '200 OK', {
+      'id': 'chatcmpl-fake',
+      'object': 'chat.completion',
+      'created': int(time.time()),
+      'model': model,
+      'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': reply}, 'finish_reason': 'stop'}],
+      'usage': usage,
+    })
+    await writer.drain()
+    return True
+
+  async def _stream_reply(self, writer, model, tokens, usage=None):
+    writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\nConnection: close\r\n\r\n")
+    await writer.drain()
+    created = int(time.time())
+    def event(delta, finish_reason=None, usage=None):
+      chunk = {
+        'id': 'chatcmpl-fake',
+        'object': 'chat.completion.chunk',
+        'created': created,
+        'model': model,
+        'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}] if usage is None else [],
+      }
+      if usage is not None:
+        # stream_options.include_usage: one last chunk with no choices carries the totals
+        chunk['usage'] = usage
+      return f"data: {json.dumps(chunk)}\n\n".encode('utf-8')
+    await asyncio.sleep(self.first_token_delay)
+    for i, token in enumerate(tokens):
+      if i:
+        await asyncio.sleep(self.token_delay)
+      writer.write(event({'role': 'assistant', 'content': token} if i == 0 else {'content': token}))
+      await writer.drain()
+    writer.write(event({}, 'stop'))
+    if usage is not None:
+      writer.write(event(None, usage=usage))
+    writer.write(b"data: [DONE]\n\n")
+    await writer.drain()
+
+async def serve(host, port, first_token_delay, token_delay, reply_text, rate_limit_first, reject_first=0):
+  reply = (lambda prompt_text: reply_text) if reply_text else default_reply
+  server = await FakeChatServer(host, port, reply, first_token_delay, token_delay, rate_limit_first, reject_first).start()
+  print(f"Fake chat completions server listening on {server.base_url}")
+  try:
+    await asyncio.Event().wait()
+  finally:
+    await server.close()
+
+def main():
+  parser = argparse.ArgumentParser(description="Serve a fake OpenAI chat completions endpoint for offline testing.")
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8001)
+  parser.add_argument('--first-token-delay', type=float, default=0.0, help="seconds before the first token")
+  parser.add_argument('--token-delay', type=float, default=0.0, help="seconds between tokens")
+  parser.add_argument('--reply', help="fixed reply text (default: a canned answer naming the prompt length)")
+  parser.add_argument('--rate-limit-first', type=int, default=0, help="answer this many requests with 429 before serving normally")
+  parser.add_argument('--reject-first', type=int, default=0, help="answer this many requests with 400 (after any 429s) before serving normally")
+  args = parser.parse_args()
+  try:
+    asyncio.run(serve(args.host, args.port, args.first_token_delay, args.token_delay, args.reply, args.rate_limit_first, args.reject_first))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == '__main__':
+  main()
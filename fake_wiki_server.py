@@ -0,0 +1,269 @@
+import argparse
+import json
+import os
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlsplit
+from wiki_index import normalize_title
+
+DEFAULT_TITLES = (
+  'Dirt', 'Diamond', 'Creeper', 'Beacon', 'Iron Golem', 'Redstone Dust', 'Nether Portal', 'Ender Pearl', 'Oak Log', 'Furnace',
+  'Zombie', 'Skeleton', 'Villager', 'Enchanting Table', 'Obsidian', 'Wolf', 'Blaze', 'Elytra', 'Netherite Ingot', 'Sugar Cane',
+)
+FILLER_WORDS = (
+  'block', 'item', 'mob', 'player', 'biome', 'tool', 'spawn', 'chunk', 'light', 'level', 'damage', 'health', 'craft', 'smelt',
+  'mine', 'world', 'nether', 'end', 'overworld', 'village', 'chest', 'loot', 'redstone', 'water', 'lava', 'stone', 'wood', 'gold',
+  'iron', 'emerald', 'trade', 'drop', 'breed', 'farm', 'night', 'day', 'edition', 'java', 'bedrock', 'texture', 'sound', 'update',
+)
+_revision_id = re.compile(r'"wgRevisionId"\s*:\s*(\d+)')
+
+def synthetic_page_html(title, paragraphs=40, seed=0, revision=None):
+  '''
+  input: title - (string) page title
+         paragraphs - (int) body paragraphs, split into sections every four
+         revision - (int) optional, the revision id written into the page (default: derived from the seed)
+  output: html - (string) a rendered-article-shaped page (infobox, headings, a table) that the extractors treat like the real wiki
+  '''
+  rng = random.Random(zlib.crc32(f'{seed}:{title}'.encode('utf-8')))
+  slug = title.replace(' ', '_')
+  def sentence():
+    return ' '.join(rng.choice(FILLER_WORDS) for _ in range(rng.randint(8, 20))).capitalize() + '.'
+  revision = rng.randint(100000, 999999) if revision is None else revision
+  body = [f'<p><b>{title}</b> is a {rng.choice(FILLER_WORDS)} in Minecraft. {sentence()} {sentence()}</p>']
+  for i in range(paragraphs):
+    if i and i % 4 == 0:
+      body.append(f'<h2><span class="mw-headline">{rng.choice(FILLER_WORDS).capitalize()} {i // 4}</span></h2>')
+    body.append('<p>' + ' '.join(sentence() for _ in range(rng.randint(2, 5))) + '</p>')
+  body.append('<table class="wikitable"><tbody><tr><td><p>' + sentence() + '</p></td></tr></tbody></table>')
+  return (
+    f'<!DOCTYPE html><html><head><title>{title} – Minecraft Wiki</title>'
+    f'<link rel="canonical" href="https://minecraft.wiki/w/{slug}"/>'
+    f'<script>RLCONF={{"wgRevisionId":{revision}}};</script></head><body>'
+    f'<h1 id="firstHeading">{title}</h1>'
+    '<div id="mw-content-text" class="mw-body-content mw-content-ltr" lang="en"><div class="mw-parser-output">'
+    f'<div class="notaninfobox"><div class="mcwiki-header infobox-title">{title}</div>'
+    f'<div class="infobox-imagearea animated-container"><span><img src="/images/{slug}.png" alt=""></span></div>'
+    '<table class="infobox-rows"><tbody>'
+    f'<tr><th>Renewable</th><td>{rng.choice(("Yes", "No"))}</td></tr><tr><th>Stackable</th><td>Yes ({rng.choice((1, 16, 64))})</td></tr>'
+    '</tbody></table></div>' + '\n'.join(body) + '</div></div></body></html>'
+  )
+
+def synthetic_pages(count=len(DEFAULT_TITLES), paragraphs=40, seed=0):
+  '''
+  output: pages - dict of title -> html; past the built-in titles they are numbered ("Dirt 2")
+  '''
+  titles = [DEFAULT_TITLES[i % len(DEFAULT_TITLES)] + (f' {i // len(DEFAULT_TITLES) + 1}' if i >= len(DEFAULT_TITLES) else '') for i in range(count)]
+  return {title: synthetic_page_html(title, paragraphs, seed) for title in titles}
+
+def load_fixture_pages(directory):
+  '''
+  input: directory - (string) saved rendered article pages, one <Title>.html file per page
+  output: pages - dict of title -> html
+  '''
+  pages = {}
+  for name in sorted(os.listdir(directory)):
+    if name.endswith(('.html', '.htm')):
+      with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+        pages[os.path.splitext(name)[0].replace('_', ' ')] = f.read()
+  return pages
+
+def format_timestamp(seconds):
+  return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(seconds))
+
+class _WikiHTTPServer(ThreadingHTTPServer):
+  daemon_threads = True
+  # The default backlog of 5 drops connections under a concurrency sweep, and the SYN retry adds a second to the tail
+  request_queue_size = 128
+
+class FakeWikiServer:
+  '''
+  Local stand-in for minecraft.wiki, so fetching, search resolution and mirror syncing can run offline.
+  Serves /w/<Title> from an in-memory page set and answers two api.php queries:
+  - the generator=search lookup search_resolver makes; a search always hits some page (exact title, then singular,
+    then a page named in the term, then a stable pick) so nothing falls through to the real site,
+  - list=recentchanges, fed by edit_page(), delete_page() and move_page().
+  Every response waits latency seconds first, to model the network round trip.
+  '''
+  def __init__(self, pages, host='127.0.0.1', port=0, latency=0.0):
+    self.pages = dict(pages)
+    self.titles = {normalize_title(title): title for title in self.pages}
+    self.revisions = {title: self._revision_of(title, html) for title, html in self.pages.items()}
+    self.changes = [] # recent changes, oldest first
+    self.latency = latency
+    self.requests = 0
+    self._lock = threading.Lock()
+    self._server = _WikiHTTPServer((host, port), self._make_handler())
+    self._thread = None
+
+  @staticmethod
+  def _revision_of(title, html):
+    match = _revision_id.search(html)
+    return int(match.group(1)) if match else zlib.crc32(title.encode('utf-8'))
+
+  @property
+  def base_url(self):
+    host, port = self._server.server_address[:2]
+    return f'http://{host}:{port}'
+
+  @property
+  def api_url(self):
+    return self.base_url + '/api.php'
+
+  def start(self):
+    self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+    self._thread.start()
+    return self
+
+  def close(self):
+    self._server.shutdown()
+    self._server.server_close()
+
+  def __enter__(self):
+    return self.start()
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def _record_change(self, change):
+    change['ns'] = 0
+    change['rcid'] = len(self.changes) + 1
+    change['timestamp'] = format_timestamp(time.time())
+    self.changes.append(change)
+
+  def edit_page(self, title, html=None):
+    '''
+    Creates or changes a page and logs it; without html a new synthetic revision of the page is generated.
+    output: revision - (int) the page's new revision id
+    '''
+    with self._lock:
+      old_revision = self.revisions.get(title)
+      revision = max(self.revisions.values(), default=0) + 1
+      if html is None:
+        html = synthetic_page_html(title, seed=revision, revision=revision)
+      else:
+        revision = self._revision_of(title, html)
+      self.pages[title] = html
+      self.titles[normalize_title(title)] = title
+      self.revisions[title] = revision
+      change = {'type': 'new' if old_revision is None else 'edit', 'title': title, 'revid': revision, 'old_revid': old_revision or 0}
+      self._record_change(change)
+      return revision
+
+  def delete_page(self, title):
+    with self._lock:
+      self.pages.pop(title, None)
+      self.titles.pop(normalize_title(title), None)
+      self.revisions.pop(title, None)
+      self._record_change({'type': 'log', 'title': title, 'logtype': 'delete', 'logaction': 'delete'})
+
+  def move_page(self, title, new_title):
+    with self._lock:
+      # The article now renders under its new name
+      self.pages[new_title] = self.pages.pop(title).replace(f"/w/{title.replace(' ', '_')}\"", f"/w/{new_title.replace(' ', '_')}\"")
+      self.revisions[new_title] = self.revisions.pop(title)
+      self.titles.pop(normalize_title(title), None)
+      self.titles[normalize_title(new_title)] = new_title
+      self._record_change({'type': 'log', 'title': title, 'logtype': 'move', 'logaction': 'move', 'logparams': {'target_ns': 0, 'target_title': new_title}})
+
+  def find_title(self, search_term):
+    key = normalize_title(search_term)
+    if key in self.titles:
+      return self.titles[key]
+    if key.endswith('s') and key[:-1] in self.titles:
+      return self.titles[key[:-1]]
+    for normalized, title in self.titles.items():
+      if normalized and re.search(rf'\b{re.escape(normalized)}s?\b', key):
+        return title
+    titles = sorted(self.pages)
+    return titles[zlib.crc32(key.encode('utf-8')) % len(titles)] if titles else None
+
+  def _search_response(self, query):
+    title = self.find_title(query.get('gsrsearch', [''])[0])
+    if title is None:
+      return {'batchcomplete': True}
+    page = {'title': title, 'fullurl': f"{self.base_url}/w/{title.replace(' ', '_')}", 'lastrevid': self.revisions[title], 'index': 1}
+    return {'batchcomplete': True, 'query': {'pages': [page]}}
+
+  def _recent_changes_response(self, query):
+    # rcdir=newer from rcstart, continued by position in the change log
+    start = query.get('rcstart', [''])[0]
+    limit = int(query.get('rclimit', ['50'])[0])
+    position = int(query.get('rccontinue', ['0'])[0])
+    matching = [change for change in self.changes[position:] if change['timestamp'] >= start]
+    response = {'batchcomplete': True, 'query': {'recentchanges': matching[:limit]}}
+    if len(matching) > limit:
+      response['continue'] = {'rccontinue': str(self.changes.index(matching[limit])), 'continue': '-||'}
+    return response
+
+  def _make_handler(self):
+    server = self
+    class Handler(BaseHTTPRequestHandler):
+      protocol_version = 'HTTP/1.1'
+      # Buffered so headers and body leave in one write; split writes on a keep-alive socket stall on delayed ACKs
+      wbufsize = 1 << 16
+
+      def do_GET(self):
+        with server._lock:
+          server.requests += 1
+        if server.latency:
+          time.sleep(server.latency)
+        parts = urlsplit(self.path)
+        if parts.path == '/api.php':
+          query = parse_qs(parts.query)
+          with server._lock:
+            if query.get('list') == ['recentchanges']:
+              payload = server._recent_changes_response(query)
+            else:
+              payload = server._search_response(query)
+          self._send(200, 'application/json', json.dumps(payload))
+          return
+        title = unquote(parts.path[len('/w/'):]).replace('_', ' ') if parts.path.startswith('/w/') else None
+        html = server.pages.get(title)
+        if html is None:
+          self._send(404, 'text/html', '<html><body>Not found</body></html>')
+        else:
+          self._send(200, 'text/html; charset=utf-8', html)
+
+      def _send(self, status, content_type, text):
+        body = text.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      def log_message(self, format, *args):
+        pass
+    return Handler
+
+def main():
+  parser = argparse.ArgumentParser(description="Serve a fake minecraft.wiki (articles, api.php search and RecentChanges) for offline testing.")
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8002)
+  parser.add_argument('--pages-dir', help="serve saved article pages (<Title>.html) instead of synthetic ones")
+  parser.add_argument('--pages', type=int, default=len(DEFAULT_TITLES), help="number of synthetic pages")
+  parser.add_argument('--latency', type=float, default=0.0, help="seconds to wait before each response")
+  parser.add_argument('--edit-every', type=float, default=0.0, help="edit a random page this often (seconds), to feed RecentChanges")
+  args = parser.parse_args()
+  pages = load_fixture_pages(args.pages_dir) if args.pages_dir else synthetic_pages(args.pages)
+  server = FakeWikiServer(pages, args.host, args.port, args.latency).start()
+  print(f"Fake wiki listening on {server.base_url} (api.php at {server.api_url})")
+  try:
+    while True:
+      if args.edit_every:
+        time.sleep(args.edit_every)
+        title = random.choice(sorted(server.pages))
+        print(f"Edited {title} (revision {server.edit_page(title)})")
+      else:
+        time.sleep(3600)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    server.close()
+
+if __name__ == '__main__':
+  main()
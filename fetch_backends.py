@@ -0,0 +1,87 @@
+import re
+from collections import namedtuple
+from contextlib import contextmanager
+
+WIKI_BASE_URL = 'https://minecraft.wiki'
+DEFAULT_HEADERS = {'User-Agent': 'Search-Minecraft-Wiki/1.0 (+https://github.com/btoneil2021/Search-Minecraft-Wiki)'}
+
+FetchResult = namedtuple('FetchResult', ['url', 'status', 'html', 'headers'])
+
+def page_needs_javascript(html):
+  # minecraft.wiki renders articles server-side; if the content div is missing we probably got a JS shell or a challenge page
+  return re.search(r'<div\b[^>]*\bclass="[^"]*\bmw-body-content\b', html) is None
+
+class HttpPage:
+  '''
+  A WebDriver-shaped view over one HTTP fetch, so get_soup and search_for_page work unchanged on top of HttpFetchBackend.
+  '''
+  def __init__(self, backend):
+    self.backend = backend
+    self.page_source = ''
+    self.current_url = None
+    self.status = None
+
+  def get(self, url):
+    result = self.backend.fetch(url)
+    self.page_source = result.html
+    self.current_url = result.url
+    self.status = result.status
+
+  def implicitly_wait(self, seconds):
+    pass
+
+  def quit(self):
+    pass
+
+class HttpFetchBackend:
+  '''
+  Browserless fetch engine on one keep-alive requests.Session shared by every caller.
+  '''
+  def __init__(self, pool_size=10, timeout=10, headers=None):
+    # Imported here so loading the module stays cheap for callers that only use the async backend (and vice versa)
+    import requests
+    from requests.adapters import HTTPAdapter
+    self.timeout = timeout
+    self.session = requests.Session()
+    self.session.headers.update(headers or DEFAULT_HEADERS)
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    self.session.mount('https://', adapter)
+    self.session.mount('http://', adapter)
+
+  def fetch(self, url, headers=None):
+    response = self.session.get(url, timeout=self.timeout, headers=headers)
+    return FetchResult(response.url, response.status_code, response.text, response.headers)
+
+  def new_page(self):
+    return HttpPage(self)
+
+  @contextmanager
+  def lease(self, timeout=None):
+    # Same shape as DriverPool.lease() so execute_scraping can take either
+    yield self.new_page(), {'pages_loaded': 0}
+
+  def stats(self):
+    return {'backend': 'http'}
+
+  def close(self):
+    self.session.close()
+
+class AsyncHttpFetchBackend:
+  '''
+  Async twin of HttpFetchBackend on a pooled httpx.AsyncClient.
+  '''
+  def __init__(self, max_connections=20, timeout=10, headers=None):
+    import httpx
+    self.client = httpx.AsyncClient(
+      headers=headers or DEFAULT_HEADERS,
+      timeout=timeout,
+      follow_redirects=True,
+      limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+    )
+
+  async def fetch(self, url, headers=None):
+    response = await self.client.get(url, headers=headers)
+    return FetchResult(str(response.url), response.status_code, response.text, response.headers)
+
+  async def close(self):
+    await self.client.aclose()
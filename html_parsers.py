@@ -0,0 +1,221 @@
+import importlib.util
+import re
+from instrumentation import stage
+from wiki_extract import extract_page_sections
+from wiki_page import WikiPage
+
+PARSER_BACKENDS = ('html.parser', 'lxml', 'selectolax')
+
+_content_start = re.compile(r'<div\b[^>]*\bclass\s*=\s*"mw-body-content mw-content-ltr"')
+_info_box_start = re.compile(r'<div\b[^>]*\bclass\s*=\s*"(?:[^"]*\s)?notaninfobox(?:\s[^"]*)?"')
+_canonical_link = re.compile(r'<link\b[^>]*\brel="canonical"[^>]*\bhref="([^"]+)"|<link\b[^>]*\bhref="([^"]+)"[^>]*\brel="canonical"')
+_revision_id = re.compile(r'"wgRevisionId"\s*:\s*(\d+)')
+
+def available_parser_backends():
+  backends = ['html.parser']
+  # Checked without importing bs4, lxml or selectolax; the parsers are loaded on the first parse (or by warm_parser)
+  if importlib.util.find_spec('lxml') is not None:
+    backends.append('lxml')
+  if importlib.util.find_spec('selectolax') is not None:
+    backends.append('selectolax')
+  return backends
+
+def page_identity_from_html(html):
+  '''
+  input: html - (string) a rendered wiki article
+  output: (canonical_url, revision_id) - read straight from the markup, so it works whichever backend parses the page
+  '''
+  canonical = _canonical_link.search(html)
+  revision = _revision_id.search(html)
+  canonical_url = (canonical.group(1) or canonical.group(2)).replace('&amp;', '&') if canonical else None
+  return canonical_url, int(revision.group(1)) if revision else None
+
+def content_only_html(html):
+  # Skip <head> (styles, RLCONF scripts) and the page chrome before the content div, or before the infobox when a skin puts
+  # it ahead of the content. Only a <p> in a table before that point, identical to one in the content, can change the result
+  match = _content_start.search(html)
+  if match is None:
+    return html
+  start = match.start()
+  info_box = _info_box_start.search(html, 0, start)
+  if info_box is not None:
+    start = info_box.start()
+  return '<html><body>' + html[start:]
+
+def parse_soup(html, backend='html.parser', content_only=False):
+  if content_only:
+    html = content_only_html(html)
+  # selectolax doesn't build a soup; callers that need one (the search page) get the stock parser
+  from bs4 import BeautifulSoup
+  features = backend if backend in ('html.parser', 'lxml') else 'html.parser'
+  return BeautifulSoup(html, features)
+
+def _lexbor_text(node):
+  # Matches bs4's .text, which skips the strings bs4 files under their own types (script, style, template, rt, rp)
+  parts = []
+  stack = [node]
+  while stack:
+    current = stack.pop()
+    tag = current.tag
+    if tag == '-text':
+      parts.append(current.text_content or '')
+    elif tag not in ('script', 'style', 'template', 'rt', 'rp', '_comment'):
+      children = list(current.iter(include_text=True))
+      stack.extend(reversed(children))
+  return ''.join(parts)
+
+def _lexbor_classes(node):
+  value = node.attributes.get('class')
+  return value.split() if value is not None else None
+
+def _lexbor_has_class(node, value):
+  classes = _lexbor_classes(node)
+  if classes is None:
+    return False
+  return value in classes or (len(classes) != 1 and ' '.join(classes) == value)
+
+def _lexbor_find(node, tag, class_value=None):
+  stack = list(reversed(list(node.iter())))
+  while stack:
+    current = stack.pop()
+    if current.tag == tag and (class_value is None or _lexbor_has_class(current, class_value)):
+      return current
+    stack.extend(reversed(list(current.iter())))
+  return None
+
+def _lexbor_find_all(node, tag):
+  found = []
+  stack = list(reversed(list(node.iter())))
+  while stack:
+    current = stack.pop()
+    if current.tag == tag:
+      found.append(current)
+    stack.extend(reversed(list(current.iter())))
+  return found
+
+def _lexbor_info_box_fields(info_box):
+  info = {}
+  name_tag = _lexbor_find(info_box, 'div', 'mcwiki-header infobox-title')
+  if name_tag: info["name"] = _lexbor_text(name_tag).strip()
+  image_tag_container = _lexbor_find(info_box, 'div', 'infobox-imagearea animated-container')
+  if image_tag_container:
+    image_tag = _lexbor_find(image_tag_container, 'img')
+    if image_tag and 'src' in image_tag.attributes: info["image_url"] = "https://minecraft.wiki" + image_tag.attributes['src']
+  info["details"] = {}
+  table = _lexbor_find(info_box, 'table', 'infobox-rows')
+  if table:
+    for row in _lexbor_find_all(table, 'tr'):
+      key = _lexbor_find(row, 'th')
+      if key is None: continue
+      value = _lexbor_find(row, 'td')
+      if value is None: continue
+      info["details"][_lexbor_text(key).strip()] = _lexbor_text(value).strip()
+  return info
+
+def extract_page_sections_lexbor(html):
+  '''
+  Same walk as wiki_extract.extract_page_sections over a Lexbor (selectolax) tree.
+  Lexbor parses like a browser (HTML5 rules), so malformed markup such as a <p> inside a <p> can nest differently than in html.parser.
+  '''
+  from selectolax.lexbor import LexborHTMLParser
+  with stage('parse', backend='selectolax'):
+    tree = LexborHTMLParser(html)
+  with stage('extract', backend='selectolax'):
+    return _lexbor_sections(tree)
+
+def _lexbor_sections(tree):
+  info_box = None
+  container = None
+  elements = []
+  table_paragraphs = []
+  stack = [(tree.root, 0, False)] if tree.root is not None else []
+  while stack:
+    node, table_depth, in_container = stack.pop()
+    name = node.tag
+    if name == 'p' and table_depth:
+      table_paragraphs.append(node)
+    if in_container and name in ('p', 'h2', 'h3'):
+      elements.append((node, table_depth > 0))
+    if name == 'div':
+      if info_box is None and _lexbor_has_class(node, 'notaninfobox'):
+        info_box = node
+      if container is None and _lexbor_has_class(node, 'mw-body-content mw-content-ltr'):
+        container = node
+        in_container = True
+    if name == 'table':
+      table_depth += 1
+    stack.extend((child, table_depth, in_container) for child in reversed(list(node.iter())))
+
+  info = _lexbor_info_box_fields(info_box) if info_box is not None else {}
+
+  # Same value-equality quirk as extract_page, with the node's outer HTML standing in for str(tag)
+  table_texts = {_lexbor_text(node) for node in table_paragraphs}
+  table_markup = None
+  paragraphs = []
+  heading_flags = []
+  for node, in_table in elements:
+    text = _lexbor_text(node)
+    if node.tag == 'p':
+      if in_table:
+        continue
+      if text in table_texts:
+        if table_markup is None:
+          table_markup = {p.html for p in table_paragraphs}
+        if node.html in table_markup:
+          continue
+    paragraphs.append(text.strip())
+    heading_flags.append(node.tag != 'p')
+  return info, paragraphs, heading_flags
+
+def extract_page_lexbor(html):
+  info, paragraphs, _ = extract_page_sections_lexbor(html)
+  return info, paragraphs
+
+def extract_sections_from_html(html, backend='html.parser', content_only=False):
+  '''
+  input: html - (string) a rendered wiki article
+         backend - (string) one of PARSER_BACKENDS
+         content_only - (bool) parse only from the content div onwards
+  output: (info, paragraphs, heading_flags) - as returned by wiki_extract.extract_page_sections
+  '''
+  if backend not in PARSER_BACKENDS:
+    raise ValueError(f"Unknown parser backend {backend!r}; expected one of {PARSER_BACKENDS}")
+  if content_only:
+    html = content_only_html(html)
+  if backend == 'selectolax':
+    if importlib.util.find_spec('selectolax') is None:
+      raise ImportError("The selectolax parser backend needs the selectolax package (pip install selectolax)")
+    return extract_page_sections_lexbor(html)
+  from bs4 import BeautifulSoup
+  with stage('parse', backend=backend):
+    soup = BeautifulSoup(html, backend)
+  with stage('extract', backend=backend):
+    return extract_page_sections(soup)
+
+def extract_page_from_html(html, backend='html.parser', content_only=False):
+  '''
+  output: (info, paragraphs) - as returned by wiki_extract.extract_page
+  '''
+  info, paragraphs, _ = extract_sections_from_html(html, backend, content_only)
+  return info, paragraphs
+
+def parse_page_html(html, backend='html.parser', content_only=False):
+  '''
+  input: html - (string) a rendered wiki article
+  output: page - (WikiPage) with the canonical url and revision read from the markup; the title is left for the caller
+  '''
+  canonical_url, revision = page_identity_from_html(html)
+  info, paragraphs, heading_flags = extract_sections_from_html(html, backend, content_only)
+  return WikiPage.from_extracted(None, canonical_url, revision, info, paragraphs, heading_flags)
+
+# Smallest page that takes every branch of the extractors: infobox, heading, paragraph and a table
+_WARMUP_HTML = (
+  '<html><head><link rel="canonical" href="https://minecraft.wiki/w/Warmup"/></head><body>'
+  '<div class="mw-body-content mw-content-ltr"><div class="notaninfobox"><div class="mcwiki-header infobox-title">Warmup</div>'
+  '<table class="infobox-rows"><tr><th>Key</th><td>Value</td></tr></table></div>'
+  '<p>Warmup.</p><h2>Section</h2><table><tr><td><p>Cell</p></td></tr></table></div></body></html>'
+)
+
+def warm_parser(backend='html.parser', content_only=False):
+  # Imports the parser and runs the extraction path once, so the first real page doesn't pay for either
+  parse_page_html(_WARMUP_HTML, backend, content_only)
@@ -0,0 +1,186 @@
+import contextvars
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+try:
+  from opentelemetry import trace as otel_trace
+except ImportError:
+  otel_trace = None
+
+# Timings of the request running in the current task (and the threads it hands work to); None outside a timed request
+_stage_timings = contextvars.ContextVar('stage_timings', default=None)
+# Set by enable_tracing(); stages are only exported as spans while it is
+_tracer = None
+
+# Seconds; from a cache hit up to a slow LLM reply
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class StageTimings:
+  '''
+  Seconds spent in each pipeline stage by one request. A stage that runs more than once is summed;
+  stages can nest (extract inside the page load), so they don't add up to the total.
+  '''
+  def __init__(self):
+    self.stages = {}
+
+  def add(self, name, seconds):
+    self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+def _label_value(value):
+  if isinstance(value, bool):
+    return 'true' if value else 'false'
+  return str(value)
+
+def _label_key(labels):
+  return tuple(sorted((key, _label_value(value)) for key, value in labels.items()))
+
+def _format_labels(labels, extra=()):
+  pairs = list(labels) + list(extra)
+  if not pairs:
+    return ''
+  escaped = (f'{key}="' + value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"' for key, value in pairs)
+  return '{' + ','.join(escaped) + '}'
+
+def _format_value(value):
+  if isinstance(value, bool):
+    return '1' if value else '0'
+  if isinstance(value, int):
+    return str(value)
+  if math.isinf(value):
+    return '+Inf' if value > 0 else '-Inf'
+  return repr(float(value))
+
+class MetricsRegistry:
+  '''
+  Process-wide counters and histograms, rendered in the Prometheus text exposition format by to_prometheus().
+  Values other objects already keep (cache and pool stats) aren't copied here on every hit; a collector registered with
+  add_collector() reads them at export time instead.
+  '''
+  def __init__(self, buckets=DEFAULT_BUCKETS):
+    self.buckets = tuple(buckets)
+    self._lock = threading.Lock()
+    self._counters = {} # name -> {label key: value}
+    self._histograms = {} # name -> {label key: [count per bucket..., count above the last bucket, sum]}
+    self._help = {}
+    self._collectors = []
+
+  def describe(self, name, help_text):
+    self._help[name] = help_text
+
+  def count(self, name, amount=1, **labels):
+    key = _label_key(labels)
+    with self._lock:
+      series = self._counters.setdefault(name, {})
+      series[key] = series.get(key, 0) + amount
+
+  def observe(self, name, value, **labels):
+    key = _label_key(labels)
+    with self._lock:
+      series = self._histograms.setdefault(name, {})
+      counts = series.get(key)
+      if counts is None:
+        counts = series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+      index = len(self.buckets)
+      for i, bound in enumerate(self.buckets):
+        if value <= bound:
+          index = i
+          break
+      counts[index] += 1
+      counts[-1] += value
+
+  def value(self, name, **labels):
+    with self._lock:
+      return self._counters.get(name, {}).get(_label_key(labels), 0)
+
+  def add_collector(self, collect):
+    '''
+    input: collect - callable returning an iterable of (name, 'counter' or 'gauge', labels dict, value), called on every export
+    '''
+    self._collectors.append(collect)
+
+  def remove_collector(self, collect):
+    if collect in self._collectors:
+      self._collectors.remove(collect)
+
+  def reset(self):
+    with self._lock:
+      self._counters.clear()
+      self._histograms.clear()
+
+  def _header(self, lines, name, kind):
+    if name in self._help:
+      lines.append(f'# HELP {name} {self._help[name]}')
+    lines.append(f'# TYPE {name} {kind}')
+
+  def to_prometheus(self):
+    lines = []
+    with self._lock:
+      counters = {name: dict(series) for name, series in self._counters.items()}
+      histograms = {name: {key: list(counts) for key, counts in series.items()} for name, series in self._histograms.items()}
+    collected = {}
+    for collect in list(self._collectors):
+      for name, kind, labels, value in collect():
+        collected.setdefault((name, kind), []).append((_label_key(labels), value))
+    for name in sorted(counters):
+      self._header(lines, name, 'counter')
+      for key, value in sorted(counters[name].items()):
+        lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+    for (name, kind), samples in sorted(collected.items()):
+      self._header(lines, name, kind)
+      for key, value in sorted(samples):
+        lines.append(f'{name}{_format_labels(key)} {_format_value(value)}')
+    for name in sorted(histograms):
+      self._header(lines, name, 'histogram')
+      for key, counts in sorted(histograms[name].items()):
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (math.inf,), counts[:-1]):
+          cumulative += bucket_count
+          lines.append(f'{name}_bucket{_format_labels(key, [("le", _format_value(float(bound)))])} {cumulative}')
+        lines.append(f'{name}_sum{_format_labels(key)} {_format_value(counts[-1])}')
+        lines.append(f'{name}_count{_format_labels(key)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+metrics = MetricsRegistry()
+metrics.describe('wiki_stage_duration_seconds', "Time spent in each pipeline stage")
+
+def enable_tracing(tracer_name='search-minecraft-wiki'):
+  '''
+  Exports every stage as an OpenTelemetry span from now on, nested the way the stages nest. Needs opentelemetry-api,
+  plus an SDK and exporter configured by the application for the spans to go anywhere.
+  output: enabled - (bool) False when opentelemetry isn't installed
+  '''
+  global _tracer
+  if otel_trace is None:
+    return False
+  _tracer = otel_trace.get_tracer(tracer_name)
+  return True
+
+def disable_tracing():
+  global _tracer
+  _tracer = None
+
+def start_stage_timings():
+  # Call at the top of the task serving the request; tasks it starts inherit the same timings
+  timings = StageTimings()
+  _stage_timings.set(timings)
+  return timings
+
+@contextmanager
+def stage(name, **attributes):
+  '''
+  Times one pipeline stage: into the current request's StageTimings (if any), the wiki_stage_duration_seconds histogram,
+  and an OpenTelemetry span carrying attributes when tracing is enabled.
+  '''
+  timings = _stage_timings.get()
+  span = _tracer.start_as_current_span(name, attributes=attributes) if _tracer is not None else nullcontext()
+  started = time.perf_counter()
+  try:
+    with span:
+      yield
+  finally:
+    elapsed = time.perf_counter() - started
+    metrics.observe('wiki_stage_duration_seconds', elapsed, stage=name)
+    if timings is not None:
+      timings.add(name, elapsed)
@@ -0,0 +1,112 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+from lru import LRUCache
+
+def normalize_query(text):
+  # "  What is DIRT?? " and "what is dirt" should share one cache entry
+  text = re.sub(r'\s+', ' ', text.strip().lower())
+  return text.rstrip('?!. ')
+
+def make_cache_key(model, text):
+  return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode('utf-8')).hexdigest()
+
+class SQLiteResponseStore:
+  '''
+  Persistent key -> response store with TTL expiry and least-recently-used eviction past max_entries.
+  '''
+  def __init__(self, path, max_entries=100000, ttl=30 * 24 * 3600):
+    self.path = path
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self._lock = threading.Lock()
+    self._connection = sqlite3.connect(path, check_same_thread=False)
+    self._connection.execute(
+      "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, response TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)"
+    )
+    self._connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+    self._connection.commit()
+
+  def get(self, key):
+    now = time.time()
+    with self._lock:
+      row = self._connection.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+      if row is None:
+        return None
+      if self.ttl is not None and now - row[1] > self.ttl:
+        self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+        self._connection.commit()
+        return None
+      self._connection.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+      self._connection.commit()
+      return row[0]
+
+  def contains(self, key):
+    # An unexpired entry exists; unlike get() it doesn't mark the entry as used
+    with self._lock:
+      row = self._connection.execute("SELECT created FROM responses WHERE key = ?", (key,)).fetchone()
+    return row is not None and (self.ttl is None or time.time() - row[0] <= self.ttl)
+
+  def put(self, key, response):
+    now = time.time()
+    with self._lock:
+      self._connection.execute(
+        "INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+        (key, response, now, now),
+      )
+      self._connection.execute(
+        "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+        (self.max_entries,),
+      )
+      self._connection.commit()
+
+  def __len__(self):
+    with self._lock:
+      return self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+  def close(self):
+    with self._lock:
+      self._connection.close()
+
+class FeatureExtractionCache:
+  '''
+  Memoizes the subject/summary extraction reply per (model, normalized query): an in-process LRU,
+  optionally backed by a SQLiteResponseStore so entries survive restarts.
+  '''
+  def __init__(self, memory_entries=4096, sqlite_path=None, max_entries=100000, ttl=30 * 24 * 3600):
+    self.memory = LRUCache(memory_entries, ttl=ttl)
+    self.store = SQLiteResponseStore(sqlite_path, max_entries, ttl) if sqlite_path else None
+    self.store_hits = 0
+
+  def get(self, model, user_query):
+    key = make_cache_key(model, user_query)
+    response = self.memory.get(key)
+    if response is None and self.store is not None:
+      response = self.store.get(key)
+      if response is not None:
+        self.store_hits += 1
+        self.memory.put(key, response)
+    return response
+
+  def contains(self, model, user_query):
+    # For callers that only need to know a reply is cached; the stats count the get() that reads it
+    key = make_cache_key(model, user_query)
+    return self.memory.peek(key) is not None or (self.store is not None and self.store.contains(key))
+
+  def put(self, model, user_query, response):
+    key = make_cache_key(model, user_query)
+    self.memory.put(key, response)
+    if self.store is not None:
+      self.store.put(key, response)
+
+  def stats(self):
+    stats = {'memory': self.memory.stats(), 'store_hits': self.store_hits}
+    if self.store is not None:
+      stats['store_entries'] = len(self.store)
+    return stats
+
+  def close(self):
+    if self.store is not None:
+      self.store.close()
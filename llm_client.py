@@ -0,0 +1,53 @@
+from instrumentation import metrics
+from retrieval import estimate_tokens
+
+metrics.describe('wiki_llm_tokens_total', "Tokens sent to and generated by the LLM, as reported by the API")
+
+def record_token_usage(model, prompt_tokens, completion_tokens):
+  metrics.count('wiki_llm_tokens_total', prompt_tokens, model=model, kind='prompt')
+  metrics.count('wiki_llm_tokens_total', completion_tokens, model=model, kind='completion')
+
+async def request_chat_completion(client, model, prompt_text):
+  '''
+  input: client - (AsyncOpenAI) any client, including one pointed at fake_llm_server
+  output: reply - (string) the whole answer once it has been generated
+  '''
+  chat_completion = await client.chat.completions.create(
+    model=model,
+    messages=[{"role": "user", "content": prompt_text}],
+  )
+  if chat_completion.usage is not None:
+    record_token_usage(model, chat_completion.usage.prompt_tokens, chat_completion.usage.completion_tokens)
+  return chat_completion.choices[0].message.content
+
+async def stream_chat_completion(client, model, prompt_text):
+  '''
+  input: client - (AsyncOpenAI) any client, including one pointed at fake_llm_server
+  output: async generator of text pieces, yielded as the server sends them
+  '''
+  stream = await client.chat.completions.create(
+    model=model,
+    messages=[{"role": "user", "content": prompt_text}],
+    stream=True,
+    stream_options={"include_usage": True},
+  )
+  usage = None
+  pieces = 0
+  try:
+    async for chunk in stream:
+      if chunk.usage is not None:
+        usage = chunk.usage
+      if not chunk.choices:
+        continue
+      content = chunk.choices[0].delta.content
+      if content:
+        pieces += 1
+        yield content
+  finally:
+    if usage is not None:
+      record_token_usage(model, usage.prompt_tokens, usage.completion_tokens)
+    else:
+      # Servers that ignore include_usage: about one token per streamed piece, and the usual estimate for the prompt
+      record_token_usage(model, estimate_tokens(prompt_text), pieces)
+    # Stop the server generating tokens nobody will read when the caller gives up early
+    await stream.close()
@@ -0,0 +1,158 @@
+import asyncio
+import random
+import time
+from llm_client import request_chat_completion, stream_chat_completion
+from retrieval import estimate_tokens
+from single_flight import SingleFlight, StreamFlight
+
+def retryable_errors():
+  # Failures worth another attempt; anything else (bad request, auth) fails the same way every time
+  import openai
+  return (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError, openai.InternalServerError)
+
+def make_client(api_key, base_url=None, timeout=60):
+  # One client per process: its HTTP pool keeps connections alive across requests. Retries are LLMDispatcher's job.
+  # openai is the slowest import in the pipeline, so it is only loaded when a client is made.
+  import openai
+  return openai.AsyncOpenAI(api_key=api_key, base_url=base_url, timeout=timeout, max_retries=0)
+
+class TokenBucket:
+  '''
+  Allows up to per_minute units a minute, refilled continuously, with at most burst units (default a minute's worth) in reserve.
+  Waiters are served in arrival order so a large request isn't starved by a stream of small ones.
+  '''
+  def __init__(self, per_minute, burst=None):
+    self.per_minute = per_minute
+    self.capacity = float(per_minute if burst is None else burst)
+    self.available = self.capacity
+    self.updated = time.monotonic()
+    self.waited = 0.0
+    self._lock = asyncio.Lock()
+
+  def _refill(self):
+    now = time.monotonic()
+    self.available = min(self.capacity, self.available + (now - self.updated) * self.per_minute / 60)
+    self.updated = now
+
+  async def acquire(self, amount=1):
+    amount = min(amount, self.capacity)
+    async with self._lock:
+      self._refill()
+      while self.available < amount:
+        delay = (amount - self.available) * 60 / self.per_minute
+        self.waited += delay
+        await asyncio.sleep(delay)
+        self._refill()
+      self.available -= amount
+
+class LLMDispatcher:
+  '''
+  Every LLM call goes through here:
+  - identical prompts already in flight share one request (single-flight), streamed or not,
+  - requests and estimated tokens are paced by token buckets for the account's RPM/TPM limits,
+  - rate limits, timeouts and 5xx errors are retried with jittered exponential backoff (honouring Retry-After),
+  - at most max_concurrency requests are open at once on the one pooled client.
+  '''
+  def __init__(self, client, model, requests_per_minute=3500, tokens_per_minute=90000, max_concurrency=32,
+               max_retries=4, base_delay=0.5, max_delay=20.0, expected_output_tokens=256):
+    self.client = client
+    self.model = model
+    self.request_bucket = TokenBucket(requests_per_minute)
+    self.token_bucket = TokenBucket(tokens_per_minute)
+    self.max_retries = max_retries
+    self.base_delay = base_delay
+    self.max_delay = max_delay
+    self.expected_output_tokens = expected_output_tokens
+    self._semaphore = asyncio.Semaphore(max_concurrency)
+    self._flights = SingleFlight()
+    self._stream_flights = StreamFlight()
+    self.requests = 0
+    self.retries = 0
+    self.failures = 0
+
+  def _backoff(self, attempt, error):
+    retry_after = None
+    response = getattr(error, 'response', None)
+    if response is not None:
+      value = response.headers.get('retry-after-ms')
+      if value is not None:
+        retry_after = float(value) / 1000
+      elif response.headers.get('retry-after') is not None:
+        try:
+          retry_after = float(response.headers['retry-after'])
+        except ValueError:
+          pass
+    # Full jitter keeps a burst of callers that failed together from retrying together
+    delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+    return max(delay, retry_after) if retry_after is not None else delay
+
+  async def _reserve(self, prompt_text):
+    tokens = estimate_tokens(prompt_text) + self.expected_output_tokens
+    await self.request_bucket.acquire(1)
+    await self.token_bucket.acquire(tokens)
+
+  async def _send(self, prompt_text):
+    for attempt in range(self.max_retries + 1):
+      await self._reserve(prompt_text)
+      try:
+        async with self._semaphore:
+          self.requests += 1
+          return await request_chat_completion(self.client, self.model, prompt_text)
+      except Exception as e:
+        if not isinstance(e, retryable_errors()):
+          raise
+        if attempt == self.max_retries:
+          self.failures += 1
+          raise
+        self.retries += 1
+        delay = self._backoff(attempt, e)
+        print(f"LLM request failed ({type(e).__name__}), retrying in {delay:.2f}s")
+        await asyncio.sleep(delay)
+
+  async def complete(self, prompt_text):
+    '''
+    input: prompt_text - (string) the full prompt
+    output: reply - (string); concurrent calls with the same prompt share a single request
+    '''
+    return await self._flights.do((self.model, prompt_text), lambda: self._send(prompt_text))
+
+  async def stream(self, prompt_text):
+    '''
+    output: async generator of reply pieces; concurrent streams of the same prompt read one request, which is only retried
+            until its first piece arrives
+    '''
+    async for piece in self._stream_flights.stream((self.model, prompt_text), lambda: self._send_stream(prompt_text)):
+      yield piece
+
+  async def _send_stream(self, prompt_text):
+    for attempt in range(self.max_retries + 1):
+      await self._reserve(prompt_text)
+      started = False
+      try:
+        async with self._semaphore:
+          self.requests += 1
+          async for piece in stream_chat_completion(self.client, self.model, prompt_text):
+            started = True
+            yield piece
+        return
+      except Exception as e:
+        if not isinstance(e, retryable_errors()):
+          raise
+        if started or attempt == self.max_retries:
+          self.failures += 1
+          raise
+        self.retries += 1
+        await asyncio.sleep(self._backoff(attempt, e))
+
+  def stats(self):
+    return {
+      'requests': self.requests,
+      'coalesced': self._flights.shared + self._stream_flights.shared,
+      'retries': self.retries,
+      'failures': self.failures,
+      'in_flight': len(self._flights) + len(self._stream_flights),
+      'rate_limit_wait': round(self.request_bucket.waited + self.token_bucket.waited, 3),
+    }
+
+  async def close(self):
+    await self.client.close()
@@ -0,0 +1,159 @@
+import re
+from collections import deque, namedtuple
+from wiki_index import normalize_title
+
+LocalFeatures = namedtuple('LocalFeatures', ['subject', 'summary', 'confidence'])
+
+ACTION_VERBS = (
+  'find', 'get', 'obtain', 'craft', 'make', 'build', 'tame', 'breed', 'kill', 'defeat', 'beat', 'grow', 'farm', 'cure', 'brew',
+  'enchant', 'repair', 'spawn', 'summon', 'locate', 'use', 'mine', 'cook', 'smelt', 'ride', 'feed', 'trade with',
+)
+ATTRIBUTES = (
+  'crafting recipe', 'recipe', 'durability', 'damage', 'health', 'drops', 'uses', 'blast resistance', 'hardness', 'stack size',
+  'spawn rate', 'light level', 'attack damage', 'armor', 'food value',
+)
+_article = r'(?:(?:an?|the|some|my) )?'
+_verbs = '|'.join(ACTION_VERBS)
+_attributes = '|'.join(ATTRIBUTES)
+
+# (pattern over the normalized query, summary template); the first match wins
+INTENT_TEMPLATES = [
+  (re.compile(rf'^how (?:do|can|would|should) (?:i|you|we) (?P<verb>{_verbs}) {_article}(?P<subject>.+)$'), "How to {verb}"),
+  (re.compile(rf'^how to (?P<verb>{_verbs}) {_article}(?P<subject>.+)$'), "How to {verb}"),
+  (re.compile(rf'^where (?:can|do|would|should) (?:i|you|we) (?:find|get|locate) {_article}(?P<subject>.+)$'), "Where to find"),
+  (re.compile(rf'^where (?:is|are) {_article}(?P<subject>.+?)(?: found)?$'), "Where to find"),
+  (re.compile(rf'^what (?:are|is) the best (?P<attribute>\w+) (?:for|on) {_article}(?P<subject>.+)$'), "best {attribute}"),
+  (re.compile(rf'^what (?:are|is) the (?P<attribute>{_attributes}) (?:for|of) {_article}(?P<subject>.+)$'), "{attribute}"),
+  (re.compile(rf'^what does {_article}(?P<subject>.+?) drop$'), "drops"),
+  (re.compile(rf'^what (?:is|are) {_article}(?P<subject>.+?) used for$'), "What is {subject} used for"),
+  (re.compile(rf'^what (?:is|are) {_article}(?P<subject>.+)$'), "What is {subject}"),
+  (re.compile(rf'^(?:tell me about|who is) {_article}(?P<subject>.+)$'), "General information"),
+]
+
+def normalize_query_text(user_query):
+  text = user_query.lower().replace('’', "'")
+  text = re.sub(r"[^a-z0-9' ]+", ' ', text)
+  text = re.sub(r'\s+', ' ', text).strip()
+  # The whole wiki is about the game, so saying so adds nothing to the subject
+  return re.sub(r'\s+(?:in|on) minecraft$', '', text)
+
+class TitleMatcher:
+  '''
+  Aho-Corasick automaton over the words of every title and redirect, so one pass over a query finds every known page name in it.
+  Matches are whole words only; plural forms ("diamonds") are added as aliases of their page.
+  '''
+  def __init__(self):
+    self.goto = [{}]
+    self.fail = [0]
+    self.output = [[]] # state -> [(word count, page title)]
+    self._built = True
+
+  def add(self, alias, title):
+    words = normalize_title(alias).split()
+    if not words:
+      return
+    for variant in (words, words[:-1] + [words[-1] + 's']):
+      state = 0
+      for word in variant:
+        if word not in self.goto[state]:
+          self.goto.append({})
+          self.fail.append(0)
+          self.output.append([])
+          self.goto[state][word] = len(self.goto) - 1
+        state = self.goto[state][word]
+      if not any(length == len(variant) for length, _ in self.output[state]):
+        self.output[state].append((len(variant), title))
+    self._built = False
+
+  def build(self):
+    # Breadth-first failure links; each state also inherits the matches of its failure state
+    queue = deque()
+    for state in self.goto[0].values():
+      self.fail[state] = 0
+      queue.append(state)
+    while queue:
+      state = queue.popleft()
+      for word, child in self.goto[state].items():
+        queue.append(child)
+        fallback = self.fail[state]
+        while fallback and word not in self.goto[fallback]:
+          fallback = self.fail[fallback]
+        self.fail[child] = self.goto[fallback].get(word, 0)
+        self.output[child] = self.output[child] + [match for match in self.output[self.fail[child]] if match not in self.output[child]]
+    self._built = True
+
+  def find_all(self, text):
+    '''
+    output: list of (start word, end word, page title) for every known name in text
+    '''
+    if not self._built:
+      self.build()
+    words = normalize_title(text).split()
+    matches = []
+    state = 0
+    for i, word in enumerate(words):
+      while state and word not in self.goto[state]:
+        state = self.fail[state]
+      state = self.goto[state].get(word, 0)
+      for length, title in self.output[state]:
+        matches.append((i + 1 - length, i + 1, title))
+    return matches
+
+  def longest(self, text):
+    matches = self.find_all(text)
+    if not matches:
+      return None
+    return max(matches, key=lambda match: (match[1] - match[0], -match[0]))
+
+class LocalFeatureExtractor:
+  '''
+  Splits a query into (subject, summary) without an LLM call by matching intent templates and known page names.
+  confidence is 1.0 when a template matched and its subject is exactly a known title or redirect, lower otherwise;
+  callers fall back to the LLM below their threshold.
+  '''
+  def __init__(self, matcher=None):
+    self.matcher = matcher
+
+  @classmethod
+  def from_titles(cls, aliases):
+    '''
+    input: aliases - iterable of (name, page title) pairs covering titles and redirects
+    '''
+    matcher = TitleMatcher()
+    for alias, title in aliases:
+      matcher.add(alias, title)
+    matcher.build()
+    return cls(matcher)
+
+  @classmethod
+  def from_search_index(cls, search_index):
+    return cls.from_titles((alias, search_index.titles[doc_id]) for alias, doc_id in search_index.exact.items())
+
+  @classmethod
+  def from_local_wiki(cls, local_wiki):
+    aliases = [(key, key) for key in local_wiki.pages]
+    aliases.extend((source, target) for source, target in local_wiki.redirects.items())
+    return cls.from_titles(aliases)
+
+  def extract(self, user_query):
+    '''
+    input: user_query - (string) the raw question
+    output: LocalFeatures(subject, summary, confidence), or None when no template fits
+    '''
+    text = normalize_query_text(user_query)
+    for pattern, summary_template in INTENT_TEMPLATES:
+      match = pattern.match(text)
+      if match is None:
+        continue
+      fields = match.groupdict()
+      subject = fields['subject'].strip()
+      if self.matcher is None:
+        # No title list to check against; the template alone is a decent but not a sure guess
+        return LocalFeatures(subject, summary_template.format(**fields), 0.6)
+      found = self.matcher.longest(subject)
+      if found is None:
+        return LocalFeatures(subject, summary_template.format(**fields), 0.3)
+      start, end, title = found
+      whole = start == 0 and end == len(subject.split())
+      return LocalFeatures(title, summary_template.format(**fields), 1.0 if whole else 0.7)
+    return None
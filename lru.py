@@ -0,0 +1,64 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+class LRUCache:
+  '''
+  A thread-safe, size-bounded LRU map with an optional per-entry TTL in seconds.
+  '''
+  def __init__(self, max_entries=256, ttl=None):
+    self.max_entries = max_entries
+    self.ttl = ttl
+    self._entries = OrderedDict() # key -> (stored_at, value)
+    self._lock = threading.Lock()
+    self.hits = 0
+    self.misses = 0
+
+  def get(self, key, default=None):
+    with self._lock:
+      entry = self._entries.get(key, _MISSING)
+      if entry is not _MISSING and self.ttl is not None and time.monotonic() - entry[0] > self.ttl:
+        del self._entries[key]
+        entry = _MISSING
+      if entry is _MISSING:
+        self.misses += 1
+        return default
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[1]
+
+  def peek(self, key, default=None):
+    # Like get(), but neither counted in the stats nor moved to the recent end
+    with self._lock:
+      entry = self._entries.get(key, _MISSING)
+      if entry is _MISSING or (self.ttl is not None and time.monotonic() - entry[0] > self.ttl):
+        return default
+      return entry[1]
+
+  def put(self, key, value):
+    with self._lock:
+      self._entries[key] = (time.monotonic(), value)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def pop(self, key, default=None):
+    with self._lock:
+      entry = self._entries.pop(key, _MISSING)
+      return default if entry is _MISSING else entry[1]
+
+  def clear(self):
+    with self._lock:
+      self._entries.clear()
+
+  def __contains__(self, key):
+    with self._lock:
+      return key in self._entries
+
+  def __len__(self):
+    return len(self._entries)
+
+  def stats(self):
+    return {'entries': len(self._entries), 'max_entries': self.max_entries, 'hits': self.hits, 'misses': self.misses}
@@ -0,0 +1,140 @@
+import hashlib
+import json
+import os
+import time
+import zlib
+from fetch_backends import FetchResult
+from lru import LRUCache
+
+DEFAULT_CACHE_DIR = '.page_cache'
+DEFAULT_TTL = 24 * 3600
+
+class DiskPageCache:
+  '''
+  Persistent store of zlib-compressed page HTML, one .html.z body plus one .json metadata file per URL.
+  '''
+  def __init__(self, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+    self.directory = directory
+    self.ttl = ttl
+    os.makedirs(directory, exist_ok=True)
+
+  def _paths(self, url):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    base = os.path.join(self.directory, key[:2], key)
+    return base + '.html.z', base + '.json'
+
+  def load(self, url):
+    body_path, meta_path = self._paths(url)
+    try:
+      with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+      with open(body_path, 'rb') as f:
+        html = zlib.decompress(f.read()).decode('utf-8')
+    except (OSError, ValueError, zlib.error):
+      return None
+    return FetchResult(meta['url'], 200, html, meta.get('headers', {})), meta['fetched_at']
+
+  def _write(self, path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+      f.write(data)
+    os.replace(tmp_path, path)
+
+  def store(self, url, result, fetched_at=None):
+    body_path, meta_path = self._paths(url)
+    os.makedirs(os.path.dirname(body_path), exist_ok=True)
+    # Only the validators are worth keeping from the response headers
+    headers = {name: result.headers[name] for name in ('ETag', 'Last-Modified') if result.headers and name in result.headers}
+    meta = {'url': result.url, 'headers': headers, 'fetched_at': fetched_at or time.time()}
+    self._write(body_path, zlib.compress(result.html.encode('utf-8'), 6))
+    self._write(meta_path, json.dumps(meta).encode('utf-8'))
+
+  def touch(self, url):
+    loaded = self.load(url)
+    if loaded:
+      self.store(url, loaded[0])
+
+  def is_fresh(self, fetched_at):
+    return time.time() - fetched_at < self.ttl
+
+  def revalidation_headers(self, result):
+    headers = {}
+    if 'ETag' in result.headers:
+      headers['If-None-Match'] = result.headers['ETag']
+    if 'Last-Modified' in result.headers:
+      headers['If-Modified-Since'] = result.headers['Last-Modified']
+    return headers
+
+class PageCache:
+  '''
+  Two-tier cache keyed by canonical page URL: an in-memory LRU of parsed results (WikiPage records)
+  over an on-disk store of compressed HTML.
+  Stale disk entries are revalidated with ETag/Last-Modified before being refetched.
+  '''
+  def __init__(self, memory_entries=256, directory=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL):
+    self.memory = LRUCache(memory_entries, ttl=ttl)
+    self.disk = DiskPageCache(directory, ttl) if directory else None
+    self.disk_hits = 0
+    self.revalidations = 0
+    self.network_fetches = 0
+
+  def get_parsed(self, url):
+    return self.memory.get(url)
+
+  def put_parsed(self, url, page):
+    self.memory.put(url, page)
+
+  def get_fresh(self, url):
+    # Disk hit that is still inside its TTL; stale entries need fetch()/fetch_async() to revalidate
+    cached, headers = self._lookup_disk(url)
+    return cached if headers is None else None
+
+  def store_fetched(self, url, result):
+    # For pages fetched outside this cache, e.g. through Selenium
+    self.network_fetches += 1
+    if self.disk is not None:
+      self.disk.store(url, result)
+
+  def _lookup_disk(self, url, refresh=False):
+    # Returns (cached_result, request_headers): a fresh hit needs no request, a stale one asks for revalidation.
+    # refresh treats every entry as stale, for a caller that knows the page has changed since it was stored
+    if self.disk is None:
+      return None, None
+    loaded = self.disk.load(url)
+    if loaded is None:
+      return None, None
+    cached, fetched_at = loaded
+    if not refresh and self.disk.is_fresh(fetched_at):
+      self.disk_hits += 1
+      return cached, None
+    return cached, self.disk.revalidation_headers(cached)
+
+  def _after_fetch(self, url, cached, result):
+    if cached is not None and result.status == 304:
+      self.revalidations += 1
+      self.disk.touch(url)
+      return cached
+    self.network_fetches += 1
+    if result.status == 200 and self.disk is not None:
+      self.disk.store(url, result)
+    return result
+
+  def fetch(self, backend, url, refresh=False):
+    cached, headers = self._lookup_disk(url, refresh)
+    if cached is not None and headers is None:
+      return cached
+    return self._after_fetch(url, cached, backend.fetch(url, headers=headers or None))
+
+  async def fetch_async(self, backend, url, refresh=False):
+    cached, headers = self._lookup_disk(url, refresh)
+    if cached is not None and headers is None:
+      return cached
+    return self._after_fetch(url, cached, await backend.fetch(url, headers=headers or None))
+
+  def stats(self):
+    return {
+      'memory': self.memory.stats(),
+      'disk_hits': self.disk_hits,
+      'revalidations': self.revalidations,
+      'network_fetches': self.network_fetches,
+    }
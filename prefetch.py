@@ -0,0 +1,193 @@
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import Counter
+from urllib.parse import urlsplit
+import temp_async_test_script as pipeline
+from instrumentation import metrics
+from llm_dispatch import TokenBucket
+from subject_guess import guess_subject
+from wiki_index import normalize_title
+from wiki_page import WikiPage
+
+metrics.describe('wiki_prefetched_pages_total', "Pages loaded ahead of traffic by the pre-fetcher, by outcome")
+
+def read_lines(path):
+  if path == '-':
+    lines = sys.stdin.read().splitlines()
+  else:
+    with open(path, 'r', encoding='utf-8') as f:
+      lines = f.read().splitlines()
+  return [line.strip() for line in lines if line.strip() and not line.lstrip().startswith('#')]
+
+def read_query_log(path):
+  '''
+  input: path - (string) one query per line (a --batch file), or JSON lines with a "query" field (--batch output)
+  output: list of queries, repeats kept so they can be counted
+  '''
+  queries = []
+  for line in read_lines(path):
+    if line.startswith('{'):
+      try:
+        query = json.loads(line).get('query')
+      except ValueError:
+        query = line
+    else:
+      query = line
+    if query:
+      queries.append(query)
+  return queries
+
+def query_subject(user_query):
+  # The local extractor when it is confident (needs start_resources), otherwise the same guess speculation uses
+  features = pipeline.extract_features_locally(user_query)
+  if features is not None:
+    return features.subject
+  return guess_subject(user_query)
+
+def rank_subjects(subjects, top=None):
+  '''
+  input: subjects - subjects in the order they were asked, repeats included
+  output: distinct subjects, most asked first, spelled as first seen
+  '''
+  counts = Counter()
+  spelling = {}
+  for subject in subjects:
+    key = normalize_title(subject)
+    if not key:
+      continue
+    counts[key] += 1
+    spelling.setdefault(key, subject)
+  return [spelling[key] for key, _ in counts.most_common(top)]
+
+class RateLimitedFetchBackend:
+  '''
+  Wraps an async fetch backend so each host gets at most per_minute requests a minute (with a small burst allowance).
+  Keeps a bulk pre-fetch polite to the wiki however many pages it has in flight.
+  '''
+  def __init__(self, backend, per_minute=120, burst=4):
+    self.backend = backend
+    self.per_minute = per_minute
+    self.burst = burst
+    self.buckets = {} # host -> TokenBucket
+
+  async def fetch(self, url, headers=None):
+    host = urlsplit(url).netloc
+    bucket = self.buckets.get(host)
+    if bucket is None:
+      bucket = self.buckets[host] = TokenBucket(self.per_minute, self.burst)
+    await bucket.acquire()
+    return await self.backend.fetch(url, headers=headers)
+
+  def stats(self):
+    return {host: {'waited': bucket.waited} for host, bucket in self.buckets.items()}
+
+async def prefetch_features(queries, concurrency=8):
+  '''
+  Runs feature extraction for each distinct query, which fills the feature extraction cache.
+  Queries the local extractor handles cost nothing; the rest are LLM calls (paced by the dispatcher when one is configured).
+  output: list of extracted subjects, one per query (repeats included)
+  '''
+  semaphore = asyncio.Semaphore(concurrency)
+  distinct = list(dict.fromkeys(queries))
+  async def extract(query):
+    async with semaphore:
+      subject, _ = await pipeline.extract_subject_and_summary(query)
+      return subject
+  subjects = dict(zip(distinct, await asyncio.gather(*(extract(query) for query in distinct))))
+  return [subjects[query] for query in queries]
+
+async def prefetch_subjects(subjects, concurrency=8, requests_per_minute=120, burst=4):
+  '''
+  input: subjects - (list of strings) pages to load, most important first
+         concurrency - (int) subjects resolved and loaded at once
+         requests_per_minute - (int) per-host limit on the wiki requests made while pre-fetching
+  output: Counter of outcomes - loaded, cached (already parsed in memory), local (served by the offline index), failed
+
+  Resolves and loads each subject the way a query would (lookup_page_once, then load_page_once), so the page HTML lands in
+  the disk page cache and the extracted WikiPage in the in-memory parsed cache. Call after start_resources().
+  Every subject reaches the disk cache; when there are more than the parsed cache holds, it keeps the most asked ones.
+  '''
+  outcomes = Counter()
+  semaphore = asyncio.Semaphore(concurrency)
+  urls = [None] * len(subjects)
+  http_backend = pipeline.http_backend
+  if http_backend is not None:
+    pipeline.http_backend = RateLimitedFetchBackend(http_backend, requests_per_minute, burst)
+  async def prefetch(position, subject):
+    async with semaphore:
+      try:
+        page = await pipeline.lookup_page_once(subject)
+        urls[position] = page.url
+        if isinstance(page, WikiPage):
+          outcome = 'local'
+        elif page.url and pipeline.page_cache is not None and pipeline.page_cache.get_parsed(page.url) is not None:
+          outcome = 'cached'
+        else:
+          outcome = 'loaded' if await pipeline.load_page_once(subject, page) is not None else 'failed'
+      except Exception as e:
+        print(f"prefetch: {subject} failed: {e}")
+        outcome = 'failed'
+      outcomes[outcome] += 1
+      metrics.count('wiki_prefetched_pages_total', outcome=outcome)
+  try:
+    await asyncio.gather(*(prefetch(position, subject) for position, subject in reversed(list(enumerate(subjects)))))
+  finally:
+    pipeline.http_backend = http_backend
+  if pipeline.page_cache is not None:
+    # Loads finish out of order; touching the pages from least to most asked leaves the LRU in popularity order
+    for url in reversed(urls):
+      if url is not None:
+        pipeline.page_cache.get_parsed(url)
+  return outcomes
+
+async def prefetch_from_file(path, log=False, top=None, concurrency=8, requests_per_minute=120, burst=4):
+  # Subjects straight from a list, or the most asked ones mined from a query log
+  if log:
+    subjects = rank_subjects([query_subject(query) or query for query in read_query_log(path)], top)
+  else:
+    subjects = rank_subjects(read_lines(path), top)
+  return await prefetch_subjects(subjects, concurrency, requests_per_minute, burst)
+
+async def run(args):
+  if args.llm_base_url:
+    pipeline.llm_base_url = args.llm_base_url
+    pipeline.mock_llm = False
+  await pipeline.start_resources()
+  try:
+    started = time.perf_counter()
+    if args.query_log:
+      queries = read_query_log(args.query_log)
+      if args.features:
+        subjects = await prefetch_features(queries, args.concurrency)
+      else:
+        subjects = [query_subject(query) or query for query in queries]
+      subjects = rank_subjects(subjects, args.top)
+      print(f"Mined {len(subjects)} subjects from {len(queries)} logged queries", file=sys.stderr)
+    else:
+      subjects = rank_subjects(read_lines(args.subjects), args.top)
+    outcomes = await prefetch_subjects(subjects, args.concurrency, args.rate, args.burst)
+    summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items()))
+    print(f"Pre-fetched {sum(outcomes.values())} subjects in {time.perf_counter() - started:.2f}s: {summary}", file=sys.stderr)
+    pipeline.print_resource_stats()
+  finally:
+    await pipeline.close_resources()
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Load the most-asked wiki pages into the page caches ahead of traffic.")
+  source = parser.add_mutually_exclusive_group(required=True)
+  source.add_argument('--subjects', metavar='FILE', help="subjects to pre-fetch, one per line ('-' for stdin)")
+  source.add_argument('--query-log', metavar='FILE', help="mine subjects from logged queries: a --batch file or its JSON-lines output")
+  parser.add_argument('--top', type=int, help="pre-fetch only this many of the most asked subjects")
+  parser.add_argument('--concurrency', type=int, default=8, help="subjects loaded at once")
+  parser.add_argument('--rate', type=int, default=120, help="wiki requests per minute, per host")
+  parser.add_argument('--burst', type=int, default=4, help="requests a host may get back to back before --rate applies")
+  parser.add_argument('--features', action='store_true', help="with --query-log, run feature extraction on every logged query too (fills the feature cache; may call the LLM)")
+  parser.add_argument('--llm-base-url', help="send LLM calls to this OpenAI-compatible endpoint instead of the mocked replies")
+  args = parser.parse_args(argv)
+  asyncio.run(run(args))
+
+if __name__ == '__main__':
+  main()
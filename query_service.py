@@ -0,0 +1,342 @@
+import argparse
+import asyncio
+import json
+import time
+from contextlib import asynccontextmanager
+import temp_async_test_script as pipeline
+from prefetch import prefetch_from_file
+from instrumentation import metrics
+
+STATUS_TEXT = {
+  200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 413: 'Payload Too Large',
+  429: 'Too Many Requests', 503: 'Service Unavailable', 504: 'Gateway Timeout',
+}
+
+metrics.describe('wiki_service_requests_total', "HTTP requests to the query service by route and status")
+metrics.describe('wiki_service_rejected_total', "Queries turned away because the admission queue was full")
+
+class AdmissionQueue:
+  '''
+  At most max_active queries run at once and at most max_waiting more wait for a slot. Anything past that is rejected
+  straight away, so overload shows up as quick 429s the load balancer can retry elsewhere instead of ever-growing latency.
+  '''
+  def __init__(self, max_active=16, max_waiting=64):
+    self.max_active = max_active
+    self.max_waiting = max_waiting
+    self._semaphore = asyncio.Semaphore(max_active)
+    self.pending = 0 # admitted and not yet finished, running or waiting
+    self.active = 0
+    self.admitted = 0
+    self.rejected = 0
+
+  def admit(self, slots=1):
+    # All or nothing, so a batch is never half admitted
+    if self.pending + slots > self.max_active + self.max_waiting:
+      self.rejected += slots
+      metrics.count('wiki_service_rejected_total', slots)
+      return False
+    self.pending += slots
+    self.admitted += slots
+    return True
+
+  def release(self, slots=1):
+    self.pending -= slots
+
+  @asynccontextmanager
+  async def slot(self):
+    async with self._semaphore:
+      self.active += 1
+      try:
+        yield
+      finally:
+        self.active -= 1
+
+  def stats(self):
+    return {
+      'active': self.active,
+      'waiting': self.pending - self.active,
+      'max_active': self.max_active,
+      'max_waiting': self.max_waiting,
+      'admitted': self.admitted,
+      'rejected': self.rejected,
+    }
+
+class HttpError(Exception):
+  def __init__(self, status, message, headers=None):
+    super().__init__(message)
+    self.status = status
+    self.headers = headers or {}
+
+class QueryService:
+  '''
+  Long-lived HTTP front end for prompt(). The driver pool, HTTP backend, caches and LLM dispatcher are started once
+  and shared by every request for the life of the process.
+
+  POST /ask         {"query": "...", "timeout": seconds}   -> {"query", "answer", "seconds"}
+  POST /ask/batch   {"queries": [...], "timeout": seconds} -> {"results": [{"index", "query", "answer" or "error"}]}
+  GET  /health      200 while taking traffic, 503 while starting or draining, with admission queue stats
+  GET  /metrics     Prometheus text format
+
+  The timeout covers time spent queued as well as answering, and is capped at request_timeout.
+  '''
+  def __init__(self, host='127.0.0.1', port=8000, max_active=16, max_waiting=64, request_timeout=60.0,
+               max_batch=64, max_body_bytes=1 << 20, drain_timeout=30.0, warmup=False,
+               prefetch=None, prefetch_log=False):
+    self.host = host
+    self.port = port
+    self.queue = AdmissionQueue(max_active, max_waiting)
+    self.request_timeout = request_timeout
+    self.max_batch = max_batch
+    self.max_body_bytes = max_body_bytes
+    self.drain_timeout = drain_timeout
+    self.warmup = warmup
+    self.prefetch = prefetch
+    self.prefetch_log = prefetch_log
+    self.ready = False
+    self.started_at = None
+    self._server = None
+    self._connections = {} # writer -> handler task
+    self._in_progress = 0
+    self._drained = asyncio.Event()
+
+  @property
+  def base_url(self):
+    return f"http://{self.host}:{self.port}"
+
+  async def start(self):
+    await pipeline.start_resources()
+    self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+    self.port = self._server.sockets[0].getsockname()[1]
+    self.started_at = time.monotonic()
+    if self.warmup:
+      # Already listening, so health checks see 503 rather than a refused connection while this runs
+      await pipeline.warm_up()
+    if self.prefetch:
+      outcomes = await prefetch_from_file(self.prefetch, self.prefetch_log)
+      print(f"Pre-fetched {sum(outcomes.values())} subjects: {dict(outcomes)}")
+    self.ready = True
+    return self
+
+  async def close(self):
+    # Fail health checks first so the load balancer stops sending work, then let admitted queries finish
+    self.ready = False
+    if self._server is not None:
+      self._server.close()
+      if self._in_progress:
+        self._drained.clear()
+        try:
+          await asyncio.wait_for(self._drained.wait(), self.drain_timeout)
+        except asyncio.TimeoutError:
+          print(f"Closing with {self._in_progress} requests still in progress")
+      for writer in list(self._connections):
+        writer.close()
+      await asyncio.gather(*self._connections.values(), return_exceptions=True)
+      await self._server.wait_closed()
+      self._server = None
+    await pipeline.close_resources()
+
+  async def __aenter__(self):
+    return await self.start()
+
+  async def __aexit__(self, *exc_info):
+    await self.close()
+
+  async def serve_forever(self):
+    await self._server.serve_forever()
+
+  async def _handle_connection(self, reader, writer):
+    self._connections[writer] = asyncio.current_task()
+    try:
+      while True:
+        request_line = await reader.readline()
+        if not request_line:
+          break
+        method, target, _ = request_line.decode('latin-1').split(' ', 2)
+        headers = {}
+        while True:
+          line = await reader.readline()
+          if line in (b'\r\n', b'\n', b''):
+            break
+          name, _, value = line.decode('latin-1').partition(':')
+          headers[name.strip().lower()] = value.strip()
+        length = int(headers.get('content-length', 0))
+        keep_alive = headers.get('connection', '').lower() != 'close'
+        if length > self.max_body_bytes:
+          self._write_response(writer, 413, {'error': f"Request bodies are limited to {self.max_body_bytes} bytes"}, keep_alive=False)
+          await writer.drain()
+          break
+        body = await reader.readexactly(length)
+        self._in_progress += 1
+        try:
+          status, payload, extra_headers = await self._dispatch(method, target.split('?', 1)[0], body)
+        finally:
+          self._in_progress -= 1
+          if not self._in_progress:
+            self._drained.set()
+        self._write_response(writer, status, payload, extra_headers, keep_alive and self.ready)
+        await writer.drain()
+        if not (keep_alive and self.ready):
+          break
+    except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+      pass
+    finally:
+      self._connections.pop(writer, None)
+      writer.close()
+
+  def _write_response(self, writer, status, payload, extra_headers=None, keep_alive=True):
+    if isinstance(payload, str):
+      data = payload.encode('utf-8')
+      content_type = 'text/plain; version=0.0.4; charset=utf-8'
+    else:
+      data = json.dumps(payload).encode('utf-8')
+      content_type = 'application/json'
+    lines = [f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}", f"Content-Type: {content_type}", f"Content-Length: {len(data)}"]
+    lines.extend(f"{name}: {value}" for name, value in (extra_headers or {}).items())
+    lines.append(f"Connection: {'keep-alive' if keep_alive else 'close'}")
+    writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + data)
+
+  async def _dispatch(self, method, path, body):
+    routes = {
+      '/ask': ('POST', self.ask),
+      '/ask/batch': ('POST', self.ask_batch),
+      '/health': ('GET', self.health),
+      '/metrics': ('GET', self.export_metrics),
+    }
+    route = routes.get(path.rstrip('/') or '/')
+    try:
+      if route is None:
+        raise HttpError(404, f"No route for {path}")
+      expected_method, handler = route
+      if method != expected_method:
+        raise HttpError(405, f"{path} only accepts {expected_method}", {'Allow': expected_method})
+      status, payload = await handler(body)
+      extra_headers = {}
+    except HttpError as e:
+      status, payload, extra_headers = e.status, {'error': str(e)}, e.headers
+    metrics.count('wiki_service_requests_total', route=path if route else 'unknown', status=status)
+    return status, payload, extra_headers
+
+  def _read_json(self, body):
+    try:
+      request = json.loads(body or b'{}')
+    except ValueError:
+      raise HttpError(400, "The request body must be JSON")
+    if not isinstance(request, dict):
+      raise HttpError(400, "The request body must be a JSON object")
+    return request
+
+  def _deadline(self, request):
+    timeout = request.get('timeout', self.request_timeout)
+    if not isinstance(timeout, (int, float)) or timeout <= 0:
+      raise HttpError(400, "timeout must be a positive number of seconds")
+    return min(timeout, self.request_timeout)
+
+  def _admit(self, slots):
+    if not self.ready:
+      raise HttpError(503, "The service is not taking queries right now", {'Retry-After': '1'})
+    if not self.queue.admit(slots):
+      raise HttpError(429, "Too many queries in flight, try again shortly", {'Retry-After': '1'})
+
+  async def _answer(self, query):
+    async with self.queue.slot():
+      return await pipeline.prompt(query)
+
+  async def ask(self, body):
+    request = self._read_json(body)
+    query = request.get('query')
+    if not isinstance(query, str) or not query.strip():
+      raise HttpError(400, "query must be a non-empty string")
+    timeout = self._deadline(request)
+    self._admit(1)
+    started = time.perf_counter()
+    try:
+      answer = await asyncio.wait_for(self._answer(query), timeout)
+    except asyncio.TimeoutError:
+      raise HttpError(504, f"No answer within {timeout}s")
+    finally:
+      self.queue.release(1)
+    return 200, {'query': query, 'answer': answer, 'seconds': round(time.perf_counter() - started, 3)}
+
+  async def ask_batch(self, body):
+    request = self._read_json(body)
+    queries = request.get('queries')
+    if not isinstance(queries, list) or not queries or not all(isinstance(query, str) and query.strip() for query in queries):
+      raise HttpError(400, "queries must be a non-empty list of non-empty strings")
+    if len(queries) > self.max_batch:
+      raise HttpError(413, f"Batches are limited to {self.max_batch} queries")
+    timeout = self._deadline(request)
+    self._admit(len(queries))
+    # One deadline for the whole batch; queries still running when it passes are reported individually
+    tasks = [asyncio.ensure_future(self._answer(query)) for query in queries]
+    try:
+      await asyncio.wait(tasks, timeout=timeout)
+    finally:
+      for task in tasks:
+        task.cancel()
+      await asyncio.gather(*tasks, return_exceptions=True)
+      self.queue.release(len(queries))
+    results = []
+    for index, (query, task) in enumerate(zip(queries, tasks)):
+      if task.cancelled():
+        results.append({'index': index, 'query': query, 'error': f"No answer within {timeout}s"})
+      elif task.exception() is not None:
+        results.append({'index': index, 'query': query, 'error': str(task.exception())})
+      else:
+        results.append({'index': index, 'query': query, 'answer': task.result()})
+    return 200, {'results': results}
+
+  async def health(self, body):
+    payload = {
+      'status': 'ok' if self.ready else 'unavailable',
+      'uptime': round(time.monotonic() - self.started_at, 3) if self.started_at is not None else 0,
+      'queue': self.queue.stats(),
+    }
+    return (200 if self.ready else 503), payload
+
+  async def export_metrics(self, body):
+    return 200, metrics.to_prometheus()
+
+  def collect_metrics(self):
+    stats = self.queue.stats()
+    yield 'wiki_service_active_queries', 'gauge', {}, stats['active']
+    yield 'wiki_service_waiting_queries', 'gauge', {}, stats['waiting']
+
+async def serve(args):
+  if args.llm_base_url:
+    pipeline.llm_base_url = args.llm_base_url
+    pipeline.mock_llm = False
+  pipeline.speculative_fetch = pipeline.speculative_fetch or args.speculate
+  service = QueryService(args.host, args.port, args.max_active, args.max_waiting, args.timeout, args.max_batch, warmup=args.warmup,
+                         prefetch=args.prefetch or args.prefetch_log, prefetch_log=bool(args.prefetch_log))
+  metrics.add_collector(service.collect_metrics)
+  await service.start()
+  print(f"Answering queries on {service.base_url} (POST /ask, POST /ask/batch, GET /health, GET /metrics)")
+  try:
+    await service.serve_forever()
+  except asyncio.CancelledError:
+    pass
+  finally:
+    await service.close()
+
+def main():
+  parser = argparse.ArgumentParser(description="Serve prompt() over HTTP with shared resources and an admission queue.")
+  parser.add_argument('--host', default='127.0.0.1')
+  parser.add_argument('--port', type=int, default=8000)
+  parser.add_argument('--max-active', type=int, default=16, help="queries answered at once")
+  parser.add_argument('--max-waiting', type=int, default=64, help="queries allowed to wait for a slot before new ones get 429")
+  parser.add_argument('--timeout', type=float, default=60.0, help="longest a query may take, queueing included (requests can ask for less)")
+  parser.add_argument('--max-batch', type=int, default=64, help="most queries accepted by one /ask/batch call")
+  parser.add_argument('--warmup', action='store_true', help="prime the parser, drivers, LLM client and caches before reporting healthy")
+  prefetch = parser.add_mutually_exclusive_group()
+  prefetch.add_argument('--prefetch', metavar='FILE', help="load these subjects (one per line) into the page caches before reporting healthy")
+  prefetch.add_argument('--prefetch-log', metavar='FILE', help="same, for the most asked subjects in a query log (see prefetch.py)")
+  parser.add_argument('--speculate', action='store_true', help="start fetching a guessed subject while the LLM extracts the real one")
+  parser.add_argument('--llm-base-url', help="send LLM calls to this OpenAI-compatible endpoint instead of the mocked replies")
+  args = parser.parse_args()
+  try:
+    asyncio.run(serve(args))
+  except KeyboardInterrupt:
+    pass
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,130 @@
+import math
+from collections import Counter
+from search_index import tokenize
+
+STOPWORDS = {
+  'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'do', 'does', 'for', 'from', 'how', 'i', 'in', 'is', 'it',
+  'minecraft', 'of', 'on', 'or', 'the', 'to', 'what', 'when', 'where', 'which', 'who', 'why', 'with', 'you',
+}
+
+def estimate_tokens(text):
+  # Roughly four characters per token for English prose, which is all the budget needs
+  return len(text) // 4 + 1
+
+def looks_like_heading(text):
+  # extract_main_paragraph flattens h2/h3 into the same list as paragraphs; headings are short and unpunctuated
+  return 0 < len(text) <= 60 and not text.endswith(('.', '!', '?', ':', ';', ','))
+
+def chunk_paragraphs(paragraphs, max_chunk_tokens=300, is_heading=looks_like_heading, heading_flags=None):
+  '''
+  input: paragraphs - (list of strings) the output of extract_main_paragraph
+         heading_flags - (sequence of bools) optional, which paragraphs are headings (WikiPage.heading_flags); guessed with is_heading otherwise
+  output: chunks - (list of dicts) heading, paragraphs, their indices and token count, in document order; long sections are split
+  '''
+  chunks = []
+  heading = ''
+  heading_index = None
+  current = []
+  current_indices = []
+  current_tokens = 0
+  def flush():
+    if current:
+      chunks.append({'heading': heading, 'heading_index': heading_index, 'paragraphs': list(current), 'indices': list(current_indices), 'tokens': current_tokens})
+      current.clear()
+      current_indices.clear()
+  for i, paragraph in enumerate(paragraphs):
+    if not paragraph:
+      continue
+    if heading_flags[i] if heading_flags is not None else is_heading(paragraph):
+      flush()
+      current_tokens = 0
+      heading = paragraph
+      heading_index = i
+      continue
+    tokens = estimate_tokens(paragraph)
+    if current and current_tokens + tokens > max_chunk_tokens:
+      flush()
+      current_tokens = 0
+    current.append(paragraph)
+    current_indices.append(i)
+    current_tokens += tokens
+  flush()
+  return chunks
+
+def stem(token):
+  # Crude suffix folding so "obtain", "obtaining" and "obtained" land on the same term
+  for suffix in ('ing', 'ed', 'es', 's'):
+    if len(token) > len(suffix) + 3 and token.endswith(suffix):
+      return token[:-len(suffix)]
+  return token
+
+def terms(text):
+  return [stem(token) for token in tokenize(text) if token not in STOPWORDS]
+
+def rank_chunks(chunks, query, k1=1.2, b=0.75):
+  query_tokens = set(terms(query))
+  # Headings are counted twice so a section named after the query outranks a passing mention elsewhere
+  documents = [Counter(terms(f"{chunk['heading']} {chunk['heading']} {' '.join(chunk['paragraphs'])}")) for chunk in chunks]
+  if not documents or not query_tokens:
+    return [0.0] * len(chunks)
+  average_length = sum(sum(document.values()) for document in documents) / len(documents) or 1
+  idf = {}
+  for token in query_tokens:
+    containing = sum(1 for document in documents if token in document)
+    idf[token] = math.log(1 + (len(documents) - containing + 0.5) / (containing + 0.5))
+  scores = []
+  for document in documents:
+    norm = k1 * (1 - b + b * sum(document.values()) / average_length)
+    scores.append(sum(idf[token] * document[token] * (k1 + 1) / (document[token] + norm) for token in query_tokens if token in document))
+  return scores
+
+def select_relevant_indices(paragraphs, query, token_budget=1500, top_k=6, heading_flags=None):
+  '''
+  input: paragraphs - (list of strings) the output of extract_main_paragraph
+         query - (string) the summary query the answer has to address
+  output: indices - (list of ints) positions of the lead section plus the best-matching sections under the token budget,
+          in page order; None when the whole page fits
+  '''
+  chunks = chunk_paragraphs(paragraphs, heading_flags=heading_flags)
+  if sum(chunk['tokens'] for chunk in chunks) <= token_budget:
+    return None
+  scores = rank_chunks(chunks, query)
+  # The lead section defines the subject, so it goes in first; then matching sections by score,
+  # or the page from the top when nothing matches at all
+  order = [0] + sorted((i for i in range(1, len(chunks)) if scores[i] > 0), key=lambda i: (-scores[i], i))
+  if not any(scores):
+    order = list(range(len(chunks)))
+  selected = []
+  used = 0
+  headings = set()
+  for i in order:
+    if len(selected) >= top_k:
+      break
+    # A long section's chunks share one heading, which is sent (and paid for) once
+    heading_index = chunks[i]['heading_index']
+    cost = chunks[i]['tokens']
+    if heading_index is not None and heading_index not in headings:
+      cost += estimate_tokens(chunks[i]['heading'])
+    if used + cost > token_budget:
+      continue
+    selected.append(i)
+    headings.add(heading_index)
+    used += cost
+  result = []
+  last_heading = None
+  for i in sorted(selected):
+    heading_index = chunks[i]['heading_index']
+    if heading_index is not None and heading_index != last_heading:
+      result.append(heading_index)
+      last_heading = heading_index
+    result.extend(chunks[i]['indices'])
+  return result
+
+def select_relevant_paragraphs(paragraphs, query, token_budget=1500, top_k=6, heading_flags=None):
+  '''
+  output: paragraphs - (list of strings) the paragraphs picked by select_relevant_indices
+  '''
+  indices = select_relevant_indices(paragraphs, query, token_budget, top_k, heading_flags)
+  if indices is None:
+    return paragraphs
+  return [paragraphs[i] for i in indices]
@@ -0,0 +1,270 @@
+import argparse
+import bisect
+import json
+import math
+import os
+import re
+from collections import Counter, defaultdict, namedtuple
+from wiki_index import LocalWikiBackend, normalize_title, title_to_url
+
+SEARCH_INDEX_FILE = 'search.json'
+SEARCH_INDEX_VERSION = 1
+
+# Matches in the title count for much more than a mention somewhere in the article body
+FIELD_WEIGHTS = {'title': 3.0, 'redirect': 2.5, 'text': 1.0}
+# resolve_subject trusts a page that only matches in its text once the text scores this fraction of a title match of the
+# same query; a single passing mention ("netherite" on the Diamond page) scores about two thirds of one
+TEXT_MATCH_RATIO = 1.0
+
+SubjectMatch = namedtuple('SubjectMatch', ['title', 'url', 'score'])
+
+def tokenize(text):
+  return re.findall(r'[a-z0-9]+', text.lower())
+
+def _deletes(token):
+  return {token[:i] + token[i + 1:] for i in range(len(token))}
+
+def _edit_distance(a, b, limit):
+  # Optimal string alignment distance, so a swapped pair of letters ("diamnod") costs one edit
+  if abs(len(a) - len(b)) > limit:
+    return limit + 1
+  rows = [list(range(len(b) + 1))]
+  for i in range(1, len(a) + 1):
+    row = [i] + [0] * len(b)
+    for j in range(1, len(b) + 1):
+      row[j] = min(rows[i - 1][j] + 1, row[j - 1] + 1, rows[i - 1][j - 1] + (a[i - 1] != b[j - 1]))
+      if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+        row[j] = min(row[j], rows[i - 2][j - 2] + 1)
+    rows.append(row)
+  return rows[-1][-1]
+
+class SearchIndex:
+  '''
+  Inverted index over page titles, redirect titles and section text with field-weighted BM25 scoring.
+  Query tokens missing from the vocabulary are expanded to prefix matches and one-edit spelling neighbours.
+  '''
+  def __init__(self, k1=1.2, b=0.75):
+    self.k1 = k1
+    self.b = b
+    self.titles = [] # doc id -> page title
+    self.urls = []
+    self.lengths = [] # doc id -> field-weighted token count
+    self.postings = defaultdict(dict) # token -> {doc id: field-weighted term frequency}
+    self.exact = {} # normalized title or redirect -> doc id
+    self._vocabulary = None
+    self._deletes = None
+    self._aliases = None # doc id -> tokens of its title and redirects, built on first use
+
+  def add_page(self, title, url, paragraphs, redirects=()):
+    doc_id = len(self.titles)
+    self.titles.append(title)
+    self.urls.append(None)
+    self.lengths.append(0)
+    self._index_page(doc_id, title, url, paragraphs, redirects)
+    return doc_id
+
+  def _index_page(self, doc_id, title, url, paragraphs, redirects):
+    self.titles[doc_id] = title
+    self.urls[doc_id] = url or title_to_url(title)
+    frequencies = Counter()
+    fields = [('title', title)] + [('redirect', redirect) for redirect in redirects] + [('text', paragraph) for paragraph in paragraphs]
+    for field, text in fields:
+      for token in tokenize(text):
+        frequencies[token] += FIELD_WEIGHTS[field]
+    for token, frequency in frequencies.items():
+      self.postings[token][doc_id] = frequency
+    self.lengths[doc_id] = sum(frequencies.values())
+    self.exact[normalize_title(title)] = doc_id
+    for redirect in redirects:
+      self.exact.setdefault(normalize_title(redirect), doc_id)
+    self._vocabulary = None
+    self._aliases = None
+
+  def _drop_documents(self, doc_ids):
+    # One pass over the vocabulary takes the documents out of every posting list
+    for token in list(self.postings):
+      documents = self.postings[token]
+      for doc_id in doc_ids:
+        documents.pop(doc_id, None)
+      if not documents:
+        del self.postings[token]
+    for key in [key for key, doc_id in self.exact.items() if doc_id in doc_ids]:
+      del self.exact[key]
+    for doc_id in doc_ids:
+      self.lengths[doc_id] = 0
+    self._vocabulary = None
+    self._aliases = None
+
+  def update_pages(self, pages, removed=()):
+    '''
+    input: pages - iterable of (title, url, paragraphs, redirects) to add or re-index
+           removed - titles to take out of search results
+    Re-indexes just these pages. A page that was already indexed keeps its doc id, so nothing else moves; a removed
+    page leaves an empty slot behind rather than renumbering the rest.
+    '''
+    pages = list(pages)
+    slots = {}
+    for title in [page[0] for page in pages] + list(removed):
+      doc_id = self.exact.get(normalize_title(title))
+      # exact also maps redirects; only a page's own title identifies its slot
+      if doc_id is not None and normalize_title(self.titles[doc_id]) == normalize_title(title):
+        slots[normalize_title(title)] = doc_id
+    self._drop_documents(set(slots.values()))
+    for title, url, paragraphs, redirects in pages:
+      doc_id = slots.get(normalize_title(title))
+      if doc_id is None:
+        self.add_page(title, url, paragraphs, redirects)
+      else:
+        self._index_page(doc_id, title, url, paragraphs, redirects)
+
+  @classmethod
+  def from_local_wiki(cls, local_wiki):
+    index = cls()
+    redirects_by_target = defaultdict(list)
+    for source, target in local_wiki.redirects.items():
+      redirects_by_target[normalize_title(target)].append(source)
+    for key, record in local_wiki.records():
+      index.add_page(record.title, record.url, record.paragraphs(), redirects_by_target.get(key, ()))
+    return index
+
+  def _prepare_fuzzy(self):
+    self._vocabulary = sorted(self.postings)
+    self._deletes = defaultdict(list)
+    for token in self._vocabulary:
+      if len(token) > 3:
+        for variant in _deletes(token):
+          self._deletes[variant].append(token)
+
+  def expand_token(self, token):
+    # Exact token first; otherwise prefix completions ("diam" -> "diamond") and one-edit neighbours ("diamnod" -> "diamond")
+    if token in self.postings:
+      return {token: 1.0}
+    if self._vocabulary is None:
+      self._prepare_fuzzy()
+    expansions = {}
+    if len(token) >= 3:
+      start = bisect.bisect_left(self._vocabulary, token)
+      for candidate in self._vocabulary[start:start + 20]:
+        if not candidate.startswith(token):
+          break
+        expansions[candidate] = 0.8
+    if len(token) > 3:
+      candidates = set(self._deletes.get(token, ()))
+      for variant in _deletes(token) | {token}:
+        candidates.update(self._deletes.get(variant, ()))
+        if variant in self.postings:
+          candidates.add(variant)
+      for candidate in candidates:
+        if _edit_distance(token, candidate, 1) <= 1:
+          expansions[candidate] = max(expansions.get(candidate, 0), 0.7)
+    return expansions
+
+  def search(self, query, limit=10):
+    return [SubjectMatch(self.titles[doc_id], self.urls[doc_id], score) for doc_id, score in self._rank(query, limit)]
+
+  def _idf(self, token):
+    postings = self.postings.get(token, ())
+    return math.log(1 + (len(self.titles) - len(postings) + 0.5) / (len(postings) + 0.5))
+
+  def _rank(self, query, limit):
+    if not self.titles:
+      return []
+    average_length = sum(self.lengths) / len(self.lengths)
+    scores = defaultdict(float)
+    matched = defaultdict(set)
+    for token in set(tokenize(query)):
+      for candidate, weight in self.expand_token(token).items():
+        postings = self.postings[candidate]
+        idf = self._idf(candidate)
+        for doc_id, frequency in postings.items():
+          norm = self.k1 * (1 - self.b + self.b * self.lengths[doc_id] / average_length)
+          scores[doc_id] += weight * idf * frequency * (self.k1 + 1) / (frequency + norm)
+          matched[doc_id].add(candidate)
+    # Prefer pages whose whole title was asked for, so "diamond" beats "Diamond Sword"
+    for doc_id in scores:
+      title_tokens = set(tokenize(self.titles[doc_id]))
+      if title_tokens:
+        scores[doc_id] *= 1 + 0.5 * len(title_tokens & matched[doc_id]) / len(title_tokens)
+    return sorted(scores.items(), key=lambda item: -item[1])[:limit]
+
+  def _alias_tokens(self, doc_id):
+    if self._aliases is None:
+      self._aliases = defaultdict(set)
+      for key, alias_doc_id in self.exact.items():
+        self._aliases[alias_doc_id].update(tokenize(key))
+    return self._aliases.get(doc_id, set())
+
+  def _title_match_score(self, expansions):
+    # What the query would score as a whole-title match on a page of average length
+    title_weight = FIELD_WEIGHTS['title']
+    return sum(
+      max((weight * self._idf(candidate) * title_weight * (self.k1 + 1) / (title_weight + self.k1) for candidate, weight in candidates.items()), default=0.0)
+      for candidates in expansions.values()
+    )
+
+  def resolve_subject(self, subject):
+    '''
+    input: subject - (string) what the user asked about, possibly plural or misspelled
+    output: SubjectMatch of the best page, or None if nothing matches
+    '''
+    key = normalize_title(subject)
+    for candidate in (key, key[:-1] if key.endswith('s') else key):
+      if candidate in self.exact:
+        doc_id = self.exact[candidate]
+        return SubjectMatch(self.titles[doc_id], self.urls[doc_id], math.inf)
+    # Otherwise a page must match every word in its title or a redirect (allowing for prefixes and typos), or score as
+    # well in its text as a title match would; a subject the index doesn't cover falls through to the caller's api.php lookup
+    expansions = {token: self.expand_token(token) for token in set(tokenize(subject))}
+    if not expansions:
+      return None
+    ranked = self._rank(subject, limit=5)
+    for doc_id, score in ranked:
+      aliases = self._alias_tokens(doc_id)
+      if all(aliases.intersection(candidates) for candidates in expansions.values()):
+        return SubjectMatch(self.titles[doc_id], self.urls[doc_id], score)
+    if ranked and ranked[0][1] >= TEXT_MATCH_RATIO * self._title_match_score(expansions):
+      doc_id, score = ranked[0]
+      return SubjectMatch(self.titles[doc_id], self.urls[doc_id], score)
+    return None
+
+  def save(self, index_dir):
+    data = {
+      'version': SEARCH_INDEX_VERSION,
+      'titles': self.titles,
+      'urls': self.urls,
+      'lengths': self.lengths,
+      'postings': self.postings,
+      'exact': self.exact,
+    }
+    with open(os.path.join(index_dir, SEARCH_INDEX_FILE), 'w', encoding='utf-8') as f:
+      json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+
+  @classmethod
+  def load(cls, index_dir):
+    with open(os.path.join(index_dir, SEARCH_INDEX_FILE), 'r', encoding='utf-8') as f:
+      data = json.load(f)
+    if data.get('version') != SEARCH_INDEX_VERSION:
+      raise ValueError(f"Unsupported search index version: {data.get('version')}")
+    index = cls()
+    index.titles = data['titles']
+    index.urls = data['urls']
+    index.lengths = data['lengths']
+    # JSON turned the integer doc ids into strings
+    index.postings = defaultdict(dict, {token: {int(doc_id): frequency for doc_id, frequency in docs.items()} for token, docs in data['postings'].items()})
+    index.exact = data['exact']
+    return index
+
+def main():
+  parser = argparse.ArgumentParser(description="Build the BM25 subject search index for an offline wiki index.")
+  parser.add_argument('index_dir', nargs='?', default='wiki_index', help="directory written by wiki_index.py")
+  args = parser.parse_args()
+  local_wiki = LocalWikiBackend(args.index_dir)
+  try:
+    index = SearchIndex.from_local_wiki(local_wiki)
+  finally:
+    local_wiki.close()
+  index.save(args.index_dir)
+  print(f"Indexed {len(index.titles)} pages and {len(index.postings)} terms into {os.path.join(args.index_dir, SEARCH_INDEX_FILE)}")
+
+if __name__ == '__main__':
+  main()
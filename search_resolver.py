@@ -0,0 +1,53 @@
+import json
+from collections import namedtuple
+from urllib.parse import urlencode
+
+API_URL = 'https://minecraft.wiki/api.php'
+
+ResolvedPage = namedtuple('ResolvedPage', ['title', 'url', 'revision'])
+
+def make_resolve_url(search_term, api_url=API_URL):
+  # One query does the search, follows redirects and returns the canonical URL and latest revision of the top hit
+  params = {
+    'action': 'query',
+    'format': 'json',
+    'formatversion': '2',
+    'generator': 'search',
+    'gsrsearch': search_term,
+    'gsrnamespace': '0',
+    'gsrlimit': '1',
+    'redirects': '1',
+    'prop': 'info',
+    'inprop': 'url',
+  }
+  return f'{api_url}?{urlencode(params)}'
+
+def parse_resolve_response(data):
+  pages = data.get('query', {}).get('pages', [])
+  pages = [page for page in pages if not page.get('missing') and not page.get('invalid')]
+  if not pages:
+    return None
+  page = min(pages, key=lambda page: page.get('index', 0))
+  return ResolvedPage(page['title'], page['fullurl'], page.get('lastrevid'))
+
+def resolve_search(backend, search_term, api_url=API_URL):
+  try:
+    result = backend.fetch(make_resolve_url(search_term, api_url))
+    if result.status != 200:
+      print(f"resolve_search: API returned {result.status} for {search_term}")
+      return None
+    return parse_resolve_response(json.loads(result.html))
+  except Exception as e:
+    print(f"resolve_search: API lookup failed for {search_term}: {e}")
+    return None
+
+async def resolve_search_async(backend, search_term, api_url=API_URL):
+  try:
+    result = await backend.fetch(make_resolve_url(search_term, api_url))
+    if result.status != 200:
+      print(f"resolve_search_async: API returned {result.status} for {search_term}")
+      return None
+    return parse_resolve_response(json.loads(result.html))
+  except Exception as e:
+    print(f"resolve_search_async: API lookup failed for {search_term}: {e}")
+    return None
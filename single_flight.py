@@ -0,0 +1,116 @@
+import asyncio
+
+class SingleFlight:
+  '''
+  Concurrent callers asking for the same key share one in-flight task instead of repeating the work.
+  The key is forgotten as soon as the task finishes, so later callers start fresh (caching is someone else's job).
+  The shared task is cancelled only when every caller waiting on it has been cancelled.
+  '''
+  def __init__(self):
+    self._calls = {} # key -> [task, number of waiters]
+    self.started = 0
+    self.shared = 0
+
+  async def do(self, key, make_coroutine):
+    call = self._calls.get(key)
+    if call is None:
+      call = self._calls[key] = [asyncio.ensure_future(make_coroutine()), 0]
+      call[0].add_done_callback(lambda _: self._forget(key, call))
+      self.started += 1
+    else:
+      self.shared += 1
+    call[1] += 1
+    try:
+      return await asyncio.shield(call[0])
+    except asyncio.CancelledError:
+      if call[1] == 1 and not call[0].done():
+        call[0].cancel()
+      raise
+    finally:
+      call[1] -= 1
+
+  def _forget(self, key, call):
+    if self._calls.get(key) is call:
+      del self._calls[key]
+
+  def __len__(self):
+    return len(self._calls)
+
+  def stats(self):
+    return {'in_flight': len(self._calls), 'started': self.started, 'shared': self.shared}
+
+class _SharedStream:
+  def __init__(self):
+    self.pieces = []
+    self.done = False
+    self.error = None
+    self.readers = 0
+    self.task = None
+    self.updated = asyncio.Event()
+
+  def notify(self):
+    # Wakes the readers waiting now; later waits start on a fresh event
+    self.updated.set()
+    self.updated = asyncio.Event()
+
+class StreamFlight:
+  '''
+  The streaming counterpart of SingleFlight: concurrent callers asking for the same key read one in-flight async generator.
+  A caller that joins late is first replayed the pieces it missed. The source is closed once every reader has stopped.
+  '''
+  def __init__(self):
+    self._streams = {} # key -> _SharedStream
+    self.started = 0
+    self.shared = 0
+
+  async def stream(self, key, make_generator):
+    shared = self._streams.get(key)
+    if shared is None:
+      shared = self._streams[key] = _SharedStream()
+      shared.task = asyncio.ensure_future(self._pump(key, shared, make_generator()))
+      self.started += 1
+    else:
+      self.shared += 1
+    shared.readers += 1
+    try:
+      position = 0
+      while True:
+        updated = shared.updated
+        while position < len(shared.pieces):
+          position += 1
+          yield shared.pieces[position - 1]
+        if shared.done:
+          if shared.error is not None:
+            raise shared.error
+          return
+        await updated.wait()
+    finally:
+      shared.readers -= 1
+      if shared.readers == 0 and not shared.task.done():
+        self._forget(key, shared)
+        shared.task.cancel()
+
+  async def _pump(self, key, shared, pieces):
+    try:
+      async for piece in pieces:
+        shared.pieces.append(piece)
+        shared.notify()
+    except Exception as e:
+      shared.error = e
+    finally:
+      try:
+        await pieces.aclose()
+      finally:
+        shared.done = True
+        self._forget(key, shared)
+        shared.notify()
+
+  def _forget(self, key, shared):
+    if self._streams.get(key) is shared:
+      del self._streams[key]
+
+  def __len__(self):
+    return len(self._streams)
+
+  def stats(self):
+    return {'in_flight': len(self._streams), 'started': self.started, 'shared': self.shared}
@@ -0,0 +1,43 @@
+import re
+
+# Words that shape the question rather than name the thing it is about
+QUESTION_WORDS = {
+  'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'can', 'could', 'did', 'do', 'does', 'for', 'from', 'get', 'how', 'i',
+  'if', 'in', 'into', 'is', 'it', 'me', 'minecraft', 'my', 'of', 'on', 'or', 'should', 'so', 'tell', 'that', 'the', 'there',
+  'to', 'up', 'was', 'what', 'whats', 'when', 'where', 'which', 'who', 'why', 'will', 'with', 'would', 'you', 'your', 'about',
+  'game', 'some', 'any', 'all', 'much', 'many', 'not', 'no',
+}
+# Common verbs in wiki questions ("how do I find ...", "what does ... drop")
+QUESTION_VERBS = {
+  'beat', 'breed', 'brew', 'build', 'craft', 'crafted', 'defeat', 'drop', 'drops', 'enchant', 'find', 'found', 'grow', 'kill',
+  'know', 'locate', 'make', 'made', 'obtain', 'place', 'repair', 'spawn', 'spawns', 'tame', 'trade', 'use', 'used', 'work', 'works',
+}
+# Nouns that ask for an attribute of the subject ("best enchantments for a sword") rather than being the subject
+ATTRIBUTE_WORDS = {
+  'best', 'biome', 'biomes', 'crafting', 'damage', 'difference', 'durability', 'enchantment', 'enchantments', 'health', 'info',
+  'information', 'kind', 'kinds', 'location', 'locations', 'purpose', 'recipe', 'recipes', 'stats', 'type', 'types', 'uses', 'way', 'ways',
+}
+
+def guess_subject(user_query):
+  '''
+  input: user_query - (string) the raw question
+  output: subject - (string) the first noun-phrase-like run of content words, or None if nothing is left
+
+  Cheap stand-in for the feature-extraction call, good enough to start fetching before its reply arrives.
+  '''
+  words = re.findall(r"[A-Za-z0-9][A-Za-z0-9'\-]*", user_query)
+  runs = []
+  current = []
+  for word in words:
+    folded = word.lower().replace("'", '')
+    if folded in QUESTION_WORDS or folded in QUESTION_VERBS or folded in ATTRIBUTE_WORDS:
+      if current:
+        runs.append(current)
+        current = []
+      continue
+    current.append(word)
+  if current:
+    runs.append(current)
+  if not runs:
+    return None
+  return ' '.join(runs[0])
@@ -0,0 +1,53 @@
+from answer_cache import AnswerCache, cosine_similarity, text_vector
+
+URL = 'https://minecraft.wiki/w/Piston'
+
+def similarity(a, b):
+    return cosine_similarity(text_vector(a), text_vector(b))
+
+def run_tests():
+    # Test 1: Exact summaries match after normalization, whatever the threshold
+    cache = AnswerCache()
+    cache.put(URL, 100, "What is the crafting recipe", "Answer: cobblestone, iron, redstone, planks")
+    assert cache.get(URL, 100, "what is the crafting recipe?") == "Answer: cobblestone, iron, redstone, planks", "Test 1 Failed: normalized summary missed"
+    print("Test 1 Passed")
+
+    # Test 2: By default near-duplicates are misses
+    cache.put(URL, 100, "How many blocks can a piston push", "Answer: 12")
+    for summary in ("How many blocks can a piston pull", "How many blocks can a piston pushes"):
+        assert cache.get(URL, 100, summary) is None, f"Test 2 Failed: {summary!r} matched with no threshold"
+    print("Test 2 Passed")
+
+    # Test 3: A new revision drops the old answers
+    assert cache.get(URL, 101, "How many blocks can a piston push") is None, "Test 3 Failed: answer served for another revision"
+    cache.put(URL, 101, "How many blocks can a piston push", "Answer: 12")
+    assert cache.get(URL, 100, "How many blocks can a piston push") is None, "Test 3 Failed: old revision still cached"
+    print("Test 3 Passed")
+
+    # Test 4: With a threshold, surface variants of the same question match...
+    threshold = 0.93
+    matching = [("Where to find diamonds", "Where to find diamond")]
+    # ...but these differ in meaning and must not, even though some score close to the threshold
+    not_matching = [
+        ("How many blocks can a piston push", "How many blocks can a piston pull"),
+        ("Mobs that can be killed with looting", "Mobs that can be killed without looting"),
+        ("How do I find diamonds", "How do I find emeralds"),
+    ]
+    for stored, asked in matching + not_matching:
+        cache = AnswerCache(similarity_threshold=threshold)
+        cache.put(URL, 100, stored, "Answer: stored")
+        hit = cache.get(URL, 100, asked) is not None
+        expected = (stored, asked) in matching
+        assert hit == expected, f"Test 4 Failed: {stored!r} / {asked!r} scored {similarity(stored, asked):.3f}, hit={hit}"
+    print("Test 4 Passed")
+
+    # Test 5: The pipeline leaves similarity matching off; a rewording scores far below any usable threshold
+    import temp_async_test_script as pipeline
+    assert pipeline.answer_similarity_threshold is None, "Test 5 Failed: similarity matching is on by default"
+    assert similarity("how to find", "how do i find") < 0.7, "Test 5 Failed: rewording unexpectedly similar"
+    print("Test 5 Passed")
+
+    print("All answer cache tests passed!")
+
+if __name__ == "__main__":
+    run_tests()
@@ -1,27 +1,142 @@
+import argparse
+import json
+import os
 import sys
-import chromedriver_autoinstaller
-from selenium import webdriver
-from bs4 import BeautifulSoup
 import re
 import threading
+import time
 import asyncio
-from openai import AsyncOpenAI
+from collections import namedtuple
+from driver_pool import DriverPool, make_chrome_driver
+from fetch_backends import AsyncHttpFetchBackend, FetchResult, page_needs_javascript
+from page_cache import PageCache
+from llm_cache import FeatureExtractionCache
+from answer_cache import AnswerCache, page_identity
+from wiki_extract import extract_wiki_page
+from wiki_page import WikiPage
+from html_parsers import parse_page_html, parse_soup, warm_parser
+from extraction_pool import ExtractionPool
+from wiki_index import INDEX_FILE, LocalWikiBackend, normalize_title
+from search_index import SEARCH_INDEX_FILE, SearchIndex
+from retrieval import select_relevant_indices
+from search_resolver import API_URL, ResolvedPage, resolve_search, resolve_search_async
+from llm_dispatch import LLMDispatcher, make_client
+from subject_guess import guess_subject
+from local_features import LocalFeatureExtractor
+from single_flight import SingleFlight
+from instrumentation import enable_tracing, metrics, stage
 
 api_key = 'test_key_async'
-try:
-    client = AsyncOpenAI(api_key=api_key)
-except Exception as e:
-    print(f"Error initializing AsyncOpenAI client: {e}")
-    client = None
+# OpenAI-compatible endpoint for the client; None is OpenAI itself
+llm_base_url = None
+# One pooled client for the whole process, made by init_client() on first use; LLMDispatcher adds retries, pacing and coalescing on top
+client = None
+
+# Shared pool of warm Chrome sessions, started in main(); prompt() falls back to a fresh driver when it is None
+driver_pool = None
+driver_pool_size = 2
+
+# Browserless HTTP fetching is tried first; Selenium is only used for pages that need JavaScript
+use_http_backend = True
+http_backend = None
+# MediaWiki api.php used to resolve subjects; benchmark.py points it at a local fixture server
+wiki_api_url = API_URL
+
+# Two-tier cache keyed by URL: extracted pages in memory over compressed HTML on disk, created in main()
+page_cache = None
+page_cache_dir = '.page_cache'
+
+# HTML parser backend ('html.parser', 'lxml' or 'selectolax'); content_only_parse skips everything before the content div
+# lxml and selectolax are faster but repair malformed markup differently (a <p> inside a <p>), so they are opt-in
+html_parser_backend = 'html.parser'
+content_only_parse = False
+
+# Worker processes for parsing/extraction; 0 keeps it in a thread, which is fine until many requests arrive at once
+extraction_pool = None
+extraction_workers = 0
+extraction_max_tasks_per_child = 200
+
+# Memoized subject/summary extraction replies; set feature_cache_path to None to keep them in memory only
+chat_model = "gpt-3.5-turbo"
+# make_chatgpt_request answers from canned replies; turn mock_llm off (or pass --llm-base-url, e.g. fake_llm_server.py) to call the API
+mock_llm = True
+# Request/token-per-minute budgets the dispatcher paces real API calls to; created in start_resources() when mock_llm is off
+llm_dispatcher = None
+llm_requests_per_minute = 3500
+llm_tokens_per_minute = 90000
+feature_cache = None
+feature_cache_path = '.feature_cache.sqlite3'
+# Intent templates plus known titles split simple queries without the LLM; below the threshold the LLM call is made
+feature_extractor = None
+local_extraction_threshold = 0.8
+
+# Offline index built by wiki_index.py; when set, subjects found in it never touch the network
+local_wiki = None
+local_wiki_dir = None
+# Index file mtimes local_wiki was loaded at; a sync that changes them is picked up by the next lookup
+loaded_local_wiki_version = None
+# BM25 subject resolver loaded from local_wiki_dir when search_index.py has been run on it
+search_index = None
+
+# Token budget and section count for the paragraphs sent to the answer call; None sends the whole article
+retrieval_token_budget = 1500
+retrieval_top_k = 6
+
+# Final answers keyed on (page, revision, summary). Setting a similarity threshold also lets near-duplicate summaries match,
+# but the trigram vector can't tell "push" from "pull", so that is off unless asked for
+answer_cache = None
+answer_similarity_threshold = None
+
+# Look up and fetch a guessed subject while the feature-extraction call is in flight; a wrong guess costs a wasted fetch
+speculative_fetch = False
+
+# Concurrent lookups of one subject and loads of one page share a single in-flight task across every caller in the process
+page_flights = SingleFlight()
+
+metrics.describe('wiki_prompts_total', "prompt() calls by outcome: answered by the LLM, answered without it (cache hit, empty page) or failed")
+metrics.describe('wiki_llm_requests_total', "make_chatgpt_request calls by prompt kind")
+
+def init_client():
+  global client
+  if client is None:
+    try:
+      client = make_client(api_key, llm_base_url)
+    except Exception as e:
+      print(f"Error initializing AsyncOpenAI client: {e}")
+  return client
 
 def get_soup(driver, url):
-  driver.get(url)
-  driver.implicitly_wait(1)
-  soup = BeautifulSoup(driver.page_source, 'html.parser')
+  # Search pages stay uncached because search_for_page reads driver.current_url after loading them
+  cacheable = page_cache is not None and 'Special:Search' not in url
+  if cacheable:
+    cached = page_cache.get_fresh(url)
+    if cached is not None:
+      with stage('parse'):
+        return parse_soup(cached.html, html_parser_backend)
+  with stage('fetch', via='driver'):
+    driver.get(url)
+    driver.implicitly_wait(1)
+  with stage('parse'):
+    soup = parse_soup(driver.page_source, html_parser_backend)
+  if cacheable:
+    page_cache.store_fetched(url, FetchResult(driver.current_url, 200, driver.page_source, {}))
   return soup
 
+def make_search_url(search_term):
+  return f'https://minecraft.wiki/w/Special:Search?search={search_term.replace(" ", "+")}i'
+
 def search_for_page(driver, search_term):
-  url = f'https://minecraft.wiki/w/Special:Search?search={search_term.replace(" ", "+")}i'
+  with stage('search', via='driver'):
+    return _search_for_page(driver, search_term)
+
+def _search_for_page(driver, search_term):
+  # HTTP pages can ask api.php directly; the Special:Search scrape below is the fallback
+  backend = getattr(driver, 'backend', None)
+  if backend is not None:
+    resolved = resolve_search(backend, search_term, wiki_api_url)
+    if resolved:
+      return resolved.url
+  url = make_search_url(search_term)
   soup = get_soup(driver, url)
   url_addition_tag = soup.find("a", {"data-serp-pos": "0"})
   if url_addition_tag and url_addition_tag.has_attr("href"):
@@ -31,48 +146,36 @@ def search_for_page(driver, search_term):
       url = driver.current_url
   return url
 
-def extract_info_box(soup):
-  info_box = soup.find("div", {"class": "notaninfobox"})
-  info = {}
-  if not info_box: return info
-  name_tag = info_box.find("div", {"class": "mcwiki-header infobox-title"})
-  if name_tag: info["name"] = name_tag.text.strip()
-  image_tag_container = info_box.find("div", {"class": "infobox-imagearea animated-container"})
-  if image_tag_container:
-    image_tag = image_tag_container.find("img")
-    if image_tag and image_tag.has_attr('src'): info["image_url"] = "https://minecraft.wiki" + image_tag["src"]
-  info["details"] = {}
-  table = info_box.find("table", {"class": "infobox-rows"})
-  if table:
-    table_rows = table.find_all("tr")
-    for row in table_rows:
-      key = row.find("th")
-      if key is None: continue
-      value = row.find("td")
-      if value is None: continue
-      info["details"][key.text.strip()] = value.text.strip()
-  return info
-
-def extract_main_paragraph(soup):
-  main_paragraph_container = soup.find("div", {"class": "mw-body-content mw-content-ltr"})
-  if not main_paragraph_container: return []
-  main_paragraph_elements = main_paragraph_container.find_all(["p", "h2", "h3"])
-  tables = soup.find_all("table")
-  paragraphs_in_tables = []
-  for table in tables:
-    paragraphs_in_tables.extend(table.find_all("p"))
-  paragraphs_in_tables_set = set(paragraphs_in_tables)
-  filtered = [el for el in main_paragraph_elements if el.name in ['h2', 'h3'] or (el.name == 'p' and el not in paragraphs_in_tables_set)]
-  main_paragraph = [el.text.strip() for el in filtered]
-  return main_paragraph
-
-def execute_scraping(search_subject, chrome_options_dict):
-  options = webdriver.ChromeOptions()
-  for arg in chrome_options_dict.get('arguments', []):
-    options.add_argument(arg)
-
-  driver = webdriver.Chrome(options=options)
-  driver.implicitly_wait(1)
+async def fetch_html_async(backend, url, refresh=False):
+  with stage('fetch', via='http'):
+    if page_cache is None:
+      return await backend.fetch(url)
+    return await page_cache.fetch_async(backend, url, refresh)
+
+async def get_soup_async(backend, url):
+  result = await fetch_html_async(backend, url)
+  soup = await asyncio.to_thread(parse_soup, result.html, html_parser_backend)
+  return soup, result.url
+
+async def search_for_page_async(backend, search_term):
+  with stage('search', via='http'):
+    return await _search_for_page_async(backend, search_term)
+
+async def _search_for_page_async(backend, search_term):
+  resolved = await resolve_search_async(backend, search_term, wiki_api_url)
+  if resolved:
+    return resolved.url
+  soup, url = await get_soup_async(backend, make_search_url(search_term))
+  url_addition_tag = soup.find("a", {"data-serp-pos": "0"})
+  if url_addition_tag and url_addition_tag.has_attr("href"):
+      url = f'https://minecraft.wiki{url_addition_tag["href"]}'
+  return url
+
+def execute_scraping(search_subject, chrome_options_dict, pool=None):
+  if pool is not None:
+    return execute_pooled_scraping(search_subject, pool)
+  driver = make_chrome_driver(chrome_options_dict)
+  metrics.count('wiki_unpooled_driver_launches_total')
   try:
     print(f"execute_scraping: Searching for {search_subject}")
     content_url = search_for_page(driver, search_subject)
@@ -86,6 +189,47 @@ def execute_scraping(search_subject, chrome_options_dict):
         driver.quit()
     return None, None
 
+def execute_pooled_scraping(search_subject, pool):
+  # The leased driver goes back to the pool here, so callers get (soup, None) and must not quit anything
+  try:
+    with pool.lease() as (driver, usage):
+      print(f"execute_scraping: Searching for {search_subject}")
+      content_url = search_for_page(driver, search_subject)
+      usage['pages_loaded'] += 1
+      print(f"execute_scraping: Navigating to {content_url}")
+      soup = get_soup(driver, content_url)
+      usage['pages_loaded'] += 1
+      print(f"execute_scraping: Soup obtained for {content_url}")
+      return soup, None
+  except Exception as e:
+    print(f"Error during scraping in execute_scraping for {search_subject}: {e}")
+    return None, None
+
+async def execute_http_scraping(search_subject, backend, content_url=None, refresh=False):
+  # Returns the fetched page, or None when the browserless path can't produce a usable one so the caller can fall back to Selenium
+  try:
+    if content_url is None:
+      print(f"execute_http_scraping: Searching for {search_subject}")
+      content_url = await search_for_page_async(backend, search_subject)
+    print(f"execute_http_scraping: Fetching {content_url}")
+    result = await fetch_html_async(backend, content_url, refresh)
+    if result.status != 200:
+      # Missing pages and server errors still come in the full wiki layout, so they would pass for an article
+      print(f"execute_http_scraping: {content_url} returned HTTP {result.status}, falling back to Selenium")
+      return None
+    if page_needs_javascript(result.html):
+      print(f"execute_http_scraping: {content_url} needs JavaScript, falling back to Selenium")
+      return None
+    return result
+  except Exception as e:
+    print(f"Error during HTTP scraping for {search_subject}: {e}")
+    return None
+
+def parse_page_soup(soup):
+  with stage('extract', backend='soup'):
+    canonical_url, revision = page_identity(soup)
+    return extract_wiki_page(soup, None, canonical_url, revision)
+
 basic_feature_extraction = """You are an AI designed to assist with extracting specific features from user requests related to the game Minecraft. Your task is to analyze the user query (delimited by triple backticks) and extract two key pieces of information:
 
 Subject: Identify the main subject of the sentence. This is typically a Minecraft item, entity, block, or structure (full names only).
@@ -128,8 +272,25 @@ The summary and paragraphs (respectively) are defined below, delimited by triple
 ```
 """
 
+def prompt_kind(prompt_text):
+  if prompt_text.startswith(basic_feature_extraction):
+    return 'feature_extraction'
+  if prompt_text.startswith(generate_output):
+    return 'answer'
+  return 'other'
+
 async def make_chatgpt_request(prompt_text):
-  if client is None: return "Error: OpenAI client not initialized."
+  if not mock_llm and init_client() is None: return "Error: OpenAI client not initialized."
+
+  kind = prompt_kind(prompt_text)
+  metrics.count('wiki_llm_requests_total', kind=kind, mocked=mock_llm)
+  if not mock_llm:
+    with stage('llm_request', kind=kind, model=chat_model):
+      try:
+        return await llm_dispatcher.complete(prompt_text)
+      except Exception as e:
+        metrics.count('wiki_llm_errors_total', kind=kind)
+        return f"Error calling OpenAI API: {e}"
 
   # Check for feature extraction prompt
   if prompt_text.startswith("You are an AI designed to assist with extracting specific features"):
@@ -156,92 +317,563 @@ async def make_chatgpt_request(prompt_text):
 
   return f"Mocked ChatGPT Response: Unknown prompt structure. Starts with: {prompt_text[:50]}"
 
-
-async def prompt(user_query):
-  if client is None:
-      return "OpenAI client failed to initialize. Please check API key or environment."
-
-  feature_extraction_full_prompt = basic_feature_extraction + user_query + "\\n```"
-  summary_response_text = await make_chatgpt_request(feature_extraction_full_prompt)
+async def make_chatgpt_request_stream(prompt_text):
+  '''
+  input: prompt_text - (string) the full prompt
+  output: async generator of answer pieces as they are generated; the mocked replies are replayed word by word
+  '''
+  if mock_llm or init_client() is None:
+    reply = await make_chatgpt_request(prompt_text)
+    for piece in re.findall(r'\s*\S+\s*', reply) or [reply]:
+      yield piece
+    return
+  kind = prompt_kind(prompt_text)
+  metrics.count('wiki_llm_requests_total', kind=kind, mocked=False)
+  with stage('llm_request', kind=kind, model=chat_model, stream=True):
+    async for piece in llm_dispatcher.stream(prompt_text):
+      yield piece
+
+
+def extract_features_locally(user_query):
+  if feature_extractor is None:
+    return None
+  features = feature_extractor.extract(user_query)
+  if features is None or features.confidence < local_extraction_threshold:
+    return None
+  return features
+
+async def extract_subject_and_summary(user_query):
+  local_features = extract_features_locally(user_query)
+  if local_features is not None:
+    print(f"Extracted subject and summary locally (confidence {local_features.confidence:.1f})")
+    return local_features.subject, local_features.summary
+
+  summary_response_text = feature_cache.get(chat_model, user_query) if feature_cache is not None else None
+  from_cache = summary_response_text is not None
+  if not from_cache:
+    feature_extraction_full_prompt = basic_feature_extraction + user_query + "\\n```"
+    summary_response_text = await make_chatgpt_request(feature_extraction_full_prompt)
 
   summary_parts = summary_response_text.strip("\"'").split("\\n")
 
   if len(summary_parts) < 2 or not summary_parts[0].startswith("Subject:") or not summary_parts[1].startswith("Summary:"):
       print(f"Unexpected summary format from feature extraction: {summary_response_text}")
-      subject = user_query
-      summary_query = "General information"
-  else:
-      subject = summary_parts[0].replace("Subject: ", "").strip('"')
-      summary_query = summary_parts[1].replace("Summary: ", "").strip('"')
-
-  print(f"Searching for: {subject}, Summary to find: {summary_query}")
-
+      return user_query, "General information"
+  subject = summary_parts[0].replace("Subject: ", "").strip('"')
+  summary_query = summary_parts[1].replace("Summary: ", "").strip('"')
+  # Only well-formed replies are worth remembering
+  if feature_cache is not None and not from_cache:
+    feature_cache.put(chat_model, user_query, summary_response_text)
+  return subject, summary_query
+
+async def lookup_page(subject):
+  '''
+  input: subject - (string) the subject extracted from the user query
+  output: page - ResolvedPage naming the page to answer from, or the full WikiPage when the offline index has it
+  '''
+  reload_local_wiki_if_changed()
+  if search_index is not None:
+    # BM25 over titles, redirects and section text copes with plurals and misspellings without a round trip
+    match = search_index.resolve_subject(subject)
+    if match is not None:
+      print(f"Resolved {subject} locally to {match.title} (score {match.score:.2f})")
+      record = local_wiki.lookup(match.title) if local_wiki is not None else None
+      if record is not None:
+        return record
+      return ResolvedPage(match.title, match.url, None)
+  if local_wiki is not None:
+    record = local_wiki.lookup(subject)
+    if record is not None:
+      print(f"Local index hit for {subject}: {record.title}")
+      return record
+  if http_backend is not None:
+    # api.php hands back the latest revision id, so a cached answer can skip the scrape entirely
+    resolved = await resolve_search_async(http_backend, subject, wiki_api_url)
+    if resolved is not None:
+      return resolved
+  return ResolvedPage(subject, None, None)
+
+async def load_page_content(subject, page):
+  '''
+  input: subject - (string) search term for the scraping fallbacks
+         page - (ResolvedPage or WikiPage) the result of lookup_page
+  output: page - (WikiPage) or None if nothing could be scraped
+  '''
+  if isinstance(page, WikiPage):
+    return page
+  # api.php names the current revision; a cached copy of any other one is out of date, on disk as well as parsed
+  stale = False
+  if page_cache is not None and page.url:
+    parsed = page_cache.get_parsed(page.url)
+    if parsed is not None:
+      if page.revision is None or parsed.revision == page.revision:
+        return parsed.with_identity(title=page.title)
+      print(f"Cached {page.url} is revision {parsed.revision}, api.php reports {page.revision}; fetching it again")
+      stale = True
   chrome_options_dict = {'arguments': ['--headless', '--no-sandbox', '--disable-dev-shm-usage', '--disable-gpu']}
-
+  parsed = None
   driver = None
-  soup_obj = None
-  info_results = {}
-  paragraphs_results = []
-
   try:
-    soup_obj, driver = await asyncio.to_thread(execute_scraping, subject, chrome_options_dict)
-
-    if soup_obj:
-        print(f"Scraping successful for {subject}")
-        # Launch parsing tasks concurrently
-        info_task = asyncio.to_thread(extract_info_box, soup_obj)
-        paragraphs_task = asyncio.to_thread(extract_main_paragraph, soup_obj)
-        # Ensure info_results and paragraphs_results are correctly assigned
-        info_results_val, paragraphs_results_val = await asyncio.gather(info_task, paragraphs_task)
-        info_results = info_results_val if info_results_val is not None else {}
-        paragraphs_results = paragraphs_results_val if paragraphs_results_val is not None else []
+    if http_backend is not None:
+      result = await execute_http_scraping(subject, http_backend, page.url, stale)
+      if result is not None:
+        # One pass over the tree yields both infobox and paragraphs; with a process pool it also leaves the GIL behind
+        if extraction_pool is not None:
+          # Parsing happens in the worker too, so the pool's time is all booked as extract
+          with stage('extract', backend=html_parser_backend, pool=True):
+            parsed = await extraction_pool.extract(result.html)
+        else:
+          parsed = await asyncio.to_thread(parse_page_html, result.html, html_parser_backend, content_only_parse)
+    if parsed is None:
+      soup_obj, driver = await asyncio.to_thread(execute_scraping, subject, chrome_options_dict, driver_pool)
+      if soup_obj:
+        parsed = await asyncio.to_thread(parse_page_soup, soup_obj)
+    if parsed is None:
+      return None
+    print(f"Scraping successful for {subject}")
+    loaded_page = parsed.with_identity(title=page.title, url=page.url)
+    if page_cache is not None and loaded_page.url:
+      page_cache.put_parsed(loaded_page.url, loaded_page)
+    return loaded_page
+  finally:
+    if driver:
+        await asyncio.to_thread(driver.quit)
 
-    else:
-        print(f"Warning: Scraping failed for subject '{subject}', no soup object returned.")
+def build_scraped_content(page, indices=None):
+  '''
+  input: page - (WikiPage) the loaded article
+         indices - (list of ints) optional, the paragraphs to include; all of them when None
+  output: content - (string) infobox lines then paragraphs, sliced straight out of the page's text buffer
+  '''
+  info_text_parts = []
+  if page.name is not None:
+      info_text_parts.append(f"Name: {page.name}")
+  info_text_parts.extend(f"{k}: {v}" for k, v in zip(page.info_keys, page.info_values))
+  info_text = "\\n".join(info_text_parts)
+
+  paragraphs_text = page.join_paragraphs(indices, "\\n")
+
+  return f"{info_text}\\n{paragraphs_text}".strip()
+
+def get_cached_answer(page, summary_query):
+  if answer_cache is None:
+    return None
+  cached_answer = answer_cache.get(page.url, page.revision, summary_query)
+  if cached_answer is not None:
+    print(f"Answer cache hit for {page.url} (revision {page.revision})")
+  return cached_answer
+
+def shared_task(tasks, key, make_coroutine):
+  # Callers asking for the same key share one task instead of repeating the work
+  task = tasks.get(key)
+  if task is None:
+    task = tasks[key] = asyncio.ensure_future(make_coroutine())
+  return task
+
+def lookup_page_once(subject):
+  return page_flights.do(('lookup', normalize_title(subject)), lambda: lookup_page(subject))
+
+def load_page_once(subject, page):
+  # Keyed by canonical URL when known, so "diamonds" and "Diamond" asked together still load the page once
+  return page_flights.do(('load', page.url or normalize_title(subject)), lambda: load_page_content(subject, page))
+
+# Everything the answer call needs once the page has been loaded
+AnswerRequest = namedtuple('AnswerRequest', ['prompt_text', 'page', 'summary_query'])
+
+# Lookup and load tasks started from guess_subject() before the real subject is known
+Speculation = namedtuple('Speculation', ['guess', 'lookup', 'load'])
+
+def start_speculation(user_query):
+  if extract_features_locally(user_query) is not None:
+    # The real subject is about to arrive without an LLM round trip, so there is nothing to overlap
+    return None
+  if feature_cache is not None and feature_cache.contains(chat_model, user_query):
+    # The extraction reply is cached, so the real subject arrives just as fast as a guessed one
+    return None
+  guess = guess_subject(user_query)
+  if not guess:
+    return None
+  print(f"Speculatively fetching: {guess}")
+  # Through page_flights, so the real lookup and load join these when the guess names the same subject or page
+  lookup = asyncio.ensure_future(lookup_page_once(guess))
+  async def load():
+    return await load_page_once(guess, await lookup)
+  return Speculation(guess, lookup, asyncio.ensure_future(load()))
+
+def discard_task(task):
+  task.cancel()
+  # Retrieve the outcome so an abandoned task never logs "exception was never retrieved"
+  task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+async def prepare_answer(user_query, page_tasks=None):
+  '''
+  input: user_query - (string) the question to answer
+         page_tasks - (dict) optional, shared between prompt() calls so each subject is looked up and scraped only once
+  output: the answer itself (string) when it is already known, otherwise an AnswerRequest for the final LLM call
+  '''
+  speculation = start_speculation(user_query) if speculative_fetch else None
+  try:
+    return await prepare_answer_for(user_query, page_tasks, speculation)
+  finally:
+    if speculation is not None:
+      # A wrong guess is cancelled here; a right one has been joined by the real lookup/load and finishes for them
+      discard_task(speculation.lookup)
+      discard_task(speculation.load)
 
-    info_text_parts = []
-    if 'name' in info_results:
-        info_text_parts.append(f"Name: {info_results.get('name', 'N/A')}")
-    if 'details' in info_results and isinstance(info_results.get('details'), dict):
-        for k, v in info_results.get('details', {}).items():
-            info_text_parts.append(f"{k}: {v}")
-    info_text = "\\n".join(info_text_parts)
+async def prepare_answer_for(user_query, page_tasks, speculation):
+  with stage('feature_extraction'):
+    subject, summary_query = await extract_subject_and_summary(user_query)
 
-    paragraphs_text = "\\n".join(paragraphs_results)
+  print(f"Searching for: {subject}, Summary to find: {summary_query}")
 
-    scraped_content = f"{info_text}\\n{paragraphs_text}".strip()
+  make_lookup = lambda: lookup_page_once(subject)
+  if speculation is not None and normalize_title(speculation.guess) == normalize_title(subject):
+    # The guess was right and its lookup has usually finished by now; shielded so discarding the speculation can't cancel it
+    print(f"Keeping the speculative fetch of {speculation.guess}")
+    make_lookup = lambda: asyncio.shield(speculation.lookup)
+  with stage('search'):
+    if page_tasks is None:
+      page = await make_lookup()
+    else:
+      page = await shared_task(page_tasks, ('lookup', normalize_title(subject)), make_lookup)
+  cached_answer = get_cached_answer(page, summary_query)
+  if cached_answer is not None:
+    return cached_answer
 
-    if not scraped_content: # Check if any content was actually scraped
-        # Get current URL from driver if it exists, for debugging
-        page_url_info = f"Page URL: {driver.current_url}" if driver and hasattr(driver, 'current_url') else "Driver not available or URL not accessible"
-        print(f"Warning: No information extracted from info_box or paragraphs for subject '{subject}'. {page_url_info}")
-        return f"Could not extract detailed information for '{subject}' regarding '{summary_query}'. The wiki page might not have the expected structure or the content is missing."
+  if page_tasks is None:
+    loaded_page = await load_page_once(subject, page)
+  else:
+    loaded_page = await shared_task(page_tasks, ('load', page.url or normalize_title(subject)), lambda: load_page_once(subject, page))
+  if loaded_page is None:
+      print(f"Warning: Scraping failed for subject '{subject}', no soup object returned.")
+      loaded_page = WikiPage.from_extracted(page.title, page.url, page.revision, {}, [])
+  elif loaded_page.revision != page.revision and (page.revision is None or (loaded_page.revision or 0) > page.revision):
+    # The Selenium fallback only learns the page's identity after scraping it. A copy older than the revision api.php
+    # reported must not bring back the answers cached for it
+    cached_answer = get_cached_answer(loaded_page, summary_query)
+    if cached_answer is not None:
+      return cached_answer
+
+  with stage('prompt_build'):
+    selected = None
+    if retrieval_token_budget is not None:
+      # Long articles only send the sections that match the summary query
+      selected = select_relevant_indices(loaded_page.paragraphs(), summary_query, retrieval_token_budget, retrieval_top_k, loaded_page.heading_flags)
+    scraped_content = build_scraped_content(loaded_page, selected)
+
+  if not scraped_content: # Check if any content was actually scraped
+      print(f"Warning: No information extracted from info_box or paragraphs for subject '{subject}'. Page URL: {loaded_page.url}")
+      return f"Could not extract detailed information for '{subject}' regarding '{summary_query}'. The wiki page might not have the expected structure or the content is missing."
+
+  final_gpt_full_prompt = generate_output + summary_query + "\\n```\\n" + scraped_content + "\\n```"
+  return AnswerRequest(final_gpt_full_prompt, loaded_page, summary_query)
+
+def remember_answer(request, final_answer):
+  if answer_cache is not None and not final_answer.startswith("Error"):
+    answer_cache.put(request.page.url, request.page.revision, request.summary_query, final_answer)
+
+async def prompt(user_query, page_tasks=None):
+  '''
+  input: user_query - (string) the question to answer
+         page_tasks - (dict) optional, shared between prompt() calls so each subject is looked up and scraped only once
+  output: answer - (string)
+  '''
+  if not mock_llm and init_client() is None:
+      return "OpenAI client failed to initialize. Please check API key or environment."
 
-    final_gpt_full_prompt = generate_output + summary_query + "\\n```\\n" + scraped_content + "\\n```"
-    final_answer = await make_chatgpt_request(final_gpt_full_prompt)
-    return final_answer
+  try:
+    with stage('prompt'):
+      request = await prepare_answer(user_query, page_tasks)
+      if not isinstance(request, AnswerRequest):
+        metrics.count('wiki_prompts_total', outcome='without_llm')
+        return request
+      with stage('llm'):
+        final_answer = await make_chatgpt_request(request.prompt_text)
+      remember_answer(request, final_answer)
+      metrics.count('wiki_prompts_total', outcome='answered')
+      return final_answer
   except Exception as e:
+    metrics.count('wiki_prompts_total', outcome='error')
     print(f"An error occurred in prompt: {e}")
     # import traceback
     # traceback.print_exc() # This would give more detailed errors if possible in the environment
     return "Sorry, I encountered an error processing your request."
-  finally:
-    if driver:
-        await asyncio.to_thread(driver.quit)
 
-async def main():
-  user_input = "What is dirt?"
-  print(f"What would you like to ask? {user_input}")
-  if client is None:
-      print("OpenAI client failed to initialize. Please check API key or environment.")
+async def prompt_stream(user_query, page_tasks=None):
+  '''
+  input: same as prompt()
+  output: async generator of answer pieces; cached and error answers arrive as a single piece
+  '''
+  if not mock_llm and init_client() is None:
+      yield "OpenAI client failed to initialize. Please check API key or environment."
       return
-  response = await prompt(user_input)
-  print(response)
 
-if __name__ == '__main__':
   try:
-    chromedriver_autoinstaller.install()
+    with stage('prompt', stream=True):
+      request = await prepare_answer(user_query, page_tasks)
+      if not isinstance(request, AnswerRequest):
+        metrics.count('wiki_prompts_total', outcome='without_llm')
+        yield request
+        return
+      pieces = []
+      with stage('llm'):
+        async for piece in make_chatgpt_request_stream(request.prompt_text):
+          pieces.append(piece)
+          yield piece
+      # Only a complete answer is cached; a consumer that stops early leaves nothing behind
+      remember_answer(request, ''.join(pieces))
+      metrics.count('wiki_prompts_total', outcome='answered')
   except Exception as e:
-    print(f"Error installing/checking chromedriver: {e}")
+    metrics.count('wiki_prompts_total', outcome='error')
+    print(f"An error occurred in prompt_stream: {e}")
+    yield "Sorry, I encountered an error processing your request."
+
+async def prompt_many(queries, concurrency=8):
+  '''
+  input: queries - (list of strings) questions to answer
+         concurrency - (int) how many queries are in flight at once
+  output: async generator of (index, query, answer), in completion order
+  '''
+  semaphore = asyncio.Semaphore(concurrency)
+  page_tasks = {}
+  async def run(index, query):
+    async with semaphore:
+      return index, query, await prompt(query, page_tasks)
+  tasks = [asyncio.ensure_future(run(index, query)) for index, query in enumerate(queries)]
+  try:
+    for next_done in asyncio.as_completed(tasks):
+      yield await next_done
+  finally:
+    for task in tasks + list(page_tasks.values()):
+      task.cancel()
+
+def local_wiki_version():
+  # Modification times of the index files; wiki_sync.py rewrites them in place while the pipeline keeps running
+  paths = [os.path.join(local_wiki_dir, INDEX_FILE), os.path.join(local_wiki_dir, SEARCH_INDEX_FILE)]
+  return tuple(os.path.getmtime(path) if os.path.exists(path) else None for path in paths)
+
+def load_local_wiki():
+  global local_wiki, search_index, loaded_local_wiki_version
+  loaded_local_wiki_version = local_wiki_version()
+  local_wiki = LocalWikiBackend(local_wiki_dir)
+  search_index = SearchIndex.load(local_wiki_dir) if os.path.exists(os.path.join(local_wiki_dir, SEARCH_INDEX_FILE)) else None
+
+def make_feature_extractor():
+  if search_index is not None:
+    return LocalFeatureExtractor.from_search_index(search_index)
+  if local_wiki is not None:
+    return LocalFeatureExtractor.from_local_wiki(local_wiki)
+  # Templates alone score under the default threshold, so every query still goes to the LLM
+  return LocalFeatureExtractor()
+
+def reload_local_wiki_if_changed():
+  '''
+  Picks up a synced offline index without a restart. Records are copied out of the old index as they are read, so it can
+  be closed as soon as the new one is in place.
+  '''
+  global feature_extractor
+  if local_wiki is None or local_wiki_version() == loaded_local_wiki_version:
+    return
+  previous = local_wiki
+  try:
+    load_local_wiki()
+  except (OSError, ValueError) as e:
+    # Caught between the two files being replaced; the next lookup tries again
+    print(f"Reloading the offline wiki index failed: {e}")
+    return
+  feature_extractor = make_feature_extractor()
+  previous.close()
+  print(f"Reloaded the offline wiki index from {local_wiki_dir}")
+
+async def start_resources():
+  global driver_pool, http_backend, page_cache, feature_cache, answer_cache, extraction_pool, feature_extractor, llm_dispatcher
+  driver_pool = DriverPool(size=driver_pool_size)
+  if not mock_llm and init_client() is not None:
+    llm_dispatcher = LLMDispatcher(client, chat_model, llm_requests_per_minute, llm_tokens_per_minute)
+  if extraction_workers:
+    extraction_pool = ExtractionPool(extraction_workers, extraction_max_tasks_per_child, html_parser_backend, content_only_parse)
+    await extraction_pool.warm()
+  page_cache = PageCache(directory=page_cache_dir)
+  feature_cache = FeatureExtractionCache(sqlite_path=feature_cache_path)
+  answer_cache = AnswerCache(similarity_threshold=answer_similarity_threshold)
+  if local_wiki_dir:
+    load_local_wiki()
+  feature_extractor = make_feature_extractor()
+  if use_http_backend:
+    http_backend = AsyncHttpFetchBackend()
+  else:
+    try:
+      await driver_pool.start_async()
+    except Exception as e:
+      # A lease launches its own driver when none is idle, so each query still gets its own try at Selenium
+      print(f"Could not start the driver pool, launching drivers on demand instead: {e}")
+
+# Asked by warm_up() so the first real query finds connections open and its page cached
+warmup_queries = ["What is dirt?"]
+
+async def warm_up():
+  '''
+  Pays the first-query costs before taking traffic: parser imports, one browser for the Selenium fallback of HTTP-first
+  runs, the LLM client, and the fetch and page caches via warmup_queries.
+  Call after start_resources(), which starts the extraction workers, and the whole driver pool when Selenium comes first.
+  '''
+  started = time.perf_counter()
+  await asyncio.to_thread(warm_parser, html_parser_backend, content_only_parse)
+  if use_http_backend:
+    try:
+      await driver_pool.start_async(1)
+    except Exception as e:
+      print(f"Warm-up couldn't start a browser for the Selenium fallback: {e}")
+  if not mock_llm:
+    init_client()
+  for query in warmup_queries:
+    await prompt(query)
+  print(f"Warm-up finished in {time.perf_counter() - started:.2f}s")
+
+def print_resource_stats():
+  print(f"Driver pool stats: {driver_pool.stats()}")
+  print(f"Page cache stats: {page_cache.stats()}")
+  print(f"Feature extraction cache stats: {feature_cache.stats()}")
+  print(f"Answer cache stats: {answer_cache.stats()}")
+  if extraction_pool is not None:
+    print(f"Extraction pool stats: {extraction_pool.stats()}")
+  if llm_dispatcher is not None:
+    print(f"LLM dispatcher stats: {llm_dispatcher.stats()}")
+  print(f"Page single-flight stats: {page_flights.stats()}")
+
+def collect_resource_metrics():
+  # The caches and pools count their own hits and launches; this reads those counts when metrics are exported
+  if page_cache is not None:
+    stats = page_cache.stats()
+    yield 'wiki_cache_hits_total', 'counter', {'cache': 'page_memory'}, stats['memory']['hits']
+    yield 'wiki_cache_misses_total', 'counter', {'cache': 'page_memory'}, stats['memory']['misses']
+    yield 'wiki_cache_hits_total', 'counter', {'cache': 'page_disk'}, stats['disk_hits']
+    yield 'wiki_page_revalidations_total', 'counter', {}, stats['revalidations']
+    yield 'wiki_page_network_fetches_total', 'counter', {}, stats['network_fetches']
+  if answer_cache is not None:
+    stats = answer_cache.stats()
+    yield 'wiki_cache_hits_total', 'counter', {'cache': 'answer_exact'}, stats['exact_hits']
+    yield 'wiki_cache_hits_total', 'counter', {'cache': 'answer_similar'}, stats['similar_hits']
+    yield 'wiki_cache_misses_total', 'counter', {'cache': 'answer'}, stats['misses']
+  if feature_cache is not None:
+    stats = feature_cache.stats()
+    yield 'wiki_cache_hits_total', 'counter', {'cache': 'feature_memory'}, stats['memory']['hits']
+    yield 'wiki_cache_misses_total', 'counter', {'cache': 'feature_memory'}, stats['memory']['misses']
+    yield 'wiki_cache_hits_total', 'counter', {'cache': 'feature_store'}, stats['store_hits']
+  if driver_pool is not None:
+    stats = driver_pool.stats()
+    yield 'wiki_driver_launches_total', 'counter', {}, stats['launches']
+    yield 'wiki_driver_recycles_total', 'counter', {}, stats['recycles']
+    yield 'wiki_driver_crashes_total', 'counter', {}, stats['crashes']
+    yield 'wiki_drivers_in_use', 'gauge', {}, stats['in_use']
+  if extraction_pool is not None:
+    stats = extraction_pool.stats()
+    yield 'wiki_extractions_submitted_total', 'counter', {}, stats['submitted']
+    yield 'wiki_extractions_in_flight', 'gauge', {}, stats['in_flight']
+  if llm_dispatcher is not None:
+    stats = llm_dispatcher.stats()
+    yield 'wiki_llm_dispatched_total', 'counter', {}, stats['requests']
+    yield 'wiki_llm_coalesced_total', 'counter', {}, stats['coalesced']
+    yield 'wiki_llm_retries_total', 'counter', {}, stats['retries']
+    yield 'wiki_llm_failures_total', 'counter', {}, stats['failures']
+    yield 'wiki_llm_rate_limit_wait_seconds_total', 'counter', {}, stats['rate_limit_wait']
+  stats = page_flights.stats()
+  yield 'wiki_page_flights_started_total', 'counter', {}, stats['started']
+  yield 'wiki_page_flights_shared_total', 'counter', {}, stats['shared']
+
+metrics.add_collector(collect_resource_metrics)
+
+async def close_resources():
+  global driver_pool, http_backend, page_cache, feature_cache, answer_cache, local_wiki, search_index, extraction_pool, feature_extractor, llm_dispatcher
+  # The dispatcher's client is the module-wide one, so it stays open for the next start_resources()
+  llm_dispatcher = None
+  if extraction_pool is not None:
+    await asyncio.to_thread(extraction_pool.close)
+    extraction_pool = None
+  if driver_pool is not None:
+    await driver_pool.close_async()
+    driver_pool = None
+  if feature_cache is not None:
+    feature_cache.close()
+    feature_cache = None
+  if local_wiki is not None:
+    local_wiki.close()
+    local_wiki = None
+  search_index = None
+  feature_extractor = None
+  if http_backend is not None:
+    await http_backend.close()
+    http_backend = None
+  page_cache = None
+  answer_cache = None
+
+def read_batch_queries(path):
+  if path == '-':
+    lines = sys.stdin.read().splitlines()
+  else:
+    with open(path, 'r', encoding='utf-8') as f:
+      lines = f.read().splitlines()
+  return [line.strip() for line in lines if line.strip()]
+
+async def run_batch(path, concurrency):
+  queries = read_batch_queries(path)
+  print(f"Answering {len(queries)} queries with concurrency {concurrency}", file=sys.stderr)
+  async for index, query, answer in prompt_many(queries, concurrency):
+    print(json.dumps({'index': index, 'query': query, 'answer': answer}), flush=True)
+
+async def print_streamed_answer(user_input):
+  started = time.perf_counter()
+  first_piece_after = None
+  async for piece in prompt_stream(user_input):
+    if first_piece_after is None:
+      first_piece_after = time.perf_counter() - started
+    print(piece, end='', flush=True)
+  print()
+  if first_piece_after is not None:
+    print(f"Time to first token: {first_piece_after:.3f}s", file=sys.stderr)
+
+async def main(argv=None):
+  parser = argparse.ArgumentParser(description="Ask the Minecraft Wiki questions through ChatGPT.")
+  parser.add_argument('--batch', metavar='FILE', help="answer one query per line from FILE ('-' for stdin) and print JSON lines as they finish")
+  parser.add_argument('--concurrency', type=int, default=8, help="queries answered at once in --batch mode")
+  parser.add_argument('--stream', action='store_true', help="print the answer as it is generated")
+  parser.add_argument('--speculate', action='store_true', help="start fetching a guessed subject while the LLM extracts the real one")
+  parser.add_argument('--llm-base-url', help="send LLM calls to this OpenAI-compatible endpoint (e.g. fake_llm_server.py) instead of the mocked replies")
+  parser.add_argument('--metrics-file', help="write Prometheus text-format metrics to this file before exiting")
+  parser.add_argument('--warmup', action='store_true', help="prime the parser, drivers, LLM client and caches before answering")
+  parser.add_argument('--trace', action='store_true', help="export every stage as an OpenTelemetry span (needs opentelemetry installed and configured)")
+  args = parser.parse_args(argv)
+  global llm_base_url, mock_llm, speculative_fetch
+  speculative_fetch = speculative_fetch or args.speculate
+  if args.llm_base_url:
+    llm_base_url = args.llm_base_url
+    mock_llm = False
+  if not mock_llm and init_client() is None:
+      print("OpenAI client failed to initialize. Please check API key or environment.")
+      return
+  if args.trace and not enable_tracing():
+    print("--trace needs the opentelemetry-api package; continuing without spans")
+  await start_resources()
+  try:
+    if args.warmup:
+      await warm_up()
+    if args.batch:
+      await run_batch(args.batch, args.concurrency)
+    else:
+      user_input = "What is dirt?"
+      print(f"What would you like to ask? {user_input}")
+      if args.stream:
+        await print_streamed_answer(user_input)
+      else:
+        response = await prompt(user_input)
+        print(response)
+    print_resource_stats()
+    if args.metrics_file:
+      with open(args.metrics_file, 'w', encoding='utf-8') as f:
+        f.write(metrics.to_prometheus())
+  finally:
+    await close_resources()
 
+if __name__ == '__main__':
+  # chromedriver is checked when a browser is first needed (or by --warmup), not on every start
   asyncio.run(main())
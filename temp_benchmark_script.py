@@ -1,12 +1,9 @@
 import sys
-import chromedriver_autoinstaller
-from selenium import webdriver
-from bs4 import BeautifulSoup
+from driver_pool import ensure_chromedriver
 import re
 import threading
 import asyncio
 import time
-from openai import AsyncOpenAI
 
 # API Key
 api_key = '[INSERT YOUR API KEY HERE]' # Placeholder
@@ -14,6 +11,7 @@ client = None # Will be initialized in main after checking api_key
 
 # Function definitions
 def get_soup(driver, url):
+  from bs4 import BeautifulSoup
   driver.get(url)
   driver.implicitly_wait(1)
   soup = BeautifulSoup(driver.page_source, 'html.parser')
@@ -66,15 +64,13 @@ def extract_main_paragraph(soup): # Refactored version
   return main_paragraph
 
 def execute_scraping(search_subject, chrome_options_dict):
+  from selenium import webdriver
   options = webdriver.ChromeOptions()
   for arg in chrome_options_dict.get('arguments', []):
     options.add_argument(arg)
 
-  # Ensure chromedriver is installed within the context of this threaded function
-  try:
-    chromedriver_autoinstaller.install(cwd=True) # Install in current working dir if needed by thread
-  except Exception as e:
-    print(f"Note: Chromedriver autoinstall in thread encountered: {e}. Assuming driver is in PATH or pre-installed.")
+  # Checked once per process (and remembered on disk), not on every scrape
+  ensure_chromedriver()
 
   driver = webdriver.Chrome(options=options)
   driver.implicitly_wait(1)
@@ -248,6 +244,7 @@ async def main():
   global client, api_key
   if api_key != '[INSERT YOUR API KEY HERE]': # Attempt to init client if a real key might be there
       try:
+          from openai import AsyncOpenAI
           client = AsyncOpenAI(api_key=api_key)
           print("AsyncOpenAI client initialized with provided API key.")
       except Exception as e:
@@ -265,11 +262,10 @@ async def main():
   first_response = ""
 
   print("Checking/Installing Chromedriver...")
-  try:
-    chromedriver_autoinstaller.install()
+  if ensure_chromedriver():
     print("Chromedriver is ready.")
-  except Exception as e:
-    print(f"Error installing/checking chromedriver: {e}. Selenium might fail.")
+  else:
+    print("Chromedriver could not be installed. Selenium might fail.")
 
   print(f"\\nStarting benchmark with {num_runs} runs...\\n")
   for i in range(num_runs):
@@ -0,0 +1,212 @@
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import openai
+import temp_async_test_script as pipeline
+from fake_llm_server import FakeChatServer, default_reply, split_tokens
+from fake_wiki_server import FakeWikiServer, synthetic_pages
+from llm_client import stream_chat_completion
+from llm_dispatch import LLMDispatcher, TokenBucket, make_client
+
+async def make_dispatcher(server, **options):
+    return LLMDispatcher(make_client('test', server.base_url), 'fake-model', **options)
+
+async def test_coalescing():
+    async with FakeChatServer(first_token_delay=0.2) as server:
+        dispatcher = await make_dispatcher(server)
+        try:
+            replies = await asyncio.gather(*(dispatcher.complete("What is dirt?") for _ in range(5)), dispatcher.complete("What is a creeper?"))
+        finally:
+            await dispatcher.close()
+    assert len(set(replies[:5])) == 1 and replies[5] != replies[0], f"Test 1 Failed: unexpected replies {replies}"
+    assert server.requests == 2, f"Test 1 Failed: expected 2 requests for 2 distinct prompts, got {server.requests}"
+    assert dispatcher.stats()['coalesced'] == 4, f"Test 1 Failed: expected 4 coalesced calls, got {dispatcher.stats()}"
+    print("Test 1 Passed")
+
+async def test_retry_after():
+    # base_delay is tiny, so the wait comes from the server's Retry-After-Ms (50ms per attempt)
+    async with FakeChatServer(rate_limit_first=2) as server:
+        dispatcher = await make_dispatcher(server, base_delay=0.001)
+        try:
+            started = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                reply = await dispatcher.complete("What is dirt?")
+            elapsed = time.perf_counter() - started
+        finally:
+            await dispatcher.close()
+    assert reply.startswith("Answer:"), f"Test 2 Failed: unexpected reply {reply!r}"
+    assert server.requests == 3 and dispatcher.retries == 2, f"Test 2 Failed: {server.requests} requests, {dispatcher.retries} retries"
+    assert elapsed >= 0.1, f"Test 2 Failed: retried after {elapsed:.3f}s, before Retry-After-Ms allowed"
+    print("Test 2 Passed")
+
+async def test_retries_exhausted():
+    async with FakeChatServer(rate_limit_first=10) as server:
+        dispatcher = await make_dispatcher(server, max_retries=1, base_delay=0.001)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                await dispatcher.complete("What is dirt?")
+            raise AssertionError("Test 3 Failed: expected RateLimitError")
+        except openai.RateLimitError:
+            pass
+        finally:
+            await dispatcher.close()
+    assert server.requests == 2 and dispatcher.failures == 1, f"Test 3 Failed: {server.requests} requests, {dispatcher.stats()}"
+    print("Test 3 Passed")
+
+async def test_not_retryable():
+    async with FakeChatServer(reject_first=1) as server:
+        dispatcher = await make_dispatcher(server, base_delay=0.001)
+        try:
+            await dispatcher.complete("What is dirt?")
+            raise AssertionError("Test 4 Failed: expected BadRequestError")
+        except openai.BadRequestError:
+            pass
+        finally:
+            await dispatcher.close()
+    assert server.requests == 1 and dispatcher.retries == 0, f"Test 4 Failed: {server.requests} requests, {dispatcher.retries} retries"
+    print("Test 4 Passed")
+
+async def test_token_bucket_pacing():
+    # 600 a minute is one every 0.1s; the burst of 2 goes straight through, the other 4 are paced
+    bucket = TokenBucket(600, burst=2)
+    started = time.perf_counter()
+    times = []
+    for _ in range(6):
+        await bucket.acquire()
+        times.append(time.perf_counter() - started)
+    assert times[1] < 0.05, f"Test 5 Failed: burst was paced {times}"
+    assert 0.35 <= times[-1] < 0.6, f"Test 5 Failed: 4 paced acquires took {times[-1]:.3f}s, expected about 0.4s"
+    # A request larger than the bucket is capped at its capacity instead of waiting forever
+    started = time.perf_counter()
+    await TokenBucket(60, burst=1).acquire(5)
+    assert time.perf_counter() - started < 0.05, "Test 5 Failed: oversized request waited"
+    print("Test 5 Passed")
+
+async def read_stream(pieces):
+    # (piece, seconds since the stream was opened) for every piece
+    started = time.perf_counter()
+    return [(piece, time.perf_counter() - started) async for piece in pieces]
+
+async def test_stream_order():
+    prompt_text = "What is dirt?"
+    expected = split_tokens(default_reply(prompt_text))
+    async with FakeChatServer(token_delay=0.01) as server:
+        client = make_client('test', server.base_url)
+        try:
+            direct = await read_stream(stream_chat_completion(client, 'fake-model', prompt_text))
+        finally:
+            await client.close()
+        dispatcher = await make_dispatcher(server)
+        try:
+            dispatched = await read_stream(dispatcher.stream(prompt_text))
+        finally:
+            await dispatcher.close()
+    for name, received in (('stream_chat_completion', direct), ('LLMDispatcher.stream', dispatched)):
+        pieces = [piece for piece, _ in received]
+        assert pieces == expected, f"Test 6 Failed: {name} pieces {pieces}, expected {expected}"
+        assert ''.join(pieces) == default_reply(prompt_text), f"Test 6 Failed: {name} pieces don't join to the reply"
+        # Pieces are handed on as they arrive, not all at once at the end
+        assert received[-1][1] - received[0][1] >= 0.01 * (len(expected) - 1) * 0.8, f"Test 6 Failed: {name} pieces arrived together {received}"
+    assert server.streamed_requests == 2, f"Test 6 Failed: {server.streamed_requests} streamed requests"
+    print("Test 6 Passed")
+
+async def test_stream_coalescing():
+    prompt_text = "What is dirt?"
+    expected = split_tokens(default_reply(prompt_text))
+    async with FakeChatServer(first_token_delay=0.1, token_delay=0.01) as server:
+        dispatcher = await make_dispatcher(server)
+        try:
+            async def late_reader():
+                # Joins after some pieces have gone out and is replayed them
+                await asyncio.sleep(0.15)
+                return await read_stream(dispatcher.stream(prompt_text))
+            async def early_reader():
+                # Stops after two pieces without cutting the stream off for the others
+                received = []
+                async with contextlib.aclosing(dispatcher.stream(prompt_text)) as pieces:
+                    async for piece in pieces:
+                        received.append(piece)
+                        if len(received) == 2:
+                            break
+                return received
+            results = await asyncio.gather(*(read_stream(dispatcher.stream(prompt_text)) for _ in range(3)), late_reader(),
+                                           read_stream(dispatcher.stream("What is a creeper?")), early_reader())
+            stats = dispatcher.stats()
+        finally:
+            await dispatcher.close()
+    for received in results[:4]:
+        assert [piece for piece, _ in received] == expected, f"Test 7 Failed: a shared stream got {received}"
+    assert server.streamed_requests == 2, f"Test 7 Failed: expected 2 streams for 2 distinct prompts, got {server.streamed_requests}"
+    assert results[5] == expected[:2], f"Test 7 Failed: the early reader got {results[5]}"
+    assert stats['coalesced'] == 4 and stats['in_flight'] == 0, f"Test 7 Failed: {stats}"
+    print("Test 7 Passed")
+
+async def test_stream_pacing():
+    # Streams take from the same request bucket: a burst of 1 at 600 a minute spaces 3 streams 0.1s apart
+    async with FakeChatServer() as server:
+        dispatcher = await make_dispatcher(server)
+        dispatcher.request_bucket = TokenBucket(600, burst=1)
+        try:
+            started = time.perf_counter()
+            await asyncio.gather(*(read_stream(dispatcher.stream(f"Question {i}?")) for i in range(3)))
+            elapsed = time.perf_counter() - started
+        finally:
+            await dispatcher.close()
+    assert server.streamed_requests == 3, f"Test 8 Failed: {server.streamed_requests} streamed requests"
+    assert elapsed >= 0.18 and dispatcher.request_bucket.waited > 0, f"Test 8 Failed: 3 streams took {elapsed:.3f}s"
+    print("Test 8 Passed")
+
+def pipeline_reply(prompt_text):
+    # Feature extraction gets the format it parses; answers get the canonical fake reply
+    if prompt_text.startswith("You are an AI designed to assist with extracting specific features"):
+        return 'Subject: "Dirt"\\nSummary: "What is dirt?"'
+    return default_reply(prompt_text)
+
+async def test_prompt_stream():
+    directory = tempfile.mkdtemp()
+    pipeline.page_cache_dir = os.path.join(directory, 'page_cache')
+    pipeline.feature_cache_path = os.path.join(directory, 'features.sqlite3')
+    try:
+        with FakeWikiServer(synthetic_pages(4, paragraphs=6)) as wiki:
+            pipeline.wiki_base_url = wiki.base_url
+            pipeline.wiki_api_url = wiki.api_url
+            async with FakeChatServer(reply=pipeline_reply, token_delay=0.005) as server:
+                pipeline.llm_base_url = server.base_url
+                pipeline.mock_llm = False
+                pipeline.client = None
+                await pipeline.start_resources()
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        pieces = [piece async for piece in pipeline.prompt_stream("What is dirt?")]
+                        cached = [piece async for piece in pipeline.prompt_stream("What is dirt?")]
+                finally:
+                    await pipeline.close_resources()
+                    await pipeline.client.close()
+    finally:
+        pipeline.mock_llm = True
+        pipeline.client = None
+        shutil.rmtree(directory)
+    answer = ''.join(pieces)
+    assert answer.startswith("Answer: This is a fake reply") and pieces == split_tokens(answer), f"Test 9 Failed: streamed {pieces}"
+    assert server.streamed_requests == 1, f"Test 9 Failed: {server.streamed_requests} streamed requests"
+    assert cached == [answer], f"Test 9 Failed: cached answer arrived as {cached}"
+    print("Test 9 Passed")
+
+async def run_tests():
+    await test_coalescing()
+    await test_retry_after()
+    await test_retries_exhausted()
+    await test_not_retryable()
+    await test_token_bucket_pacing()
+    await test_stream_order()
+    await test_stream_coalescing()
+    await test_stream_pacing()
+    await test_prompt_stream()
+    print("All dispatcher tests passed!")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,122 @@
+import asyncio
+import contextlib
+import io
+import driver_pool
+import temp_async_test_script as pipeline
+from driver_pool import DriverPool
+
+class StubDriver:
+    def __init__(self):
+        self.quit_calls = 0
+
+    def quit(self):
+        self.quit_calls += 1
+
+def make_factory(fail_first=0):
+    # Records every driver it makes; the first fail_first launches raise the way a missing chromedriver does
+    made = []
+    failures = [fail_first]
+    def factory(chrome_options_dict):
+        if failures[0]:
+            failures[0] -= 1
+            raise RuntimeError("Unable to obtain driver for chrome")
+        driver = StubDriver()
+        made.append(driver)
+        return driver
+    return factory, made
+
+def run_tests():
+    # Test 1: start() warms every driver, and a released driver is leased again instead of launching another
+    factory, made = make_factory()
+    pool = DriverPool(size=2, driver_factory=factory).start()
+    first = pool.acquire()
+    pool.release(first, pages_loaded=1)
+    again = pool.acquire()
+    assert len(made) == 2 and again is first, f"Test 1 Failed: {len(made)} launches, reused {again is first}"
+    pool.release(again)
+    assert pool.stats()['idle'] == 2 and pool.stats()['in_use'] == 0, f"Test 1 Failed: {pool.stats()}"
+    print("Test 1 Passed")
+
+    # Test 2: Drivers are recycled after max_pages loads and quit when a lease reports a crash
+    factory, made = make_factory()
+    pool = DriverPool(size=1, max_pages=2, driver_factory=factory)
+    driver = pool.acquire()
+    pool.release(driver, pages_loaded=2)
+    assert driver.quit_calls == 1 and pool.recycles == 1, f"Test 2 Failed: {pool.stats()}"
+    try:
+        with pool.lease() as (driver, usage):
+            raise ValueError("page crashed")
+    except ValueError:
+        pass
+    assert driver.quit_calls == 1 and pool.crashes == 1 and len(made) == 2, f"Test 2 Failed: {pool.stats()}"
+    print("Test 2 Passed")
+
+    # Test 3: A full pool makes callers wait, and gives up after the timeout
+    factory, made = make_factory()
+    pool = DriverPool(size=1, driver_factory=factory)
+    driver = pool.acquire()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            pool.acquire(timeout=0.05)
+        raise AssertionError("Test 3 Failed: expected TimeoutError")
+    except TimeoutError:
+        pass
+    assert pool.stats()['saturated_acquires'] == 1, f"Test 3 Failed: {pool.stats()}"
+    pool.release(driver)
+    print("Test 3 Passed")
+
+    # Test 4: Growing makes room at once; shrinking quits idle drivers now and the surplus leased ones on release
+    pool.resize(3)
+    drivers = [pool.acquire(timeout=0.05) for _ in range(3)]
+    assert len(made) == 3, f"Test 4 Failed: {len(made)} launches after growing to 3"
+    pool.release(drivers[0])
+    pool.resize(1)
+    assert drivers[0].quit_calls == 1 and pool.stats()['idle'] == 0, f"Test 4 Failed: idle driver kept after shrinking {pool.stats()}"
+    pool.release(drivers[1])
+    pool.release(drivers[2])
+    assert drivers[1].quit_calls == 1 and drivers[2].quit_calls == 0 and pool.stats()['idle'] == 1, f"Test 4 Failed: {pool.stats()}"
+    try:
+        pool.resize(0)
+        raise AssertionError("Test 4 Failed: expected ValueError")
+    except ValueError:
+        pass
+    print("Test 4 Passed")
+
+    # Test 5: A failed launch leaves the pool usable; the next acquire launches a driver on demand
+    factory, made = make_factory(fail_first=1)
+    pool = DriverPool(size=2, driver_factory=factory)
+    try:
+        pool.start()
+        raise AssertionError("Test 5 Failed: expected the launch error")
+    except RuntimeError:
+        pass
+    driver = pool.acquire(timeout=0.05)
+    assert len(made) == 1 and pool.stats()['in_use'] == 1, f"Test 5 Failed: {pool.stats()}"
+    pool.release(driver)
+    print("Test 5 Passed")
+
+    # Test 6: start_resources() survives a pool that can't launch any browser
+    factory, made = make_factory(fail_first=100)
+    real_factory = driver_pool.make_chrome_driver
+    driver_pool.make_chrome_driver = factory
+    pipeline.use_http_backend = False
+    pipeline.page_cache_dir = None
+    pipeline.feature_cache_path = None
+    async def start_and_close():
+        await pipeline.start_resources()
+        stats = pipeline.driver_pool.stats()
+        await pipeline.close_resources()
+        return stats
+    try:
+        with contextlib.redirect_stdout(io.StringIO()) as output:
+            stats = asyncio.run(start_and_close())
+    finally:
+        driver_pool.make_chrome_driver = real_factory
+        pipeline.use_http_backend = True
+    assert stats['launches'] == 0 and "launching drivers on demand" in output.getvalue(), f"Test 6 Failed: {stats}"
+    print("Test 6 Passed")
+
+    print("All driver pool tests passed!")
+
+if __name__ == "__main__":
+    run_tests()
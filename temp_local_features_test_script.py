@@ -0,0 +1,72 @@
+import asyncio
+import contextlib
+import io
+import temp_async_test_script as pipeline
+from local_features import LocalFeatureExtractor, TitleMatcher
+
+TITLES = ['Iron', 'Iron Golem', 'Golem', 'Diamond', 'Diamond Sword', 'Creeper']
+
+def make_matcher(titles):
+    matcher = TitleMatcher()
+    for title in titles:
+        matcher.add(title, title)
+    matcher.build()
+    return matcher
+
+def run_tests():
+    matcher = make_matcher(TITLES)
+
+    # Test 1: Every overlapping name is found, and the longest one wins
+    matches = sorted(matcher.find_all('iron golem'))
+    assert matches == [(0, 1, 'Iron'), (0, 2, 'Iron Golem'), (1, 2, 'Golem')], f"Test 1 Failed: {matches}"
+    assert matcher.longest('iron golem') == (0, 2, 'Iron Golem'), f"Test 1 Failed: {matcher.longest('iron golem')}"
+    print("Test 1 Passed")
+
+    # Test 2: A failed partial match falls back to the shorter names it contains ("golem iron golem")
+    matches = sorted(matcher.find_all('golem iron golem'))
+    assert matches == [(0, 1, 'Golem'), (1, 2, 'Iron'), (1, 3, 'Iron Golem'), (2, 3, 'Golem')], f"Test 2 Failed: {matches}"
+    assert matcher.find_all('irongolem') == [], "Test 2 Failed: matched inside a word"
+    print("Test 2 Passed")
+
+    # Test 3: Plurals match their page, on the last word of multi-word names
+    assert matcher.longest('diamonds') == (0, 1, 'Diamond'), f"Test 3 Failed: {matcher.longest('diamonds')}"
+    assert matcher.longest('iron golems') == (0, 2, 'Iron Golem'), f"Test 3 Failed: {matcher.longest('iron golems')}"
+    print("Test 3 Passed")
+
+    # Test 4: Redirects resolve to their page; confidence depends on how much of the subject is a known name
+    extractor = LocalFeatureExtractor.from_titles([(title, title) for title in TITLES] + [('Villager Golem', 'Iron Golem')])
+    features = extractor.extract("How do I find diamonds?")
+    assert features == ('Diamond', 'How to find', 1.0), f"Test 4 Failed: {features}"
+    features = extractor.extract("What is a villager golem?")
+    assert features == ('Iron Golem', 'What is villager golem', 1.0), f"Test 4 Failed: {features}"
+    features = extractor.extract("How do I craft a diamond sword with mending?")
+    assert features.subject == 'Diamond Sword' and features.confidence == 0.7, f"Test 4 Failed: {features}"
+    features = extractor.extract("What is the best enchantment for a bow?")
+    assert features == ('bow', 'best enchantment', 0.3), f"Test 4 Failed: {features}"
+    assert extractor.extract("Creepers are scary") is None, "Test 4 Failed: matched without a template"
+    print("Test 4 Passed")
+
+    # Test 5: Below the threshold the pipeline asks the LLM instead; above it the LLM isn't called at all
+    prompts = []
+    make_chatgpt_request = pipeline.make_chatgpt_request
+    async def recording_request(prompt_text):
+        prompts.append(prompt_text)
+        return await make_chatgpt_request(prompt_text)
+    pipeline.make_chatgpt_request = recording_request
+    pipeline.feature_extractor = extractor
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            local = asyncio.run(pipeline.extract_subject_and_summary("How do I find diamonds?"))
+            assert prompts == [], f"Test 5 Failed: confident match still called the LLM {prompts}"
+            fallback = asyncio.run(pipeline.extract_subject_and_summary("What is the best enchantment for a sword?"))
+    finally:
+        pipeline.make_chatgpt_request = make_chatgpt_request
+        pipeline.feature_extractor = None
+    assert local == ('Diamond', 'How to find'), f"Test 5 Failed: {local}"
+    assert len(prompts) == 1 and fallback == ('sword', 'best enchantments'), f"Test 5 Failed: {fallback} after {len(prompts)} LLM calls"
+    print("Test 5 Passed")
+
+    print("All local feature tests passed!")
+
+if __name__ == "__main__":
+    run_tests()
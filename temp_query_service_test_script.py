@@ -0,0 +1,145 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import temp_async_test_script as pipeline
+from query_service import QueryService
+
+async def request(service, method, path, payload=None):
+    # One request on its own connection; returns (status, headers, parsed JSON body)
+    reader, writer = await asyncio.open_connection(service.host, service.port)
+    body = json.dumps(payload).encode('utf-8') if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: test\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode('latin-1') + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, data = response.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.split(': ', 1) for line in lines[1:])
+    return int(lines[0].split(' ')[1]), headers, json.loads(data)
+
+async def fake_prompt(user_query, page_tasks=None):
+    # "slow ..." queries take 0.4s, "hold ..." ones wait for the test to release them, anything else 0.05s
+    if user_query.startswith('hold'):
+        await release_held.wait()
+    else:
+        await asyncio.sleep(0.4 if user_query.startswith('slow') else 0.05)
+    return f"Answer to {user_query}"
+
+release_held = None
+
+async def wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "condition not reached in time"
+        await asyncio.sleep(0.01)
+
+async def test_health():
+    # Test 1: /health reports 503 until start-up (warm-up included) has finished, then 200
+    warming = asyncio.Event()
+    warmed = asyncio.Event()
+    async def fake_warm_up():
+        warming.set()
+        await warmed.wait()
+    warm_up = pipeline.warm_up
+    pipeline.warm_up = fake_warm_up
+    service = QueryService(port=0, warmup=True)
+    try:
+        status, _ = await service.health(b'')
+        assert status == 503, f"Test 1 Failed: health before start-up was {status}"
+        starting = asyncio.ensure_future(service.start())
+        await warming.wait()
+        status, _, payload = await request(service, 'GET', '/health')
+        assert status == 503 and payload['status'] == 'unavailable', f"Test 1 Failed: health while warming up was {status} {payload}"
+        status, headers, _ = await request(service, 'POST', '/ask', {'query': 'What is dirt?'})
+        assert status == 503 and headers.get('Retry-After') == '1', f"Test 1 Failed: query while warming up got {status}"
+        warmed.set()
+        await starting
+        status, _, payload = await request(service, 'GET', '/health')
+        assert status == 200 and payload['status'] == 'ok', f"Test 1 Failed: health after start-up was {status} {payload}"
+    finally:
+        pipeline.warm_up = warm_up
+        await service.close()
+    print("Test 1 Passed")
+
+async def test_queue_full():
+    # Test 2: Past max_active running and max_waiting queued, queries are turned away at once with a 429
+    global release_held
+    release_held = asyncio.Event()
+    async with QueryService(port=0, max_active=1, max_waiting=1) as service:
+        held = [asyncio.ensure_future(request(service, 'POST', '/ask', {'query': f'hold {i}'})) for i in range(2)]
+        await wait_for(lambda: service.queue.pending == 2)
+        started = time.perf_counter()
+        status, headers, payload = await request(service, 'POST', '/ask', {'query': 'What is dirt?'})
+        assert status == 429 and headers.get('Retry-After') == '1', f"Test 2 Failed: full queue answered {status} {payload}"
+        assert time.perf_counter() - started < 0.2, "Test 2 Failed: rejection waited for a slot"
+        stats = service.queue.stats()
+        assert (stats['active'], stats['waiting'], stats['rejected']) == (1, 1, 1), f"Test 2 Failed: {stats}"
+        release_held.set()
+        results = await asyncio.gather(*held)
+        assert [status for status, _, _ in results] == [200, 200], f"Test 2 Failed: held queries got {results}"
+        assert service.queue.pending == 0, f"Test 2 Failed: {service.queue.stats()}"
+    print("Test 2 Passed")
+
+async def test_timeout_includes_queueing():
+    # Test 3: A 0.05s query with a 0.3s timeout still times out when it spends 0.4s queued behind a slow one
+    async with QueryService(port=0, max_active=1, max_waiting=4) as service:
+        slow = asyncio.ensure_future(request(service, 'POST', '/ask', {'query': 'slow question'}))
+        await wait_for(lambda: service.queue.active == 1)
+        started = time.perf_counter()
+        status, _, payload = await request(service, 'POST', '/ask', {'query': 'fast question', 'timeout': 0.3})
+        elapsed = time.perf_counter() - started
+        assert status == 504, f"Test 3 Failed: queued query got {status} {payload}"
+        assert 0.25 <= elapsed < 0.4, f"Test 3 Failed: gave up after {elapsed:.3f}s"
+        status, _, payload = await slow
+        assert status == 200 and payload['answer'] == "Answer to slow question", f"Test 3 Failed: {status} {payload}"
+        # Alone it answers well inside the same timeout
+        status, _, _ = await request(service, 'POST', '/ask', {'query': 'fast question', 'timeout': 0.3})
+        assert status == 200, f"Test 3 Failed: unqueued query got {status}"
+        # Asking for more than the service allows is capped rather than rejected
+        status, _, _ = await request(service, 'POST', '/ask', {'query': 'fast question', 'timeout': 10 ** 6})
+        assert status == 200, f"Test 3 Failed: long timeout got {status}"
+    print("Test 3 Passed")
+
+async def test_batch_limits():
+    # Test 4: /ask/batch checks its size, is admitted whole or not at all, and reports late queries one by one
+    async with QueryService(port=0, max_active=2, max_waiting=2, max_batch=5) as service:
+        status, _, _ = await request(service, 'POST', '/ask/batch', {'queries': [f'q{i}' for i in range(6)]})
+        assert status == 413, f"Test 4 Failed: oversized batch got {status}"
+        for bad in ({'queries': []}, {'queries': ['ok', '']}, {'queries': 'not a list'}):
+            status, _, _ = await request(service, 'POST', '/ask/batch', bad)
+            assert status == 400, f"Test 4 Failed: {bad} got {status}"
+        status, _, _ = await request(service, 'POST', '/ask/batch', {'queries': [f'q{i}' for i in range(5)]})
+        assert status == 429 and service.queue.admitted == 0, f"Test 4 Failed: batch bigger than the queue got {status}, {service.queue.stats()}"
+        status, _, payload = await request(service, 'POST', '/ask/batch', {'queries': ['first', 'slow second', 'third'], 'timeout': 0.3})
+        results = payload['results']
+        assert status == 200 and [result['index'] for result in results] == [0, 1, 2], f"Test 4 Failed: {status} {payload}"
+        assert results[0]['answer'] == "Answer to first" and results[2]['answer'] == "Answer to third", f"Test 4 Failed: {results}"
+        assert 'error' in results[1] and 'answer' not in results[1], f"Test 4 Failed: late query {results[1]}"
+        assert service.queue.pending == 0, f"Test 4 Failed: {service.queue.stats()}"
+    print("Test 4 Passed")
+
+async def run_all():
+    await test_health()
+    await test_queue_full()
+    await test_timeout_includes_queueing()
+    await test_batch_limits()
+
+def run_tests():
+    directory = tempfile.mkdtemp()
+    pipeline.page_cache_dir = os.path.join(directory, 'page_cache')
+    pipeline.feature_cache_path = os.path.join(directory, 'features.sqlite3')
+    prompt = pipeline.prompt
+    pipeline.prompt = fake_prompt
+    try:
+        asyncio.run(run_all())
+    finally:
+        pipeline.prompt = prompt
+        shutil.rmtree(directory)
+
+    print("All query service tests passed!")
+
+if __name__ == "__main__":
+    run_tests()
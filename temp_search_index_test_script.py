@@ -0,0 +1,46 @@
+from search_index import SearchIndex
+
+def make_index():
+    index = SearchIndex()
+    index.add_page("Diamond", None, [
+        "Diamonds are rare minerals found deep underground.",
+        "Diamond gear can be upgraded to netherite at a smithing table.",
+        "A block of diamond is crafted from nine diamonds.",
+    ])
+    index.add_page("Dirt", None, ["Dirt is a block found abundantly in most biomes.", "Grass spreads onto dirt blocks."])
+    index.add_page("Iron Golem", None, ["Iron golems protect villagers."], redirects=["Village golem"])
+    return index
+
+def resolved_title(index, subject):
+    match = index.resolve_subject(subject)
+    return match.title if match is not None else None
+
+def run_tests():
+    index = make_index()
+
+    # Test 1: Exact titles, plurals and redirects
+    for subject, expected in [("diamond", "Diamond"), ("Diamonds", "Diamond"), ("village golem", "Iron Golem")]:
+        result = resolved_title(index, subject)
+        assert result == expected, f"Test 1 Failed: {subject!r} resolved to {result!r}, expected {expected!r}"
+    print("Test 1 Passed")
+
+    # Test 2: Misspelled and partial titles still find the page
+    for subject, expected in [("diamnod", "Diamond"), ("iron golems", "Iron Golem"), ("golem", "Iron Golem")]:
+        result = resolved_title(index, subject)
+        assert result == expected, f"Test 2 Failed: {subject!r} resolved to {result!r}, expected {expected!r}"
+    print("Test 2 Passed")
+
+    # Test 3: Subjects the index doesn't have a page for are left to api.php, even when some page mentions them
+    for subject in ("netherite", "smithing table", "block of iron", "creeper"):
+        result = resolved_title(index, subject)
+        assert result is None, f"Test 3 Failed: {subject!r} resolved to {result!r}, expected None"
+    print("Test 3 Passed")
+
+    # Test 4: search() still ranks text matches for callers that want them
+    assert index.search("netherite")[0].title == "Diamond", "Test 4 Failed: text match missing from search results"
+    print("Test 4 Passed")
+
+    print("All search index tests passed!")
+
+if __name__ == "__main__":
+    run_tests()
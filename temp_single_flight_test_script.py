@@ -0,0 +1,70 @@
+import asyncio
+from single_flight import SingleFlight
+
+async def test_shared_call():
+    # Test 1: Concurrent callers with one key share a single call; other keys get their own
+    flights = SingleFlight()
+    calls = []
+    async def fetch(key):
+        calls.append(key)
+        await asyncio.sleep(0.05)
+        return f"page {key}"
+    results = await asyncio.gather(*(flights.do('diamond', lambda: fetch('diamond')) for _ in range(5)), flights.do('dirt', lambda: fetch('dirt')))
+    assert results == ['page diamond'] * 5 + ['page dirt'], f"Test 1 Failed: {results}"
+    assert calls == ['diamond', 'dirt'], f"Test 1 Failed: calls {calls}"
+    assert flights.stats() == {'in_flight': 0, 'started': 2, 'shared': 4}, f"Test 1 Failed: {flights.stats()}"
+    # Finished keys are forgotten, so the next caller starts a fresh call
+    await flights.do('diamond', lambda: fetch('diamond'))
+    assert calls == ['diamond', 'dirt', 'diamond'], f"Test 1 Failed: result kept after the call finished {calls}"
+    print("Test 1 Passed")
+
+async def test_exception():
+    # Test 2: Every caller of a failed call sees its exception, and the failure isn't remembered
+    flights = SingleFlight()
+    attempts = []
+    async def failing():
+        attempts.append(1)
+        await asyncio.sleep(0.05)
+        raise ValueError("wiki unavailable")
+    results = await asyncio.gather(*(flights.do('diamond', failing) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) and str(result) == "wiki unavailable" for result in results), f"Test 2 Failed: {results}"
+    assert len(attempts) == 1 and len(flights) == 0, f"Test 2 Failed: {len(attempts)} attempts, {len(flights)} in flight"
+    try:
+        await flights.do('diamond', failing)
+        raise AssertionError("Test 2 Failed: expected ValueError")
+    except ValueError:
+        pass
+    assert len(attempts) == 2, "Test 2 Failed: failure was cached"
+    print("Test 2 Passed")
+
+async def test_cancellation():
+    # Test 3: Cancelling one caller leaves the shared call running for the rest; cancelling them all stops it
+    flights = SingleFlight()
+    finished = []
+    async def fetch():
+        await asyncio.sleep(0.1)
+        finished.append(1)
+        return 'page'
+    first = asyncio.ensure_future(flights.do('diamond', fetch))
+    second = asyncio.ensure_future(flights.do('diamond', fetch))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == 'page' and finished == [1], f"Test 3 Failed: {finished}"
+    assert first.cancelled(), "Test 3 Failed: cancelled caller got a result"
+    callers = [asyncio.ensure_future(flights.do('dirt', fetch)) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    for caller in callers:
+        caller.cancel()
+    await asyncio.gather(*callers, return_exceptions=True)
+    await asyncio.sleep(0.15)
+    assert finished == [1] and len(flights) == 0, f"Test 3 Failed: abandoned call kept running {finished}"
+    print("Test 3 Passed")
+
+async def run_tests():
+    await test_shared_call()
+    await test_exception()
+    await test_cancellation()
+    print("All single-flight tests passed!")
+
+if __name__ == "__main__":
+    asyncio.run(run_tests())
@@ -0,0 +1,101 @@
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import temp_async_test_script as pipeline
+from fake_llm_server import FakeChatServer, default_reply
+from fake_wiki_server import FakeWikiServer, synthetic_pages
+from temp_sync_test_script import build_mirror
+
+SUBJECTS = {'What is dirt?': 'Dirt', 'What is the shiny blue gem?': 'Diamond'}
+
+def extraction_reply(prompt_text):
+    for query, subject in SUBJECTS.items():
+        if prompt_text.startswith("You are an AI designed to assist with extracting specific features") and query in prompt_text:
+            return f'Subject: "{subject}"\\nSummary: "What is it?"'
+    return default_reply(prompt_text)
+
+async def ask(user_query):
+    # prepare_answer() with its output kept for the asserts
+    with contextlib.redirect_stdout(io.StringIO()) as output:
+        request = await pipeline.prepare_answer(user_query)
+        # Let the cancellations of a discarded speculation land
+        await asyncio.sleep(0.01)
+    return request, output.getvalue()
+
+async def run_checks():
+    speculations = []
+    start_speculation = pipeline.start_speculation
+    def recording_start_speculation(user_query):
+        speculations.append(start_speculation(user_query))
+        return speculations[-1]
+    pipeline.start_speculation = recording_start_speculation
+    await pipeline.start_resources()
+    try:
+        # Test 1: A right guess is kept, so the real lookup and load reuse it and the page is fetched once
+        request, output = await ask('What is dirt?')
+        speculation = speculations[-1]
+        assert speculation is not None and speculation.guess == 'dirt', f"Test 1 Failed: speculation {speculation}"
+        assert "Keeping the speculative fetch of dirt" in output, "Test 1 Failed: guess not reused"
+        assert request.page.title == 'Dirt' and not speculation.load.cancelled(), f"Test 1 Failed: {request.page.title}"
+        assert pipeline.page_cache.stats()['network_fetches'] == 1, f"Test 1 Failed: {pipeline.page_cache.stats()}"
+        print("Test 1 Passed")
+
+        # Test 2: A wrong guess is cancelled once the real subject arrives (Diamond is in the offline index, the guess isn't)
+        request, output = await ask('What is the shiny blue gem?')
+        speculation = speculations[-1]
+        assert speculation is not None and speculation.guess == 'shiny blue gem', f"Test 2 Failed: speculation {speculation}"
+        assert "Keeping the speculative fetch" not in output, "Test 2 Failed: wrong guess kept"
+        assert speculation.lookup.cancelled() and speculation.load.cancelled(), "Test 2 Failed: wrong guess left running"
+        assert request.page.title == 'Diamond', f"Test 2 Failed: answered from {request.page.title}"
+        print("Test 2 Passed")
+
+        # Test 3: A cached extraction reply skips speculation, and the cache counts the query's one lookup only
+        before = pipeline.feature_cache.stats()['memory']
+        await ask('What is dirt?')
+        after = pipeline.feature_cache.stats()['memory']
+        assert speculations[-1] is None, f"Test 3 Failed: speculated {speculations[-1]}"
+        assert (after['hits'] - before['hits'], after['misses'] - before['misses']) == (1, 0), f"Test 3 Failed: {before} -> {after}"
+        print("Test 3 Passed")
+    finally:
+        pipeline.start_speculation = start_speculation
+        await pipeline.close_resources()
+
+def run_tests():
+    directory = tempfile.mkdtemp()
+    pipeline.page_cache_dir = os.path.join(directory, 'page_cache')
+    pipeline.feature_cache_path = os.path.join(directory, 'features.sqlite3')
+    pipeline.speculative_fetch = True
+    # Only the real subject of Test 2 is offline; the local extractor is kept out so every query goes to the LLM
+    pages = synthetic_pages(4, paragraphs=6)
+    pipeline.local_wiki_dir = build_mirror({'Diamond': pages['Diamond']}, directory)
+    pipeline.local_extraction_threshold = float('inf')
+    try:
+        # Wiki round trips are slower than the extraction call, so a wrong guess is still in flight when it is discarded
+        with FakeWikiServer(pages, latency=0.3) as wiki:
+            pipeline.wiki_base_url = wiki.base_url
+            pipeline.wiki_api_url = wiki.api_url
+            async def with_chat_server():
+                async with FakeChatServer(reply=extraction_reply, first_token_delay=0.05) as server:
+                    pipeline.llm_base_url = server.base_url
+                    pipeline.mock_llm = False
+                    pipeline.client = None
+                    try:
+                        await run_checks()
+                    finally:
+                        await pipeline.client.close()
+            asyncio.run(with_chat_server())
+    finally:
+        pipeline.speculative_fetch = False
+        pipeline.local_wiki_dir = None
+        pipeline.local_extraction_threshold = 0.8
+        pipeline.mock_llm = True
+        pipeline.client = None
+        shutil.rmtree(directory)
+
+    print("All speculation tests passed!")
+
+if __name__ == "__main__":
+    run_tests()
@@ -0,0 +1,116 @@
+import asyncio
+import contextlib
+import io
+import os
+import shutil
+import tempfile
+import time
+import temp_async_test_script as pipeline
+from fake_wiki_server import FakeWikiServer, synthetic_pages
+from fetch_backends import HttpFetchBackend
+from search_index import SearchIndex
+from wiki_index import LocalWikiBackend, build_index, iter_html_records
+from wiki_page import WikiPage
+from wiki_sync import load_sync_state, sync_once
+
+def build_mirror(pages, directory):
+    html_dir = os.path.join(directory, 'html')
+    index_dir = os.path.join(directory, 'index')
+    os.makedirs(html_dir)
+    for title, html in pages.items():
+        with open(os.path.join(html_dir, title.replace(' ', '_') + '.html'), 'w', encoding='utf-8') as f:
+            f.write(html)
+    build_index(iter_html_records(html_dir), index_dir)
+    local_wiki = LocalWikiBackend(index_dir)
+    SearchIndex.from_local_wiki(local_wiki).save(index_dir)
+    local_wiki.close()
+    # Changes made from now on are newer than the build, whatever the clock resolution
+    built = time.time() - 2
+    os.utime(os.path.join(index_dir, 'index.json'), (built, built))
+    return index_dir
+
+def lookup(index_dir, title):
+    local_wiki = LocalWikiBackend(index_dir)
+    try:
+        return local_wiki.lookup(title)
+    finally:
+        local_wiki.close()
+
+def run_tests():
+    directory = tempfile.mkdtemp()
+    pages = synthetic_pages(20, paragraphs=6)
+    index_dir = build_mirror(pages, directory)
+    backend = HttpFetchBackend()
+    try:
+        with FakeWikiServer(pages) as server:
+            # Test 1: Nothing changed, nothing fetched
+            summary = sync_once(index_dir, backend, server.api_url, server.base_url)
+            assert summary['changes'] == 0 and summary['fetched'] == 0, f"Test 1 Failed: {summary}"
+            print("Test 1 Passed")
+
+            # Test 2: Edits, a new page, a delete and a move are applied; a page edited twice is fetched once
+            server.edit_page('Diamond')
+            server.edit_page('Diamond')
+            server.edit_page('Copper Ore')
+            server.delete_page('Wolf')
+            server.move_page('Sugar Cane', 'Sugar Canes')
+            summary = sync_once(index_dir, backend, server.api_url, server.base_url)
+            assert summary == {'changes': 5, 'fetched': 3, 'written': 3, 'deleted': 1, 'moved': 1, 'pending': []}, f"Test 2 Failed: {summary}"
+            assert lookup(index_dir, 'Diamond').revision == server.revisions['Diamond'], "Test 2 Failed: edit not synced"
+            assert lookup(index_dir, 'Copper Ore') is not None, "Test 2 Failed: new page missing"
+            assert lookup(index_dir, 'Wolf') is None, "Test 2 Failed: deleted page still indexed"
+            assert lookup(index_dir, 'Sugar Cane').title == 'Sugar Canes', "Test 2 Failed: moved page not reachable from its old title"
+            print("Test 2 Passed")
+
+            # Test 3: The search index follows the same changes
+            search = SearchIndex.load(index_dir)
+            assert search.resolve_subject('copper ore').title == 'Copper Ore', "Test 3 Failed: new page not searchable"
+            assert search.resolve_subject('sugar cane').title == 'Sugar Canes', "Test 3 Failed: old title isn't an alias"
+            assert all(match.title != 'Wolf' for match in search.search('wolf', 20)), "Test 3 Failed: deleted page still searchable"
+            print("Test 3 Passed")
+
+            # Test 4: Changes already applied aren't applied again, even though rcstart repeats the last second
+            summary = sync_once(index_dir, backend, server.api_url, server.base_url)
+            assert summary['changes'] == 0 and summary['fetched'] == 0, f"Test 4 Failed: {summary}"
+            assert load_sync_state(index_dir)['last_rcid'] == 5, "Test 4 Failed: sync state not saved"
+            print("Test 4 Passed")
+
+            # Test 5: A pipeline serving the mirror picks up a sync without a restart
+            pipeline.local_wiki_dir = index_dir
+            pipeline.page_cache_dir = os.path.join(directory, 'page_cache')
+            pipeline.feature_cache_path = os.path.join(directory, 'features.sqlite3')
+            async def lookups():
+                await pipeline.start_resources()
+                try:
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        before = await pipeline.lookup_page('Dirt')
+                        server.edit_page('Dirt')
+                        sync_once(index_dir, backend, server.api_url, server.base_url)
+                        after = await pipeline.lookup_page('Dirt')
+                    return before, after
+                finally:
+                    await pipeline.close_resources()
+            before, after = asyncio.run(lookups())
+            assert isinstance(after, WikiPage) and after.revision == server.revisions['Dirt'] != before.revision, f"Test 5 Failed: served revision {after.revision}"
+            print("Test 5 Passed")
+
+            # Test 6: An edited redirect renders its target, which is stored once under the target's title
+            server.edit_page('Diamond Gem', html=server.pages['Diamond'])
+            summary = sync_once(index_dir, backend, server.api_url, server.base_url)
+            assert summary['fetched'] == 1 and summary['written'] == 1, f"Test 6 Failed: {summary}"
+            local_wiki = LocalWikiBackend(index_dir)
+            try:
+                assert 'diamond gem' not in local_wiki.pages and local_wiki.redirects.get('diamond gem') == 'Diamond', "Test 6 Failed: redirect stored as a page"
+                assert local_wiki.lookup('Diamond Gem').title == 'Diamond', "Test 6 Failed: redirect doesn't reach its target"
+            finally:
+                local_wiki.close()
+            assert SearchIndex.load(index_dir).resolve_subject('diamond gem').title == 'Diamond', "Test 6 Failed: redirect isn't a search alias"
+            print("Test 6 Passed")
+    finally:
+        backend.close()
+        shutil.rmtree(directory)
+
+    print("All sync tests passed!")
+
+if __name__ == "__main__":
+    run_tests()
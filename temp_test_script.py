@@ -1,4 +1,7 @@
 from bs4 import BeautifulSoup
+from fake_wiki_server import synthetic_pages
+from html_parsers import available_parser_backends, extract_page_from_html
+from wiki_extract import extract_page
 
 # The modified extract_main_paragraph function
 def extract_main_paragraph(soup):
@@ -124,6 +127,35 @@ def run_tests():
     assert result7 == expected7, f"Test 7 Failed: Expected {expected7}, got {result7}"
     print("Test 7 Passed")
 
+    # The single-pass extractor must agree with extract_main_paragraph on every case above
+    cases = [(soup1, result1), (soup2, result2), (soup3, result3), (soup4, result4), (soup5, result5), (soup6, result6), (soup7, result7)]
+    for i, (soup, result) in enumerate(cases, 1):
+        single_pass_result = extract_page(soup)[1]
+        assert single_pass_result == result, f"Single-pass Test {i} Failed: Expected {result}, got {single_pass_result}"
+    print("Single-pass extraction tests passed")
+
+    # Every installed parser backend, with and without content_only, must agree with html.parser on the cases above,
+    # on whole synthetic articles and on an infobox placed ahead of the content div
+    html_doc8 = """
+    <html><body>
+      <div class="notaninfobox"><div class="mcwiki-header infobox-title">Stone</div>
+        <table class="infobox-rows"><tr><th>Tool</th><td>Pickaxe</td></tr></table></div>
+      <div class="mw-body-content mw-content-ltr"><p>Stone is a block.</p></div>
+    </body></html>
+    """
+    docs = [html_doc1, html_doc2, html_doc3, html_doc4, html_doc5, html_doc6, html_doc7, html_doc8] + list(synthetic_pages(4, paragraphs=8).values())
+    for i, html in enumerate(docs, 1):
+        expected = extract_page(BeautifulSoup(html, 'html.parser'))
+        for backend in available_parser_backends():
+            for content_only in (False, True):
+                result = extract_page_from_html(html, backend, content_only)
+                assert result == expected, f"Parser Test {i} Failed ({backend}, content_only={content_only}): Expected {expected}, got {result}"
+    assert extract_page(BeautifulSoup(html_doc8, 'html.parser'))[0]['details'] == {'Tool': 'Pickaxe'}, "Parser Test 8 Failed: infobox not found"
+    # lxml repairs a <p> inside a <p> differently, which is why html.parser stays the default
+    nested = '<html><body><div class="mw-body-content mw-content-ltr"><p>Para<p>nested</p></p></div></body></html>'
+    assert extract_page_from_html(nested) == extract_page(BeautifulSoup(nested, 'html.parser')), "Parser Test 9 Failed: default backend changed"
+    print(f"Parser backend tests passed ({', '.join(available_parser_backends())})")
+
     print("All tests passed!")
 
 if __name__ == "__main__":
@@ -0,0 +1,49 @@
+import struct
+from wiki_page import WikiPage
+
+def fields(page):
+    return (page.title, page.url, page.revision, page.name, page.image_url, page.info_keys, page.info_values,
+            page.paragraphs(), [page.is_heading(i) for i in range(len(page))])
+
+def run_tests():
+    info = {'name': 'Diamond', 'image_url': 'https://minecraft.wiki/images/Diamond.png', 'details': {'Renewable': 'No', 'Stackable': 'Yes (64)'}}
+    paragraphs = ['Diamonds are rare.', 'Obtaining', 'Mine diamond ore with an iron pickaxe – or better. ✓']
+
+    # Test 1: A full record survives the round trip, non-ASCII text included
+    page = WikiPage.from_extracted('Diamond', 'https://minecraft.wiki/w/Diamond', 123456, info, paragraphs, [False, True, False])
+    restored = WikiPage.from_bytes(page.to_bytes())
+    assert fields(restored) == fields(page), f"Test 1 Failed: {fields(restored)}"
+    print("Test 1 Passed")
+
+    # Test 2: None title, url and revision stay None rather than becoming '' or -1; no infobox stays empty
+    page = WikiPage.from_extracted(None, None, None, {}, ['Only paragraph.'])
+    restored = WikiPage.from_bytes(page.to_bytes())
+    assert (restored.title, restored.url, restored.revision, restored.name) == (None, None, None, None), f"Test 2 Failed: {restored!r}"
+    assert restored.info_dict() == {} and restored.paragraphs() == ['Only paragraph.'], f"Test 2 Failed: {fields(restored)}"
+    print("Test 2 Passed")
+
+    # Test 3: Empty strings are kept apart from None, and an empty page round-trips
+    page = WikiPage.from_extracted('', '', 0, {'name': ''}, [])
+    restored = WikiPage.from_bytes(page.to_bytes())
+    assert fields(restored) == fields(page) and restored.revision == 0, f"Test 3 Failed: {fields(restored)}"
+    print("Test 3 Passed")
+
+    # Test 4: The layout is fixed little-endian: the first string length follows the header and presence bytes
+    data = WikiPage.from_extracted('Dirt', None, 7, {}, ['x']).to_bytes()
+    header_size = struct.calcsize('<3sqIII')
+    assert struct.unpack_from('<q', data, 3)[0] == 7, "Test 4 Failed: revision not little-endian"
+    assert struct.unpack_from('<I', data, header_size + 4)[0] == len('Dirt'), "Test 4 Failed: string length not little-endian"
+    print("Test 4 Passed")
+
+    # Test 5: Anything else is rejected
+    try:
+        WikiPage.from_bytes(b'XXX' + bytes(40))
+        raise AssertionError("Test 5 Failed: bad magic accepted")
+    except ValueError:
+        pass
+    print("Test 5 Passed")
+
+    print("All WikiPage tests passed!")
+
+if __name__ == "__main__":
+    run_tests()
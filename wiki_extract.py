@@ -0,0 +1,117 @@
+from wiki_page import WikiPage
+
+def extract_info_box(soup):
+  info_box = soup.find("div", {"class": "notaninfobox"})
+  if not info_box: return {}
+  return _info_box_fields(info_box)
+
+def extract_main_paragraph(soup):
+  main_paragraph_container = soup.find("div", {"class": "mw-body-content mw-content-ltr"})
+  if not main_paragraph_container: return []
+  main_paragraph_elements = main_paragraph_container.find_all(["p", "h2", "h3"])
+  tables = soup.find_all("table")
+  paragraphs_in_tables = []
+  for table in tables:
+    paragraphs_in_tables.extend(table.find_all("p"))
+  paragraphs_in_tables_set = set(paragraphs_in_tables)
+  filtered = [el for el in main_paragraph_elements if el.name in ['h2', 'h3'] or (el.name == 'p' and el not in paragraphs_in_tables_set)]
+  main_paragraph = [el.text.strip() for el in filtered]
+  return main_paragraph
+
+def _has_class(tag, value):
+  # Same rule as soup.find(..., {"class": value}): any single class matches, or the whole class list joined by spaces
+  classes = tag.get("class")
+  if classes is None:
+    return False
+  if isinstance(classes, str):
+    return classes == value
+  return value in classes or (len(classes) != 1 and " ".join(classes) == value)
+
+def _info_box_fields(info_box):
+  info = {}
+  name_tag = info_box.find("div", {"class": "mcwiki-header infobox-title"})
+  if name_tag: info["name"] = name_tag.text.strip()
+  image_tag_container = info_box.find("div", {"class": "infobox-imagearea animated-container"})
+  if image_tag_container:
+    image_tag = image_tag_container.find("img")
+    if image_tag and image_tag.has_attr('src'): info["image_url"] = "https://minecraft.wiki" + image_tag["src"]
+  info["details"] = {}
+  table = info_box.find("table", {"class": "infobox-rows"})
+  if table:
+    for row in table.find_all("tr"):
+      key = row.find("th")
+      if key is None: continue
+      value = row.find("td")
+      if value is None: continue
+      info["details"][key.text.strip()] = value.text.strip()
+  return info
+
+def extract_page_sections(soup):
+  '''
+  input: soup - (BeautifulSoup) a rendered wiki article
+  output: (info, paragraphs, heading_flags) - info and paragraphs identical to (extract_info_box(soup), extract_main_paragraph(soup)),
+          heading_flags marks the paragraphs that came from <h2>/<h3>
+
+  Walks the document once, tracking table nesting on the way down instead of collecting every <p> inside
+  every <table> up front. Only the (small) infobox subtree is searched again for its fields.
+  '''
+  # Whoever built the soup has already imported bs4
+  from bs4 import Tag
+  info_box = None
+  container = None
+  elements = [] # (tag, inside a table) for every p/h2/h3 in the content div
+  table_paragraphs = [] # every <p> inside a table anywhere in the document
+  stack = [(soup, 0, False)]
+  while stack:
+    node, table_depth, in_container = stack.pop()
+    name = node.name
+    if name == "p" and table_depth:
+      table_paragraphs.append(node)
+    if in_container and name in ("p", "h2", "h3"):
+      elements.append((node, table_depth > 0))
+    if name == "div":
+      if info_box is None and _has_class(node, "notaninfobox"):
+        info_box = node
+      if container is None and _has_class(node, "mw-body-content mw-content-ltr"):
+        container = node
+        in_container = True
+    if name == "table":
+      table_depth += 1
+    stack.extend((child, table_depth, in_container) for child in reversed(node.contents) if isinstance(child, Tag))
+
+  info = _info_box_fields(info_box) if info_box is not None else {}
+
+  # extract_main_paragraph compares Tags by value (bs4 hashes str(tag)), so a <p> outside any table is still
+  # dropped when an identical <p> sits inside one; compare markup only when the text already collides
+  table_texts = {tag.text for tag in table_paragraphs}
+  table_markup = None
+  paragraphs = []
+  heading_flags = []
+  for tag, in_table in elements:
+    if tag.name == "p":
+      if in_table:
+        continue
+      text = tag.text
+      if text in table_texts:
+        if table_markup is None:
+          table_markup = {str(p) for p in table_paragraphs}
+        if str(tag) in table_markup:
+          continue
+      paragraphs.append(text.strip())
+      heading_flags.append(False)
+    else:
+      paragraphs.append(tag.text.strip())
+      heading_flags.append(True)
+  return info, paragraphs, heading_flags
+
+def extract_page(soup):
+  '''
+  input: soup - (BeautifulSoup) a rendered wiki article
+  output: (info, paragraphs) - identical to (extract_info_box(soup), extract_main_paragraph(soup))
+  '''
+  info, paragraphs, _ = extract_page_sections(soup)
+  return info, paragraphs
+
+def extract_wiki_page(soup, title=None, url=None, revision=None):
+  info, paragraphs, heading_flags = extract_page_sections(soup)
+  return WikiPage.from_extracted(title, url, revision, info, paragraphs, heading_flags)
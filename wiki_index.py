@@ -0,0 +1,297 @@
+import argparse
+import html
+import json
+import mmap
+import os
+import re
+import xml.etree.ElementTree as ET
+from urllib.parse import unquote, urlsplit
+from answer_cache import page_identity
+from html_parsers import parse_soup
+from wiki_extract import extract_wiki_page
+from wiki_page import WikiPage
+
+WIKI_BASE_URL = 'https://minecraft.wiki'
+INDEX_FILE = 'index.json'
+TEXT_FILE = 'text.bin'
+INDEX_VERSION = 2
+
+def normalize_title(title):
+  return re.sub(r'\s+', ' ', title.replace('_', ' ')).strip().lower()
+
+def title_to_url(title, base_url=WIKI_BASE_URL):
+  return f"{base_url}/w/{title.replace(' ', '_')}"
+
+def url_to_title(url):
+  # The inverse of title_to_url, whatever the host; None for urls that aren't article pages
+  path = urlsplit(url).path
+  if not path.startswith('/w/'):
+    return None
+  return unquote(path[len('/w/'):]).replace('_', ' ') or None
+
+def _strip_templates(text):
+  # Templates and tables nest, so strip them by depth rather than with one regex
+  out = []
+  depth = 0
+  i = 0
+  while i < len(text):
+    pair = text[i:i + 2]
+    if pair in ('{{', '{|'):
+      depth += 1
+      i += 2
+    elif depth and pair in ('}}', '|}'):
+      depth -= 1
+      i += 2
+    else:
+      if not depth:
+        out.append(text[i])
+      i += 1
+  return ''.join(out)
+
+def wikitext_to_html(wikitext):
+  '''
+  Crude wikitext -> HTML so dump pages can go through the same extractors as rendered pages.
+  Templates (including infoboxes) and tables aren't rendered, so dump records only carry headings and prose.
+  '''
+  text = re.sub(r'<!--.*?-->', '', wikitext, flags=re.DOTALL)
+  text = re.sub(r'<ref[^>]*/>|<ref[^>]*>.*?</ref>', '', text, flags=re.DOTALL)
+  text = _strip_templates(text)
+  text = re.sub(r'\[\[(?:File|Image|Category):[^\]]*\]\]', '', text)
+  text = re.sub(r'\[\[(?:[^\]|]*\|)?([^\]]*)\]\]', r'\1', text)
+  text = re.sub(r'\[https?://\S+ ([^\]]*)\]', r'\1', text)
+  text = re.sub(r"'{2,}", '', text)
+  blocks = []
+  paragraph = []
+  def flush():
+    if paragraph:
+      blocks.append(f"<p>{html.escape(' '.join(paragraph))}</p>")
+      paragraph.clear()
+  for line in text.splitlines():
+    line = line.strip()
+    heading = re.match(r'^(={2,3})\s*(.*?)\s*\1$', line)
+    if heading:
+      flush()
+      level = len(heading.group(1))
+      blocks.append(f"<h{level}>{html.escape(heading.group(2))}</h{level}>")
+    elif not line or line.startswith(('=', '*', '#', ':', ';', '__')):
+      flush()
+    else:
+      paragraph.append(line)
+  flush()
+  return f'<html><body><div class="mw-body-content mw-content-ltr">{"".join(blocks)}</div></body></html>'
+
+def make_record(title, url, revision, soup):
+  return extract_wiki_page(soup, title, url, revision)
+
+def iter_dump_records(dump_path):
+  '''
+  input: dump_path - (string) a MediaWiki XML export (pages-articles style)
+  output: yields ('page', record) for main-namespace articles and ('redirect', (from_title, to_title)) for redirects
+  '''
+  title = namespace = redirect = revision = text = None
+  for event, element in ET.iterparse(dump_path, events=('end',)):
+    tag = element.tag.rsplit('}', 1)[-1]
+    if tag == 'title':
+      title = element.text
+    elif tag == 'ns':
+      namespace = element.text
+    elif tag == 'redirect':
+      redirect = element.get('title')
+    elif tag == 'revision':
+      revision_id = element.find('{*}id')
+      revision = int(revision_id.text) if revision_id is not None else None
+    elif tag == 'text':
+      text = element.text or ''
+    elif tag == 'page':
+      if namespace in (None, '0') and title:
+        if redirect:
+          yield 'redirect', (title, redirect)
+        else:
+          soup = parse_soup(wikitext_to_html(text or ''))
+          yield 'page', make_record(title, title_to_url(title), revision, soup)
+      title = namespace = redirect = revision = text = None
+      element.clear()
+
+def iter_html_records(directory):
+  '''
+  input: directory - (string) saved rendered article pages, one *.html file per page
+  output: same shape as iter_dump_records; a page whose canonical link names another title is indexed as a redirect too
+  '''
+  for name in sorted(os.listdir(directory)):
+    if not name.endswith(('.html', '.htm')):
+      continue
+    with open(os.path.join(directory, name), 'r', encoding='utf-8') as f:
+      soup = parse_soup(f.read())
+    file_title = os.path.splitext(name)[0].replace('_', ' ')
+    canonical_url, revision = page_identity(soup)
+    heading = soup.find(id="firstHeading")
+    title = heading.text.strip() if heading else file_title
+    url = canonical_url or title_to_url(title)
+    yield 'page', make_record(title, url, revision, soup)
+    if normalize_title(file_title) != normalize_title(title):
+      yield 'redirect', (file_title, title)
+
+def build_index(records, out_dir):
+  '''
+  Writes out_dir/text.bin (serialized WikiPage records back to back) and out_dir/index.json (title -> [offset, length], redirects).
+  '''
+  os.makedirs(out_dir, exist_ok=True)
+  pages = {}
+  redirects = {}
+  offset = 0
+  with open(os.path.join(out_dir, TEXT_FILE), 'wb') as text_file:
+    for kind, value in records:
+      if kind == 'redirect':
+        redirects[normalize_title(value[0])] = value[1]
+        continue
+      blob = value.to_bytes()
+      text_file.write(blob)
+      pages[normalize_title(value.title)] = [offset, len(blob)]
+      offset += len(blob)
+  _write_index(out_dir, {'version': INDEX_VERSION, 'pages': pages, 'redirects': redirects})
+  return len(pages), len(redirects)
+
+def _read_index(index_dir):
+  with open(os.path.join(index_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+    index = json.load(f)
+  if index.get('version') != INDEX_VERSION:
+    raise ValueError(f"Unsupported wiki index version: {index.get('version')}")
+  return index
+
+def _write_index(index_dir, index):
+  # Swapped in whole, so a reader never sees a half-written index.json
+  temp_path = os.path.join(index_dir, f'{INDEX_FILE}.{os.getpid()}.tmp')
+  with open(temp_path, 'w', encoding='utf-8') as f:
+    json.dump(index, f, ensure_ascii=False)
+  os.replace(temp_path, os.path.join(index_dir, INDEX_FILE))
+
+def update_index(index_dir, records=(), deleted=(), redirects=()):
+  '''
+  input: records - WikiPage records to add or replace, keyed by their title
+         deleted - titles to drop
+         redirects - (source title, target title) pairs to add; a page at the source title is dropped (it was moved)
+  output: (pages written, pages deleted)
+
+  Updates an index written by build_index without rebuilding it: new blobs are appended to text.bin and index.json is
+  replaced atomically, so a LocalWikiBackend that already has the files open keeps reading its (older) consistent view.
+  Replaced blobs stay in text.bin as dead bytes until compact_index() rewrites it.
+  '''
+  index = _read_index(index_dir)
+  pages = index['pages']
+  redirect_map = index['redirects']
+  dead_bytes = index.get('dead_bytes', 0)
+  written = 0
+  with open(os.path.join(index_dir, TEXT_FILE), 'ab') as text_file:
+    offset = text_file.tell()
+    for record in records:
+      blob = record.to_bytes()
+      text_file.write(blob)
+      key = normalize_title(record.title)
+      if key in pages:
+        dead_bytes += pages[key][1]
+      pages[key] = [offset, len(blob)]
+      # A title that has a page again is no longer a redirect
+      redirect_map.pop(key, None)
+      offset += len(blob)
+      written += 1
+    text_file.flush()
+    os.fsync(text_file.fileno())
+  removed = 0
+  for title in deleted:
+    key = normalize_title(title)
+    entry = pages.pop(key, None)
+    if entry is not None:
+      dead_bytes += entry[1]
+      removed += 1
+    redirect_map.pop(key, None)
+  for source, target in redirects:
+    key = normalize_title(source)
+    entry = pages.pop(key, None)
+    if entry is not None:
+      dead_bytes += entry[1]
+    redirect_map[key] = target
+  index['dead_bytes'] = dead_bytes
+  _write_index(index_dir, index)
+  return written, removed
+
+def compact_index(index_dir):
+  '''
+  Rewrites text.bin with only the live records, dropping the dead bytes left by update_index.
+  Readers that open the index while the two files are being swapped can see mismatched offsets, so run it when
+  nothing is serving from the directory (wiki_sync.py --compact).
+  output: bytes reclaimed
+  '''
+  index = _read_index(index_dir)
+  text_path = os.path.join(index_dir, TEXT_FILE)
+  temp_path = f'{text_path}.{os.getpid()}.tmp'
+  pages = {}
+  offset = 0
+  with open(text_path, 'rb') as source, open(temp_path, 'wb') as target:
+    for key, (old_offset, length) in index['pages'].items():
+      source.seek(old_offset)
+      target.write(source.read(length))
+      pages[key] = [offset, length]
+      offset += length
+  reclaimed = os.path.getsize(text_path) - offset
+  os.replace(temp_path, text_path)
+  index['pages'] = pages
+  index['dead_bytes'] = 0
+  _write_index(index_dir, index)
+  return reclaimed
+
+class LocalWikiBackend:
+  '''
+  Serves WikiPage records from an index written by build_index, with the text blob memory-mapped.
+  '''
+  def __init__(self, index_dir):
+    index = _read_index(index_dir)
+    self.pages = index['pages']
+    self.redirects = index['redirects']
+    self._text_file = open(os.path.join(index_dir, TEXT_FILE), 'rb')
+    size = os.fstat(self._text_file.fileno()).st_size
+    self._text = mmap.mmap(self._text_file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+  def resolve_title(self, title):
+    key = normalize_title(title)
+    # Plural subjects like "diamonds" fall back to the singular title
+    for candidate in (key, key[:-1] if key.endswith('s') else key):
+      seen = set()
+      while candidate in self.redirects and candidate not in seen:
+        seen.add(candidate)
+        candidate = normalize_title(self.redirects[candidate])
+      if candidate in self.pages:
+        return candidate
+    return None
+
+  def lookup(self, title):
+    key = self.resolve_title(title)
+    if key is None:
+      return None
+    offset, length = self.pages[key]
+    return WikiPage.from_bytes(self._text[offset:offset + length])
+
+  def records(self):
+    for key, (offset, length) in self.pages.items():
+      yield key, WikiPage.from_bytes(self._text[offset:offset + length])
+
+  def __len__(self):
+    return len(self.pages)
+
+  def close(self):
+    if isinstance(self._text, mmap.mmap):
+      self._text.close()
+    self._text_file.close()
+
+def main():
+  parser = argparse.ArgumentParser(description="Build an offline index of minecraft.wiki pages for LocalWikiBackend.")
+  source = parser.add_mutually_exclusive_group(required=True)
+  source.add_argument('--dump', help="MediaWiki XML dump to ingest")
+  source.add_argument('--html-dir', help="directory of saved rendered article pages (*.html)")
+  parser.add_argument('--out', default='wiki_index', help="output directory for the index")
+  args = parser.parse_args()
+  records = iter_dump_records(args.dump) if args.dump else iter_html_records(args.html_dir)
+  page_count, redirect_count = build_index(records, args.out)
+  print(f"Indexed {page_count} pages and {redirect_count} redirects into {args.out}")
+
+if __name__ == '__main__':
+  main()
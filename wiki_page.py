@@ -0,0 +1,142 @@
+import struct
+from array import array
+
+_MAGIC = b'WP1'
+_HEADER = struct.Struct('<3sqIII') # magic, revision (-1 = unknown), info rows, paragraphs, text bytes
+
+# Lengths and offsets are little-endian uint32 like the header, so text.bin reads the same on any machine
+def _pack_uints(values):
+  return struct.pack(f'<{len(values)}I', *values)
+
+def _unpack_uints(data, offset, count):
+  return struct.unpack_from(f'<{count}I', data, offset), offset + 4 * count
+
+def _pack_strings(strings):
+  encoded = [s.encode('utf-8') for s in strings]
+  return _pack_uints([len(e) for e in encoded]) + b''.join(encoded)
+
+def _unpack_strings(data, offset, count):
+  lengths, offset = _unpack_uints(data, offset, count)
+  strings = []
+  for length in lengths:
+    strings.append(data[offset:offset + length].decode('utf-8'))
+    offset += length
+  return strings, offset
+
+class WikiPage:
+  '''
+  Compact record of one extracted wiki article.
+  Paragraph texts live in one string buffer sliced by an offsets array, infobox rows in parallel key/value lists,
+  and heading_flags marks which paragraphs came from <h2>/<h3>.
+  '''
+  __slots__ = ('title', 'url', 'revision', 'name', 'image_url', 'info_keys', 'info_values', 'text', 'offsets', 'heading_flags')
+
+  def __init__(self, title, url, revision, name, image_url, info_keys, info_values, text, offsets, heading_flags):
+    self.title = title
+    self.url = url
+    self.revision = revision
+    self.name = name
+    self.image_url = image_url
+    self.info_keys = info_keys
+    self.info_values = info_values
+    self.text = text
+    self.offsets = offsets
+    self.heading_flags = heading_flags
+
+  @classmethod
+  def from_extracted(cls, title, url, revision, info, paragraphs, heading_flags=None):
+    '''
+    input: info, paragraphs - as returned by extract_info_box/extract_main_paragraph (or extract_page)
+           heading_flags - (sequence of bools) optional, which paragraphs are headings
+    '''
+    offsets = array('I', [0])
+    position = 0
+    for paragraph in paragraphs:
+      position += len(paragraph)
+      offsets.append(position)
+    details = info.get('details', {})
+    if heading_flags is None:
+      heading_flags = [False] * len(paragraphs)
+    return cls(
+      title, url, revision,
+      info.get('name'), info.get('image_url'),
+      list(details.keys()), list(details.values()),
+      ''.join(paragraphs), offsets, bytes(bytearray(heading_flags)),
+    )
+
+  def __len__(self):
+    return len(self.offsets) - 1
+
+  def paragraph(self, i):
+    return self.text[self.offsets[i]:self.offsets[i + 1]]
+
+  def paragraphs(self):
+    return [self.paragraph(i) for i in range(len(self))]
+
+  def is_heading(self, i):
+    return bool(self.heading_flags[i])
+
+  def join_paragraphs(self, indices=None, separator='\n'):
+    if indices is None:
+      indices = range(len(self))
+    return separator.join(self.paragraph(i) for i in indices)
+
+  def has_info_box(self):
+    return self.name is not None or self.image_url is not None or bool(self.info_keys)
+
+  def info_dict(self):
+    # The nested dict extract_info_box returns; an article without an infobox gives {}
+    if not self.has_info_box():
+      return {}
+    info = {}
+    if self.name is not None:
+      info['name'] = self.name
+    if self.image_url is not None:
+      info['image_url'] = self.image_url
+    info['details'] = dict(zip(self.info_keys, self.info_values))
+    return info
+
+  def with_identity(self, title=None, url=None):
+    return WikiPage(
+      title or self.title, url or self.url, self.revision, self.name, self.image_url,
+      self.info_keys, self.info_values, self.text, self.offsets, self.heading_flags,
+    )
+
+  def to_bytes(self):
+    # Optional strings are stored with a presence byte so None survives the round trip
+    optional = [self.title, self.url, self.name, self.image_url]
+    present = bytes(value is not None for value in optional)
+    text = self.text.encode('utf-8')
+    return b''.join([
+      _HEADER.pack(_MAGIC, -1 if self.revision is None else self.revision, len(self.info_keys), len(self), len(text)),
+      present,
+      _pack_strings([value or '' for value in optional]),
+      _pack_strings(self.info_keys),
+      _pack_strings(self.info_values),
+      _pack_uints(self.offsets),
+      self.heading_flags,
+      text,
+    ])
+
+  @classmethod
+  def from_bytes(cls, data):
+    data = bytes(data)
+    magic, revision, info_count, paragraph_count, text_length = _HEADER.unpack_from(data, 0)
+    if magic != _MAGIC:
+      raise ValueError("Not a serialized WikiPage")
+    offset = _HEADER.size
+    present = data[offset:offset + 4]
+    offset += 4
+    optional, offset = _unpack_strings(data, offset, 4)
+    title, url, name, image_url = [value if flag else None for value, flag in zip(optional, present)]
+    info_keys, offset = _unpack_strings(data, offset, info_count)
+    info_values, offset = _unpack_strings(data, offset, info_count)
+    offsets, offset = _unpack_uints(data, offset, paragraph_count + 1)
+    offsets = array('I', offsets)
+    heading_flags = data[offset:offset + paragraph_count]
+    offset += paragraph_count
+    text = data[offset:offset + text_length].decode('utf-8')
+    return cls(title, url, None if revision < 0 else revision, name, image_url, info_keys, info_values, text, offsets, heading_flags)
+
+  def __repr__(self):
+    return f"WikiPage(title={self.title!r}, url={self.url!r}, revision={self.revision!r}, paragraphs={len(self)}, info_rows={len(self.info_keys)})"
@@ -0,0 +1,252 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+from answer_cache import page_identity
+from fetch_backends import HttpFetchBackend
+from html_parsers import parse_soup
+from search_index import SEARCH_INDEX_FILE, SearchIndex
+from wiki_index import INDEX_FILE, LocalWikiBackend, WIKI_BASE_URL, compact_index, make_record, normalize_title, title_to_url, update_index, url_to_title
+
+WIKI_API_URL = 'https://minecraft.wiki/api.php'
+SYNC_STATE_FILE = 'sync.json'
+TIMESTAMP_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+def make_recent_changes_url(api_url, since, rccontinue=None):
+  params = {
+    'action': 'query',
+    'list': 'recentchanges',
+    'rcdir': 'newer',
+    'rcstart': since,
+    'rcnamespace': 0,
+    'rcprop': 'title|ids|timestamp|loginfo',
+    'rctype': 'edit|new|log',
+    'rclimit': 500,
+    'format': 'json',
+    'formatversion': 2,
+  }
+  if rccontinue:
+    params['rccontinue'] = rccontinue
+  return f'{api_url}?{urlencode(params)}'
+
+def fetch_recent_changes(backend, api_url, since):
+  '''
+  input: backend - (HttpFetchBackend)
+         since - (string) MediaWiki timestamp; changes at or after it are returned
+  output: list of recentchanges entries, oldest first
+  '''
+  changes = []
+  rccontinue = None
+  while True:
+    result = backend.fetch(make_recent_changes_url(api_url, since, rccontinue))
+    if result.status != 200:
+      raise RuntimeError(f"RecentChanges query failed with HTTP {result.status}")
+    data = json.loads(result.html)
+    changes.extend(data.get('query', {}).get('recentchanges', []))
+    rccontinue = data.get('continue', {}).get('rccontinue')
+    if not rccontinue:
+      return changes
+
+def summarize_changes(changes):
+  '''
+  input: changes - recentchanges entries, oldest first
+  output: (changed, deleted, moves) - changed maps title -> latest revision id (None if unknown), deleted is a set of
+          titles, moves maps old title -> new title; a later change to a title overrides an earlier one
+  '''
+  changed = {}
+  deleted = set()
+  moves = {}
+  def touch(title, revision):
+    deleted.discard(title)
+    moves.pop(title, None)
+    changed[title] = revision
+  for change in changes:
+    if change.get('ns', 0) != 0:
+      continue
+    title = change['title']
+    if change['type'] in ('edit', 'new'):
+      touch(title, change.get('revid'))
+    elif change['type'] == 'log' and change.get('logtype') == 'delete' and change.get('logaction') == 'delete':
+      changed.pop(title, None)
+      moves.pop(title, None)
+      deleted.add(title)
+    elif change['type'] == 'log' and change.get('logtype') == 'move':
+      target = change.get('logparams', {}).get('target_title')
+      if not target:
+        continue
+      revision = changed.pop(title, None)
+      deleted.discard(title)
+      touch(target, revision)
+      moves[title] = target
+  return changed, deleted, moves
+
+def fetch_page(backend, title, base_url=WIKI_BASE_URL):
+  '''
+  output: (record, status) - record is a WikiPage, or None when the page is gone (404) or the fetch failed
+  A redirect renders its target's article, so the record is titled after the canonical url rather than the title asked for.
+  '''
+  result = backend.fetch(title_to_url(title, base_url))
+  if result.status != 200:
+    return None, result.status
+  soup = parse_soup(result.html)
+  canonical_url, revision = page_identity(soup)
+  canonical_title = url_to_title(canonical_url) if canonical_url else None
+  return make_record(canonical_title or title, canonical_url or title_to_url(title), revision, soup), result.status
+
+def fetch_pages(backend, titles, base_url=WIKI_BASE_URL, workers=4):
+  '''
+  output: (records, redirects, missing, failed) - fetched WikiPage records, (title, target title) pairs for titles that
+          turned out to be redirects, titles that answered 404, titles to retry next time
+  '''
+  records, redirects, missing, failed = {}, [], [], []
+  def fetch(title):
+    try:
+      return title, *fetch_page(backend, title, base_url)
+    except Exception as e:
+      print(f"Failed to fetch {title}: {e}")
+      return title, None, None
+  with ThreadPoolExecutor(max_workers=workers) as executor:
+    for title, record, status in executor.map(fetch, titles):
+      if record is not None:
+        # A redirect and its target both edited come back as the same page
+        records[normalize_title(record.title)] = record
+        if normalize_title(record.title) != normalize_title(title):
+          redirects.append((title, record.title))
+      elif status == 404:
+        missing.append(title)
+      else:
+        failed.append(title)
+  return list(records.values()), redirects, missing, failed
+
+def load_sync_state(index_dir):
+  path = os.path.join(index_dir, SYNC_STATE_FILE)
+  if os.path.exists(path):
+    with open(path, 'r', encoding='utf-8') as f:
+      return json.load(f)
+  # A fresh index is as new as its build
+  built = os.path.getmtime(os.path.join(index_dir, INDEX_FILE))
+  return {'since': time.strftime(TIMESTAMP_FORMAT, time.gmtime(built)), 'last_rcid': 0, 'pending': []}
+
+def save_sync_state(index_dir, state):
+  temp_path = os.path.join(index_dir, f'{SYNC_STATE_FILE}.{os.getpid()}.tmp')
+  with open(temp_path, 'w', encoding='utf-8') as f:
+    json.dump(state, f)
+  os.replace(temp_path, os.path.join(index_dir, SYNC_STATE_FILE))
+
+def _stored_revisions(index_dir, titles):
+  local_wiki = LocalWikiBackend(index_dir)
+  try:
+    revisions = {}
+    for title in titles:
+      # Only the title's own page; lookup() alone would follow redirects and plural fallbacks to another one
+      if normalize_title(title) in local_wiki.pages:
+        revisions[title] = local_wiki.lookup(title).revision
+    return revisions
+  finally:
+    local_wiki.close()
+
+def _update_search_index(index_dir, titles, removed):
+  # Re-indexes the synced pages with the redirects the updated wiki index now lists for them
+  local_wiki = LocalWikiBackend(index_dir)
+  try:
+    search = SearchIndex.load(index_dir)
+    pages = []
+    for title in titles:
+      key = normalize_title(title)
+      if key not in local_wiki.pages:
+        continue
+      record = local_wiki.lookup(title)
+      redirects = [source for source, target in local_wiki.redirects.items() if normalize_title(target) == key]
+      pages.append((record.title, record.url, record.paragraphs(), redirects))
+  finally:
+    local_wiki.close()
+  search.update_pages(pages, removed)
+  search.save(index_dir)
+
+def sync_once(index_dir, backend, api_url=WIKI_API_URL, base_url=WIKI_BASE_URL, workers=4):
+  '''
+  input: index_dir - (string) directory written by wiki_index.py (and optionally search_index.py)
+         backend - (HttpFetchBackend)
+  output: summary dict - counts of changes seen, pages fetched, written, deleted and moved, and titles left pending
+  Applies every change since the last sync: edited and created pages are re-fetched and re-extracted, deleted pages are
+  dropped, moved pages are stored under their new title with the old one kept as a redirect, and so are edited redirects.
+  Pages whose stored revision
+  already matches the feed aren't fetched again. Fetches that fail are retried on the next sync.
+  A pipeline serving from index_dir notices the rewritten files and reloads them on its next lookup.
+  '''
+  state = load_sync_state(index_dir)
+  # rcstart is inclusive and only has second resolution, so the last poll's final second comes back again
+  changes = [change for change in fetch_recent_changes(backend, api_url, state['since']) if change['rcid'] > state.get('last_rcid', 0)]
+  changed, deleted, moves = summarize_changes(changes)
+  for title in state['pending']:
+    if title not in deleted and title not in moves:
+      changed.setdefault(title, None)
+
+  stored = _stored_revisions(index_dir, changed)
+  to_fetch = [title for title, revision in changed.items() if revision is None or stored.get(title) != revision]
+  records, redirects, missing, failed = fetch_pages(backend, to_fetch, base_url, workers)
+  removed_titles = sorted(deleted | set(missing))
+  written, removed = update_index(index_dir, records, removed_titles, list(moves.items()) + redirects)
+
+  if os.path.exists(os.path.join(index_dir, SEARCH_INDEX_FILE)):
+    # Moved-from and redirect titles are search aliases of their target now, not pages of their own
+    _update_search_index(index_dir, [record.title for record in records] + list(moves.values()),
+                         removed_titles + list(moves) + [source for source, _ in redirects])
+
+  with open(os.path.join(index_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+    index = json.load(f)
+  live_bytes = sum(length for _, length in index['pages'].values())
+  if index.get('dead_bytes', 0) > live_bytes:
+    # Compacting swaps text.bin under any pipeline serving the directory, so it is left to an offline --compact run
+    print(f"{index_dir} is mostly dead bytes ({index['dead_bytes']} of {index['dead_bytes'] + live_bytes}); run with --compact while nothing serves from it")
+
+  if changes:
+    state['since'] = max(change['timestamp'] for change in changes)
+    state['last_rcid'] = max(change['rcid'] for change in changes)
+  state['pending'] = failed
+  save_sync_state(index_dir, state)
+  return {
+    'changes': len(changes),
+    'fetched': len(to_fetch),
+    'written': written,
+    'deleted': removed,
+    'moved': len(moves),
+    'pending': failed,
+  }
+
+def main():
+  parser = argparse.ArgumentParser(description="Keep an offline wiki index fresh by applying the wiki's RecentChanges feed.")
+  parser.add_argument('index_dir', nargs='?', default='wiki_index', help="directory written by wiki_index.py")
+  parser.add_argument('--api-url', default=WIKI_API_URL, help="MediaWiki api.php to poll")
+  parser.add_argument('--base-url', default=WIKI_BASE_URL, help="where /w/<Title> article pages are fetched from")
+  parser.add_argument('--interval', type=float, default=300.0, help="seconds between polls")
+  parser.add_argument('--once', action='store_true', help="sync once and exit")
+  parser.add_argument('--workers', type=int, default=4, help="concurrent page fetches")
+  parser.add_argument('--compact', action='store_true', help="drop the dead bytes left by past syncs and exit; stop anything serving from index_dir first")
+  args = parser.parse_args()
+  if args.compact:
+    print(f"Compacted {args.index_dir}, reclaiming {compact_index(args.index_dir)} bytes")
+    return
+  backend = HttpFetchBackend(pool_size=args.workers)
+  try:
+    while True:
+      try:
+        summary = sync_once(args.index_dir, backend, args.api_url, args.base_url, args.workers)
+        print(f"Synced {args.index_dir}: {summary['changes']} changes, {summary['fetched']} fetched, {summary['written']} written, "
+              f"{summary['deleted']} deleted, {summary['moved']} moved, {len(summary['pending'])} pending")
+      except Exception as e:
+        if args.once:
+          raise
+        print(f"Sync failed: {e}")
+      if args.once:
+        break
+      time.sleep(args.interval)
+  except KeyboardInterrupt:
+    pass
+  finally:
+    backend.close()
+
+if __name__ == '__main__':
+  main()